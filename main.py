@@ -1,13 +1,32 @@
 import sys
 import os
+import bisect
+import csv
+import heapq
+import itertools
+import random
+import cProfile
+import pstats
+import tracemalloc
+import threading
 import json
 import requests
 import re
 import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
+from urllib.parse import urlparse
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
 from PyQt5.QtWidgets import *
-from PyQt5.QtCore import QTimer, Qt, QPoint, QRect, QRectF, QSize, QPropertyAnimation, QEasingCurve, pyqtSignal
-from PyQt5.QtGui import QFont, QCursor, QColor, QPainter, QPen, QPainterPath
+from PyQt5.QtCore import QAbstractTableModel, QEvent, QModelIndex, QObject, QTimer, Qt, QPoint, QRect, QRectF, QSize, QPropertyAnimation, QEasingCurve, pyqtSignal
+from PyQt5.QtGui import QFont, QCursor, QColor, QPainter, QPen, QPainterPath, QKeySequence
 
 # =============== 高DPI设置 ===============
 if hasattr(Qt, 'AA_EnableHighDpiScaling'):
@@ -71,7 +90,15 @@ class RoundedButton(QPushButton):
 
 # ==================== 配置 ====================
 DATA_FILE = "watchlist.json"
+DEFAULT_PORTFOLIO = "默认"
 HISTORY_FILE = "history.json"
+LEDGER_FILE = "ledger.jsonl"
+LEDGER_METHOD = "fifo"  # 成本计算方式：fifo 先进先出 / average 平均成本
+LEDGER_METHODS = [("fifo", "先进先出"), ("average", "平均成本")]
+TRANSACTION_TYPES = [("buy", "买入"), ("sell", "卖出"), ("dividend", "现金分红")]
+TRANSACTION_DISPLAY_LIMIT = 500
+ALERTS_FILE = "alerts.json"
+QUOTES_FILE = "quotes.json"
 REFRESH_INTERVAL = 10000
 EDGE_THRESHOLD = 50
 MIN_WIDTH = 350
@@ -80,6 +107,95 @@ FULL_MODE_MAX_WIDTH = 1200
 FLOAT_BUTTON_SIZE = 50
 DEFAULT_FONT_FAMILY = "Microsoft YaHei UI"
 DEFAULT_FONT_SIZE = 10
+PROFIT_COLOR = QColor(220, 38, 38)
+LOSS_COLOR = QColor(21, 128, 61)
+NEUTRAL_COLOR = QColor(75, 85, 99)
+# 列宽按字号下的样例文本计算，不逐行测量内容，行数再多也是常数开销
+TABLE_COLUMN_SAMPLES = {0: "000000", 2: "00.0000", 3: "0000000.00", 4: "⏱00.0000",
+                        5: "+00.00%", 6: "+000000.00", 7: "+0000000.00"}
+HISTORY_PAGE_SIZE = 200  # 清仓记录对话框每次取出的条数
+FULL_RESORT_RATIO = 0.25  # 一次刷新中排序键变化的行超过该比例时整体重排，否则逐行 bisect 移动
+RESIZE_DEBOUNCE = 150  # 毫秒
+FUNDGZ_HOST = os.environ.get("PROSPER_FUNDGZ_HOST", "") or "fundgz.1234567.com.cn"
+# 天天基金 App 的多代码估值接口，一次请求返回多只基金；没有给出估值的基金逐只回退到 fundgz 的 JSONP 接口。
+# 批量请求失败后在 BATCH_COOLDOWN 秒内不再尝试，直接逐只获取
+BATCH_ENABLED = os.environ.get("PROSPER_BATCH", "1") != "0"
+BATCH_URL = os.environ.get("PROSPER_BATCH_URL", "") or "https://fundmobapi.eastmoney.com/FundMNewApi/FundMNFInfo"
+BATCH_SIZE = 50
+BATCH_COOLDOWN = 300
+NAV_URL = os.environ.get("PROSPER_NAV_URL", "") or "https://api.fund.eastmoney.com/f10/lsjz"
+NAV_HEADERS = {"Referer": "http://fundf10.eastmoney.com/"}
+METADATA_URL = os.environ.get("PROSPER_METADATA_URL", "") or "https://fundmobapi.eastmoney.com/FundMApi/FundBaseTypeInformation.ashx"
+METADATA_FILE = "metadata.json"
+DAY = 86400
+METADATA_FIELDS = {  # 字段: 过期时间（秒）
+    "name": 7 * DAY, "type": 30 * DAY, "benchmark": 30 * DAY, "company": 30 * DAY, "manager": 7 * DAY,
+    "management_fee": 7 * DAY, "custody_fee": 7 * DAY, "sales_fee": 7 * DAY, "established": 365 * DAY
+}
+METADATA_LABELS = [("type", "类型"), ("company", "基金公司"), ("manager", "基金经理"), ("established", "成立日期"),
+                   ("management_fee", "管理费"), ("custody_fee", "托管费"), ("sales_fee", "销售服务费"),
+                   ("benchmark", "业绩基准")]
+METADATA_RETRY = 600  # 秒，获取失败后隔一段时间再试
+ARCHIVE_FILE = "archive.jsonl"
+ARCHIVE_START = (15, 0)  # 当天收盘后才开始获取确认净值
+ARCHIVE_INTERVAL = 30 * 60 * 1000  # 毫秒，净值尚未公布的基金隔一段时间再试
+ACCURACY_WORST_DAYS = 5
+IMPORT_ENCODINGS = ("utf-8-sig", "gbk")  # 券商导出的文件多为 GBK
+IMPORT_COLUMNS = {
+    "code": ("code", "基金代码", "代码", "证券代码", "产品代码"),
+    "shares": ("shares", "持有份额", "持仓份额", "份额", "可用份额", "当前份额"),
+    "cost": ("cost", "成本价", "持仓成本价", "成本", "单位成本", "参考成本价")
+}
+IMPORT_VALIDATE_TIMEOUT = 30  # 秒
+EXPORT_CHUNK_ROWS = 5000
+EXPORT_DATASETS = [("history", "清仓记录"), ("daily", "每日记录"), ("transactions", "交易流水")]
+EXPORT_FORMATS = [("csv", "CSV", "csv"), ("parquet", "Parquet", "parquet"), ("arrow", "Arrow", "arrow")]
+EXPORT_COLUMNS = {
+    "history": [("portfolio", "str"), ("code", "str"), ("name", "str"), ("close_time", "str"), ("shares", "float"), ("cost", "float"),
+                ("profit", "float")],
+    "daily": [("date", "str"), ("portfolio", "str"), ("code", "str"), ("name", "str"), ("nav", "float"),
+              ("prev_nav", "float"), ("estimate", "float"), ("shares", "float"), ("cost", "float"),
+              ("profit", "float"), ("position_profit", "float")],
+    "transactions": [("time", "str"), ("portfolio", "str"), ("code", "str"), ("type", "str"), ("shares", "float"),
+                     ("price", "float"), ("amount", "float"), ("fee", "float")]
+}
+EXPORT_DATE_FIELDS = {"history": "close_time", "daily": "date", "transactions": "time"}
+FETCH_WORKERS = int(os.environ.get("PROSPER_FETCH_WORKERS", "8") or 8)
+# 每个主机的令牌桶：每秒请求数上限（0 表示不限）和突发容量；上游返回 429/5xx 时速率减半，
+# 之后每次成功逐步恢复到上限
+FETCH_RATE_LIMIT = float(os.environ.get("PROSPER_RATE_LIMIT", "50") or 0)
+FETCH_RATE_BURST = 50
+FETCH_MIN_RATE = 2.0
+FETCH_RETRIES = 2
+RETRY_BACKOFF = 0.5  # 秒，第 n 次重试前随机等待 0 ~ RETRY_BACKOFF * 2^(n-1)
+RETRY_STATUS = (429, 500, 502, 503, 504)
+# 对冲请求：超过最近观测到的 p95 延迟仍未返回时再发一份（同一主机或备用行情源），先返回的为准。
+# 每个主请求积累 HEDGE_BUDGET 份额度，对冲请求数不超过主请求的这个比例
+HEDGE_ENABLED = os.environ.get("PROSPER_HEDGE", "") == "1"
+HEDGE_HOST = os.environ.get("PROSPER_HEDGE_HOST", "") or FUNDGZ_HOST
+HEDGE_QUANTILE = 0.95
+HEDGE_BUDGET = 0.05
+HEDGE_BURST = 10
+HEDGE_MIN_SAMPLES = 50
+HEDGE_WINDOW = 2000  # 延迟分布按最近这么多次请求统计
+HEDGE_DEFAULT_DELAY = 1.0  # 秒，样本不足时使用
+REFRESH_SOFT_DEADLINE = 3.0  # 秒，超时未返回的基金先显示最近一次有效行情
+REVALIDATE_DELAY = 2000  # 毫秒，获取失败的基金在后台重新获取
+OFFSCREEN_REFRESH_EVERY = 6  # 不在视野内、也没有提醒规则的基金每隔几次刷新才获取一次
+VISIBLE_ROWS_DEBOUNCE = 100  # 毫秒，滚动/缩放停止后再上报可见行
+QUOTE_SAVE_INTERVAL = 60  # 秒
+SINGLE_POLLER = os.environ.get("PROSPER_SINGLE_POLLER", "1") != "0"  # 多个实例共用一个行情获取者
+INSTANCE_LOCK_FILE = "prosper.lock"
+SHARED_QUOTE_SAVE_INTERVAL = 2  # 秒，主实例更频繁地写行情缓存供其他实例读取
+SEARCH_CACHE_SIZE = 32
+SEARCH_CACHE_TTL = 30  # 秒
+METRICS_ENABLED = os.environ.get("PROSPER_METRICS", "") == "1"
+PROFILE_DIR = "profiles"
+PROFILE_CYCLES = int(os.environ.get("PROSPER_PROFILE_CYCLES", "0") or 0)
+TRACEMALLOC_MINUTES = float(os.environ.get("PROSPER_TRACEMALLOC_MINUTES", "0") or 0)
+DEFAULT_PROFILE_CYCLES = 5
+DEFAULT_TRACEMALLOC_MINUTES = 10
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
 
 # ==================== 工具函数 ====================
 def get_weather_icon(growth):
@@ -93,151 +209,2476 @@ def get_weather_icon(growth):
         return "⛈️"
 
 def get_app_font(base_size=DEFAULT_FONT_SIZE, size_adjust=0, bold=False):
-    point_size = int(round(base_size + size_adjust))
+    return _cached_font(int(round(base_size + size_adjust)), bold)
+
+# QFont 按值传递给 setFont，同一字号共享一个实例即可，避免每次刷新都新建
+@lru_cache(maxsize=128)
+def _cached_font(point_size, bold):
     font = QFont(DEFAULT_FONT_FAMILY, point_size)
     font.setBold(bold)
     return font
 
+def format_age(seconds):
+    if seconds < 60:
+        return f"{int(seconds)}秒前"
+    elif seconds < 3600:
+        return f"{int(seconds // 60)}分钟前"
+    elif seconds < 86400:
+        return f"{int(seconds // 3600)}小时前"
+    return f"{int(seconds // 86400)}天前"
+
+def get_profit_color(value):
+    if value > 0:
+        return PROFIT_COLOR
+    elif value < 0:
+        return LOSS_COLOR
+    return None
+
+# 带过期时间的 LRU 缓存，超过 maxsize 时淘汰最久未使用的条目
+class TTLCache:
+    def __init__(self, maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+# ==================== 文件锁 ====================
+# 同一数据目录下可能同时运行多个实例（多个桌面、开发副本、脚本）。共享的数据文件在旁边的
+# .lock 文件上加锁后读写，写入先写临时文件再替换，读取方不会读到写了一半的内容
+def _lock_fd(fd, blocking=True):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+def _unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def file_lock(path):
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _lock_fd(fd)
+        try:
+            yield
+        finally:
+            _unlock_fd(fd)
+    finally:
+        os.close(fd)
+
+def file_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+# 返回 (数据, 修改时间)；修改时间在锁内取得，用来判断之后文件是否被其他实例改过。
+# 调用方已持有锁（读-改-写）时传 lock=False，同一进程对同一文件重复加锁会自己卡住
+def read_json(path, lock=True):
+    with file_lock(path) if lock else nullcontext():
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data, file_mtime(path)
+
+# sync 为 True 时替换前先落盘，断电后不会留下空文件；会阻塞较久，只在后台线程中使用
+def write_json(path, data, lock=True, sync=False, **kwargs):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with file_lock(path) if lock else nullcontext():
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, **kwargs)
+                if sync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return file_mtime(path)
+
+# 主实例锁：拿到锁的实例负责获取行情并写行情缓存，其他实例只读取它写下的行情。
+# 锁随进程退出自动释放，其余实例在下一次刷新时接替
+class InstanceLock:
+    def __init__(self, path=INSTANCE_LOCK_FILE):
+        self.path = path
+        self.fd = None
+
+    @property
+    def held(self):
+        return self.fd is not None
+
+    def try_acquire(self):
+        if self.fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            _lock_fd(fd, blocking=False)
+        except OSError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is None:
+            return
+        try:
+            _unlock_fd(self.fd)
+        except OSError:
+            pass
+        os.close(self.fd)
+        self.fd = None
+
+# ==================== 后台任务 ====================
+# 在线程池中执行耗时任务，结果通过信号投递回界面线程的回调
+class TaskRunner(QObject):
+    _finished = pyqtSignal(object, object, object)
+
+    def __init__(self, max_workers=2, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._finished.connect(self._dispatch)
+
+    def submit(self, fn, *args, callback=None):
+        future = self.executor.submit(fn, *args)
+        if callback is not None:
+            future.add_done_callback(lambda f: self._on_done(callback, f))
+        return future
+
+    def _on_done(self, callback, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        result = None if error else future.result()
+        self._finished.emit(callback, result, error)
+
+    def _dispatch(self, callback, result, error):
+        callback(result, error)
+
+    def shutdown(self, wait=False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+# ==================== 运行指标 ====================
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+# 计数器与直方图按 (名称, 标签) 聚合；关闭时 observe/inc 直接返回，几乎没有开销
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def timed(self, name, **labels):
+        if not self.enabled:
+            return nullcontext()
+        return _MetricsTimer(self, name, labels)
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_json(self):
+        with self.lock:
+            return json.dumps({
+                "enabled": self.enabled,
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name, "labels": dict(labels), "buckets": list(h.buckets),
+                        "counts": list(h.counts), "sum": h.sum, "count": h.count,
+                        "p50": h.quantile(0.5), "p95": h.quantile(0.95), "p99": h.quantile(0.99)
+                    }
+                    for (name, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0])
+                ]
+            }, ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f"prosper_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} counter")
+                    typed.add(metric)
+                lines.append(f"{metric}{self._format_labels(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                metric = f"prosper_{name}"
+                if metric not in typed:
+                    lines.append(f"# TYPE {metric} histogram")
+                    typed.add(metric)
+                cumulative = 0
+                for bound, n in zip(list(h.buckets) + ["+Inf"], h.counts):
+                    cumulative += n
+                    lines.append(f"{metric}_bucket{self._format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_sum{self._format_labels(labels)} {h.sum}")
+                lines.append(f"{metric}_count{self._format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ""
+        parts = []
+        for key, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}"
+
+    def summary(self):
+        lines = []
+        with self.lock:
+            for (name, labels), h in sorted(self.histograms.items(), key=lambda kv: kv[0]):
+                label_text = ",".join(f"{k}={v}" for k, v in labels)
+                lines.append(
+                    f"{name}[{label_text}]  n={h.count}  avg={h.sum / max(h.count, 1) * 1000:.1f}ms"
+                    f"  p50={h.quantile(0.5) * 1000:.1f}ms  p95={h.quantile(0.95) * 1000:.1f}ms"
+                )
+            for (name, labels), value in sorted(self.counters.items()):
+                label_text = ",".join(f"{k}={v}" for k, v in labels)
+                lines.append(f"{name}[{label_text}]  {value}")
+        return "\n".join(lines) if lines else "暂无数据"
+
+class _MetricsTimer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+metrics = Metrics(METRICS_ENABLED)
+
+# ==================== 性能剖析 ====================
+# cProfile 从第 1 个刷新周期开始到第 N 个周期结束持续开启，期间界面线程中的
+# 绘制、字体更新等事件也会被统计；tracemalloc 按固定间隔保存快照并与上一次对比
+class SessionProfiler:
+    def __init__(self):
+        self.profile = None
+        self.remaining_cycles = 0
+        self.last_snapshot = None
+
+    def arm(self, cycles):
+        if self.profile is None:
+            self.remaining_cycles = max(1, int(cycles))
+            print(f"性能剖析已开启，将记录接下来 {self.remaining_cycles} 个刷新周期")
+
+    def begin_cycle(self):
+        if self.remaining_cycles > 0 and self.profile is None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def end_cycle(self):
+        if self.profile is None:
+            return
+        self.remaining_cycles -= 1
+        if self.remaining_cycles > 0:
+            return
+        self.profile.disable()
+        profile, self.profile = self.profile, None
+        try:
+            base = self._report_path("cpu")
+            profile.dump_stats(base + ".prof")
+            with open(base + ".txt", 'w', encoding='utf-8') as f:
+                stats = pstats.Stats(profile, stream=f)
+                stats.sort_stats("cumulative").print_stats(80)
+                stats.sort_stats("tottime").print_stats(40)
+            print(f"性能剖析报告已保存: {base}.prof")
+        except Exception as e:
+            print(f"保存性能剖析报告失败: {str(e)}")
+
+    def start_tracemalloc(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            self.last_snapshot = None
+
+    def take_memory_snapshot(self):
+        if not tracemalloc.is_tracing():
+            return
+        try:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            current, peak = tracemalloc.get_traced_memory()
+            path = self._report_path("mem") + ".txt"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"当前: {current / 1024:.1f} KiB  峰值: {peak / 1024:.1f} KiB\n\n")
+                f.write("== 按代码行占用 ==\n")
+                for stat in snapshot.statistics("lineno")[:40]:
+                    f.write(f"{stat}\n")
+                if self.last_snapshot is not None:
+                    f.write("\n== 与上次快照相比 ==\n")
+                    for stat in snapshot.compare_to(self.last_snapshot, "lineno")[:40]:
+                        f.write(f"{stat}\n")
+            self.last_snapshot = snapshot
+            print(f"内存快照已保存: {path}")
+        except Exception as e:
+            print(f"保存内存快照失败: {str(e)}")
+
+    @staticmethod
+    def _report_path(kind):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        return os.path.join(PROFILE_DIR, f"{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+profiler = SessionProfiler()
+
 # ==================== 数据获取器 ====================
+FUNDGZ_PREFIX = b"jsonpgz("
+
+# 一次行情；fetched_at 是发起获取的时间，存入 QuoteStore 时填写；nav_date 是 dwjz（估值所基于的净值）的日期；
+# confirmed 表示 gsz 已换成当天的确认净值
+class Quote:
+    __slots__ = ("name", "dwjz", "gsz", "growth", "time", "fetched_at", "nav_date", "confirmed")
+
+    def __init__(self, name, dwjz, gsz, growth, time, fetched_at=None, nav_date="", confirmed=False):
+        self.name = name
+        self.dwjz = dwjz
+        self.gsz = gsz
+        self.growth = growth
+        self.time = time
+        self.fetched_at = fetched_at
+        self.nav_date = nav_date
+        self.confirmed = confirmed
+
+    def __eq__(self, other):
+        if not isinstance(other, Quote):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], float(data["dwjz"]), float(data["gsz"]), float(data["growth"]),
+                   data.get("time", ""), data.get("fetched_at"), data.get("nav_date", ""), data.get("confirmed", False))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+# 直接在响应字节上按前缀和最后一个右括号切出 JSON，不经过文本解码和正则；
+# 字段缺失、类型不对或数值无法解析都返回 None
+def decode_fundgz(payload):
+    body = payload.strip()
+    end = body.rfind(b")")
+    if not body.startswith(FUNDGZ_PREFIX) or end <= len(FUNDGZ_PREFIX):
+        return None
+    try:
+        data = json.loads(body[len(FUNDGZ_PREFIX):end])
+        name = data["name"]
+        gztime = data["gztime"]
+        if not isinstance(name, str) or not isinstance(gztime, str):
+            return None
+        jzrq = data.get("jzrq")
+        return Quote(name, float(data["dwjz"]), float(data["gsz"]), float(data["gszzl"]), gztime,
+                     nav_date=jzrq if isinstance(jzrq, str) else "")
+    except (ValueError, TypeError, KeyError):
+        return None
+
+# 批量接口的响应整理成与 decode_fundgz 相同的 Quote；估值为 "--" 等无法解析的基金不出现在结果中。
+# NAV 是最近一次公布的净值：晚间公布当日净值后 PDATE 与估值日期相同，这时 NAV 已不是估值所基于的
+# 前一日净值，这些基金同样不出现在结果中，由调用方逐只回退到 JSONP 接口（其中的 jzrq 标明 dwjz 的日期）
+def decode_batch(payload):
+    data = json.loads(payload)
+    if data.get("ErrCode", 0) != 0:
+        raise ValueError(data.get("ErrMsg") or f"ErrCode {data.get('ErrCode')}")
+    quotes = {}
+    for item in data.get("Datas") or []:
+        try:
+            gztime = item["GZTIME"]
+            pdate = str(item["PDATE"])[:10]
+            if not isinstance(gztime, str) or pdate >= gztime[:10]:
+                continue
+            quotes[str(item["FCODE"])] = Quote(item["SHORTNAME"], float(item["NAV"]), float(item["GSZ"]),
+                                               float(item["GSZZL"]), gztime, nav_date=pdate)
+        except (ValueError, TypeError, KeyError):
+            continue
+    return quotes
+
+# 批量接口同时带有最近一次确认净值及其日期，整理成 {代码: (日期, 净值, None)}；批量接口不带前一日净值。
+# 是否已是估值当日的净值由调用方与行情的 time / nav_date 比较决定
+def decode_batch_navs(payload):
+    data = json.loads(payload)
+    if data.get("ErrCode", 0) != 0:
+        raise ValueError(data.get("ErrMsg") or f"ErrCode {data.get('ErrCode')}")
+    navs = {}
+    for item in data.get("Datas") or []:
+        try:
+            navs[str(item["FCODE"])] = (str(item["PDATE"])[:10], float(item["NAV"]), None)
+        except (ValueError, TypeError, KeyError):
+            continue
+    return navs
+
+# 基金基本资料接口的字段对应到 METADATA_FIELDS；"--" 表示没有该项
+METADATA_KEYS = {"name": "SHORTNAME", "type": "FTYPE", "benchmark": "BENCH", "company": "JJGS", "manager": "JJJL",
+                 "management_fee": "MGREXP", "custody_fee": "TRUSTEXP", "sales_fee": "SALESEXP", "established": "ESTABDATE"}
+
+def decode_metadata(payload):
+    try:
+        data = json.loads(payload)["Datas"]
+    except (ValueError, TypeError, KeyError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    info = {}
+    for field, key in METADATA_KEYS.items():
+        value = data.get(key)
+        if value is not None and str(value).strip() not in ("", "--"):
+            info[field] = str(value).strip()
+    return info or None
+
+# 历史净值接口取最新两条，返回 (日期, 净值, 前一日净值)，只有一条时前一日净值为 None；
+# 没有数据或无法解析时返回 None
+def decode_nav(payload):
+    try:
+        rows = json.loads(payload)["Data"]["LSJZList"]
+        if not rows:
+            return None
+        prev_nav = float(rows[1]["DWJZ"]) if len(rows) > 1 else None
+        return str(rows[0]["FSRQ"])[:10], float(rows[0]["DWJZ"]), prev_nav
+    except (ValueError, TypeError, KeyError, IndexError):
+        return None
+
+class TokenBucket:
+    def __init__(self, host, rate, burst, min_rate=FETCH_MIN_RATE):
+        self.host = host
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.max_rate <= 0:
+            return
+        # 先预占令牌再在锁外等待，令牌可以为负，等待时间按排队顺序依次累加
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay > 0:
+            metrics.observe("rate_limit_wait_seconds", delay, host=self.host)
+            time.sleep(delay)
+
+    def penalize(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def reward(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+# 最近一段时间的请求延迟；写满一个窗口后换新，新窗口样本不足时沿用上一个窗口
+class LatencyWindow:
+    def __init__(self, window=HEDGE_WINDOW, min_samples=HEDGE_MIN_SAMPLES):
+        self.window = window
+        self.min_samples = min_samples
+        self.current = Histogram()
+        self.previous = None
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.current.observe(value)
+            if self.current.count >= self.window:
+                self.previous, self.current = self.current, Histogram()
+
+    def quantile(self, q):
+        with self.lock:
+            histogram = self.current
+            if histogram.count < self.min_samples and self.previous is not None:
+                histogram = self.previous
+            if histogram.count < self.min_samples:
+                return None
+            return histogram.quantile(q)
+
+class HedgeBudget:
+    def __init__(self, ratio=HEDGE_BUDGET, burst=HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = 0.0
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self):
+        with self.lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
 class DataFetcher:
-    def __init__(self):
+    def __init__(self, fundgz_host=FUNDGZ_HOST, batch_url=BATCH_URL, nav_url=NAV_URL, metadata_url=METADATA_URL):
         self.session = requests.Session()
         self.timeout = 10
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        self.hedging = HEDGE_ENABLED
+        self.batching = BATCH_ENABLED
+        self.fundgz_host = fundgz_host
+        self.batch_url = batch_url
+        self.batch_host = urlparse(batch_url).netloc
+        self.batch_disabled_until = 0.0
+        self.nav_url = nav_url
+        self.nav_host = urlparse(nav_url).netloc
+        self.metadata_url = metadata_url
+        self.metadata_host = urlparse(metadata_url).netloc
+        # 每个主机一个连接池，估值、对冲、批量、净值和资料请求共用会话时互不挤掉对方的池；
+        # 池内连接数与并发数一致，工作线程不会因为池满而反复新建/丢弃连接；重试由 fetch 自己带抖动完成
+        origins = {("http", fundgz_host)}
+        if self.hedging:
+            origins.add(("http", HEDGE_HOST))
+        for url in (batch_url, nav_url, metadata_url):
+            parsed = urlparse(url)
+            origins.add((parsed.scheme, parsed.netloc))
+        pool_size = FETCH_WORKERS * 2 if self.hedging else FETCH_WORKERS
+        adapter = requests.adapters.HTTPAdapter(pool_connections=len(origins), pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS)
+        # 开启对冲时实际请求在这个池中执行，executor 中的任务只负责等待和择优
+        self.hedge_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS * 2) if self.hedging else None
+        self.limiters = {}
+        self.limiters_lock = threading.Lock()
+        self.latency = LatencyWindow()
+        self.hedge_budget = HedgeBudget()
+
+    def submit(self, code):
+        if self.hedging:
+            return self.executor.submit(self.get_fund_estimate_hedged, code)
+        return self.executor.submit(self.get_fund_estimate, code)
+
+    def submit_many(self, codes):
+        codes = list(codes)
+        if not self.batching or len(codes) < 2 or time.monotonic() < self.batch_disabled_until:
+            return {code: self.submit(code) for code in codes}
+        futures = {code: Future() for code in codes}
+        for start in range(0, len(codes), BATCH_SIZE):
+            chunk = codes[start:start + BATCH_SIZE]
+            self.executor.submit(self._fetch_chunk, chunk, futures)
+        return futures
+
+    def _fetch_chunk(self, chunk, futures):
+        chunk = [code for code in chunk if futures[code].set_running_or_notify_cancel()]
+        quotes = {}
+        if time.monotonic() >= self.batch_disabled_until:
+            try:
+                quotes = self.get_batch_estimates(chunk)
+            except Exception as e:
+                self.batch_disabled_until = time.monotonic() + BATCH_COOLDOWN
+                metrics.inc("fetch_failures_total", host=self.batch_host, reason="error")
+                print(f"批量获取行情失败，暂时改为逐只获取: {str(e)}")
+        try:
+            for code in chunk:
+                quote = quotes.get(code)
+                if quote is not None:
+                    futures[code].set_result(quote)
+                    continue
+                metrics.inc("batch_fallbacks_total")
+                self.submit(code).add_done_callback(lambda f, target=futures[code]: self._chain(f, target))
+        except Exception as e:
+            # 不能让任何一只基金的 future 悬而不决，否则刷新调度会一直认为它在获取中
+            for code in chunk:
+                if not futures[code].done():
+                    futures[code].set_exception(e)
+
+    # 确认净值优先走批量接口，批量结果中缺少的基金再逐只查询历史净值，都在线程池中并发进行；
+    # history_codes 中的基金需要前一日净值，直接查询历史净值
+    def submit_navs(self, codes, history_codes=()):
+        futures = {code: Future() for code in codes}
+        codes = [code for code in futures if code not in history_codes]
+        for start in range(0, len(codes), BATCH_SIZE):
+            self.executor.submit(self._fetch_nav_chunk, codes[start:start + BATCH_SIZE], futures)
+        for code, future in futures.items():
+            if code in history_codes and future.set_running_or_notify_cancel():
+                self.executor.submit(self.get_confirmed_nav, code).add_done_callback(
+                    lambda f, target=future: self._chain(f, target))
+        return futures
 
-    def get_fund_estimate(self, code):
-        url = f"http://fundgz.1234567.com.cn/js/{code}.js"
+    def _fetch_nav_chunk(self, chunk, futures):
+        chunk = [code for code in chunk if futures[code].set_running_or_notify_cancel()]
+        navs = {}
+        if self.batching and time.monotonic() >= self.batch_disabled_until:
+            try:
+                navs = self.get_batch_navs(chunk)
+            except Exception as e:
+                print(f"批量获取净值失败，改为逐只获取: {str(e)}")
         try:
-            resp = self.session.get(url, timeout=self.timeout)
-            text = resp.text.strip()
-            if not text.startswith('jsonpgz('):
-                return None
-            match = re.search(r'jsonpgz\((.*)\)', text)
-            if not match:
-                return None
-            data = json.loads(match.group(1))
-            return {
-                "name": data["name"],
-                "dwjz": float(data["dwjz"]),
-                "gsz": float(data["gsz"]),
-                "growth": float(data["gszzl"]),
-                "time": data["gztime"]
-            }
+            for code in chunk:
+                nav = navs.get(code)
+                if nav is not None:
+                    futures[code].set_result(nav)
+                    continue
+                self.executor.submit(self.get_confirmed_nav, code).add_done_callback(
+                    lambda f, target=futures[code]: self._chain(f, target))
+        except Exception as e:
+            for code in chunk:
+                if not futures[code].done():
+                    futures[code].set_exception(e)
+
+    @staticmethod
+    def _chain(source, target):
+        error = source.exception()
+        if error is not None:
+            target.set_exception(error)
+        else:
+            target.set_result(source.result())
+
+    def get_batch_estimates(self, codes):
+        params = {
+            "pageIndex": 1, "pageSize": len(codes), "plat": "Android", "appType": "ttjj",
+            "product": "EFund", "Version": 1, "deviceid": "prosper", "Fcodes": ",".join(codes)
+        }
+        url = requests.Request("GET", self.batch_url, params=params).prepare().url
+        started = time.perf_counter()
+        resp = self.fetch(url, self.batch_host, record_latency=False)
+        resp.raise_for_status()
+        metrics.observe("request_latency_seconds", time.perf_counter() - started, host=self.batch_host)
+        metrics.inc("batch_requests_total", host=self.batch_host)
+        with metrics.timed("parse_seconds"):
+            return decode_batch(resp.content)
+
+    def get_batch_navs(self, codes):
+        params = {
+            "pageIndex": 1, "pageSize": len(codes), "plat": "Android", "appType": "ttjj",
+            "product": "EFund", "Version": 1, "deviceid": "prosper", "Fcodes": ",".join(codes)
+        }
+        url = requests.Request("GET", self.batch_url, params=params).prepare().url
+        resp = self.fetch(url, self.batch_host, record_latency=False)
+        resp.raise_for_status()
+        return decode_batch_navs(resp.content)
+
+    def get_confirmed_nav(self, code):
+        params = {"fundCode": code, "pageIndex": 1, "pageSize": 2}
+        url = requests.Request("GET", self.nav_url, params=params).prepare().url
+        try:
+            # 历史净值接口会校验来源页
+            resp = self.fetch(url, self.nav_host, record_latency=False, headers=NAV_HEADERS)
+            resp.raise_for_status()
+            return decode_nav(resp.content)
+        except Exception as e:
+            metrics.inc("fetch_failures_total", host=self.nav_host, reason="error")
+            print(f"获取基金 {code} 净值失败: {str(e)}")
+            return None
+
+    def get_fund_metadata(self, code):
+        params = {"FCODE": code, "deviceid": "prosper", "plat": "Wap", "product": "EFund", "version": "2.0.0"}
+        url = requests.Request("GET", self.metadata_url, params=params).prepare().url
+        try:
+            resp = self.fetch(url, self.metadata_host, record_latency=False)
+            resp.raise_for_status()
+            return decode_metadata(resp.content)
+        except Exception as e:
+            metrics.inc("fetch_failures_total", host=self.metadata_host, reason="error")
+            print(f"获取基金 {code} 资料失败: {str(e)}")
+            return None
+
+    def hedge_delay(self):
+        delay = self.latency.quantile(HEDGE_QUANTILE)
+        return HEDGE_DEFAULT_DELAY if delay is None else delay
+
+    def get_fund_estimate_hedged(self, code):
+        self.hedge_budget.earn()
+        primary = self.hedge_executor.submit(self.get_fund_estimate, code)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done or not self.hedge_budget.try_spend():
+            return primary.result()
+        metrics.inc("hedged_requests_total", host=HEDGE_HOST)
+        hedge = self.hedge_executor.submit(self.get_fund_estimate, code, HEDGE_HOST)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result:
+                    if future is hedge:
+                        metrics.inc("hedge_wins_total", host=HEDGE_HOST)
+                    return result
+        return None
+
+    def get_limiter(self, host):
+        with self.limiters_lock:
+            limiter = self.limiters.get(host)
+            if limiter is None:
+                limiter = self.limiters[host] = TokenBucket(host, FETCH_RATE_LIMIT, FETCH_RATE_BURST)
+            return limiter
+
+    # 启动时并发发出几个轻量请求，提前建立好 keep-alive 连接，第一次刷新不用再握手
+    def prewarm(self, connections=FETCH_WORKERS):
+        targets = [(self.fundgz_host, f"http://{self.fundgz_host}/")]
+        if self.batching:
+            # 连接池按协议和主机区分，批量接口要单独预热
+            batch = urlparse(self.batch_url)
+            targets.append((self.batch_host, f"{batch.scheme}://{batch.netloc}/"))
+        for host, url in targets:
+            for _ in range(connections):
+                self.executor.submit(self._prewarm_connection, host, url)
+
+    def _prewarm_connection(self, host, url):
+        self.get_limiter(host).acquire()
+        try:
+            self.session.head(url, timeout=self.timeout).close()
+        except requests.RequestException as e:
+            print(f"预热连接失败: {str(e)}")
+
+    # 退出时取消还在排队的请求，不等待进行中的请求结束
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.hedge_executor is not None:
+            self.hedge_executor.shutdown(wait=False, cancel_futures=True)
+
+    def fetch(self, url, host, record_latency=True, headers=None):
+        limiter = self.get_limiter(host)
+        error = None
+        for attempt in range(FETCH_RETRIES + 1):
+            if attempt:
+                metrics.inc("fetch_retries_total", host=host)
+                time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** (attempt - 1)))
+            limiter.acquire()
+            sent = time.perf_counter()
+            try:
+                resp = self.session.get(url, timeout=self.timeout, headers=headers)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+                continue
+            if resp.status_code in RETRY_STATUS:
+                limiter.penalize()
+                metrics.inc("fetch_throttled_total", host=host, status=str(resp.status_code))
+                error = f"HTTP {resp.status_code}"
+                continue
+            limiter.reward()
+            if record_latency:
+                self.latency.observe(time.perf_counter() - sent)
+            return resp
+        raise requests.RequestException(f"重试 {FETCH_RETRIES} 次后仍失败: {error}")
+
+    def get_fund_estimate(self, code, host=None):
+        host = host or self.fundgz_host
+        url = f"http://{host}/js/{code}.js"
+        started = time.perf_counter()
+        try:
+            resp = self.fetch(url, host)
+            elapsed = time.perf_counter() - started
+            metrics.observe("request_latency_seconds", elapsed, host=host)
+            metrics.observe("fund_latency_seconds", elapsed, code=code)
+            with metrics.timed("parse_seconds"):
+                est = decode_fundgz(resp.content)
+            if est is None:
+                metrics.inc("fetch_failures_total", host=host, reason="format")
+            return est
         except Exception as e:
+            metrics.inc("fetch_failures_total", host=host, reason="error")
             print(f"获取基金 {code} 数据失败: {str(e)}")
             return None
 
+# ==================== 基金资料缓存 ====================
+# 名称、类型、业绩基准、费率等变化很慢的资料，按代码缓存在 metadata.json 中，每个字段单独记录
+# 获取时间并按 METADATA_FIELDS 中的期限过期。文件在第一次查询时才读取；查询到过期或缺失的
+# 字段时先返回已有的值，再在后台重新获取，获取完成后发出 updated 信号。不参与每次刷新
+class FundMetadataCache(QObject):
+    updated = pyqtSignal(str)
+
+    def __init__(self, fetcher, path=METADATA_FILE, parent=None):
+        super().__init__(parent)
+        self.fetcher = fetcher
+        self.path = path
+        self.entries = None
+        self.mtime = None
+        self.pending = set()
+        self.retry_after = {}
+        self.runner = TaskRunner(max_workers=2, parent=self)
+
+    def _ensure_loaded(self):
+        if self.entries is not None:
+            return
+        self.entries = {}
+        if self.path and os.path.exists(self.path):
+            try:
+                self.entries, self.mtime = read_json(self.path)
+            except Exception as e:
+                print(f"加载基金资料失败: {str(e)}")
+
+    def get(self, code, fetch=True):
+        self._ensure_loaded()
+        entry = self.entries.get(code, {})
+        now = time.time()
+        if fetch and any(field not in entry or now - entry[field][1] > ttl for field, ttl in METADATA_FIELDS.items()):
+            self.request(code)
+        return {field: value for field, (value, _) in entry.items()}
+
+    def request(self, code):
+        if code in self.pending or time.monotonic() < self.retry_after.get(code, 0):
+            return
+        self.pending.add(code)
+        self.runner.submit(self.fetcher.get_fund_metadata, code,
+                           callback=lambda result, error, c=code: self._on_fetched(c, result, error))
+
+    def _on_fetched(self, code, result, error):
+        self.pending.discard(code)
+        if error is not None or not result:
+            self.retry_after[code] = time.monotonic() + METADATA_RETRY
+            return
+        now = time.time()
+        entry = self.entries.setdefault(code, {})
+        # 接口没有提供的字段也记下获取时间，到期前不再为它重新获取
+        for field in METADATA_FIELDS:
+            entry[field] = [result.get(field), now]
+        self.save()
+        self.updated.emit(code)
+
+    # 其他实例可能也写过资料，合并后再写，各自获取到的条目都保留
+    def save(self):
+        if not self.path:
+            return
+        try:
+            with file_lock(self.path):
+                if os.path.exists(self.path) and file_mtime(self.path) != self.mtime:
+                    data, _ = read_json(self.path, lock=False)
+                    for code, entry in data.items():
+                        current = self.entries.setdefault(code, {})
+                        for field, item in entry.items():
+                            if field not in current or current[field][1] < item[1]:
+                                current[field] = item
+                self.mtime = write_json(self.path, self.entries, lock=False)
+        except Exception as e:
+            print(f"保存基金资料失败: {str(e)}")
+
+    def shutdown(self):
+        self.runner.shutdown()
+
+    def describe(self, code):
+        info = self.get(code)
+        lines = []
+        for field, label in METADATA_LABELS:
+            value = info.get(field)
+            if value:
+                lines.append(f"{label}: {value}")
+        return lines
+
 # ==================== 历史收益管理 ====================
+# 清仓记录按组合分开保存：{"portfolios": {组合: {代码: {"name", "closed_positions"}}}}。
+# 旧版本的文件没有按组合区分，读入时归到默认组合
 class HistoryManager:
     def __init__(self):
         self.history = {}
+        self.closed_totals = {}
+        self.mtime = None
         self.load()
 
-    def load(self):
+    def load(self, lock=True):
         if os.path.exists(HISTORY_FILE):
             try:
-                with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.history = data if isinstance(data, dict) else {}
+                data, self.mtime = read_json(HISTORY_FILE, lock)
+                if not isinstance(data, dict):
+                    data = {}
+                self.history = data["portfolios"] if "portfolios" in data else {DEFAULT_PORTFOLIO: data}
             except Exception as e:
                 print(f"加载历史记录失败: {str(e)}")
                 self.history = {}
         else:
             self.history = {}
+        # 每次刷新都要用到累计清仓收益，按组合和基金维护汇总值，不再逐条累加
+        self.closed_totals = {
+            portfolio: {code: sum(pos["profit"] for pos in fund["closed_positions"]) for code, fund in funds.items()}
+            for portfolio, funds in self.history.items()
+        }
 
-    def save(self):
+    def save(self, lock=True):
         try:
-            with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, ensure_ascii=False, indent=2)
+            self.mtime = write_json(HISTORY_FILE, {"portfolios": self.history}, lock, indent=2)
         except Exception as e:
             print(f"保存历史记录失败: {str(e)}")
 
-    def record_closed_profit(self, code, name, profit, shares, cost, close_time=None):
+    def reload_if_changed(self, lock=True):
+        if file_mtime(HISTORY_FILE) == self.mtime:
+            return False
+        self.load(lock)
+        return True
+
+    # 读-改-写整个过程持有文件锁：其他实例写过文件时先重新读取，在它的基础上追加，不覆盖对方的记录
+    def record_closed_profit(self, portfolio, code, name, profit, shares, cost, close_time=None):
         if close_time is None:
             close_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if code not in self.history:
-            self.history[code] = {"name": name, "closed_positions": []}
-        closed_position = {"profit": profit, "shares": shares, "cost": cost, "close_time": close_time}
-        self.history[code]["closed_positions"].append(closed_position)
-        self.save()
+        with file_lock(HISTORY_FILE):
+            self.reload_if_changed(lock=False)
+            funds = self.history.setdefault(portfolio, {})
+            if code not in funds:
+                funds[code] = {"name": name, "closed_positions": []}
+            closed_position = {"profit": profit, "shares": shares, "cost": cost, "close_time": close_time}
+            funds[code]["closed_positions"].append(closed_position)
+            totals = self.closed_totals.setdefault(portfolio, {})
+            totals[code] = totals.get(code, 0.0) + profit
+            self.save(lock=False)
+
+    def get_total_closed_profit(self, portfolio, code=None):
+        totals = self.closed_totals.get(portfolio, {})
+        if code:
+            return totals.get(code, 0.0)
+        return sum(totals.values())
+
+    def get_fund_history(self, portfolio, code):
+        return self.history.get(portfolio, {}).get(code, None)
+
+    def count_closed_positions(self, portfolio, code):
+        fund = self.get_fund_history(portfolio, code)
+        return len(fund["closed_positions"]) if fund else 0
+
+    def get_closed_positions(self, portfolio, code, start, count):
+        fund = self.get_fund_history(portfolio, code)
+        return fund["closed_positions"][start:start + count] if fund else []
+
+# ==================== 价格/收益提醒 ====================
+PORTFOLIO_CODE = "*"
+FUND_ALERT_FIELDS = [("growth", "今日涨幅(%)"), ("gsz", "预估净值"), ("today_profit", "今日收益(元)")]
+PORTFOLIO_ALERT_FIELDS = [("today_profit", "今日总收益(元)"), ("total_profit", "累计收益(元)")]
+ALERT_OPS = [("above", "升破"), ("below", "跌破"), ("abs", "涨跌超过±")]
+
+# 单个 (基金, 指标) 的阈值索引：阈值按升序保存，每次只用二分查找取出被穿越的区间
+class AlertIndex:
+    def __init__(self):
+        self.up_thresholds = []
+        self.up_ids = []
+        self.down_thresholds = []
+        self.down_ids = []
+        self.last_value = None
+
+    def add(self, threshold, rule_id, upward):
+        thresholds, ids = (self.up_thresholds, self.up_ids) if upward else (self.down_thresholds, self.down_ids)
+        pos = bisect.bisect_right(thresholds, threshold)
+        thresholds.insert(pos, threshold)
+        ids.insert(pos, rule_id)
+
+    def remove(self, rule_id):
+        for thresholds, ids in ((self.up_thresholds, self.up_ids), (self.down_thresholds, self.down_ids)):
+            while rule_id in ids:
+                pos = ids.index(rule_id)
+                del thresholds[pos]
+                del ids[pos]
+
+    def is_empty(self):
+        return not self.up_ids and not self.down_ids
+
+    def crossed(self, value):
+        prev = self.last_value
+        self.last_value = value
+        if prev is None or value == prev:
+            return []
+        if value > prev:
+            # prev < 阈值 <= value
+            lo = bisect.bisect_right(self.up_thresholds, prev)
+            hi = bisect.bisect_right(self.up_thresholds, value)
+            return [(rule_id, True) for rule_id in self.up_ids[lo:hi]]
+        # value <= 阈值 < prev
+        lo = bisect.bisect_left(self.down_thresholds, value)
+        hi = bisect.bisect_left(self.down_thresholds, prev)
+        return [(rule_id, False) for rule_id in self.down_ids[lo:hi]]
+
+class AlertManager:
+    def __init__(self):
+        self.rules = []
+        self.rules_by_id = {}
+        self.indexes = {}
+        self.next_id = 1
+        self.listeners = []
+        self.portfolio = None
+        self.mtime = None
+        self.load()
+
+    def load(self, lock=True):
+        if os.path.exists(ALERTS_FILE):
+            try:
+                data, self.mtime = read_json(ALERTS_FILE, lock)
+                self.rules = data.get("rules", [])
+                self.next_id = data.get("next_id", len(self.rules) + 1)
+            except Exception as e:
+                print(f"加载提醒规则失败: {str(e)}")
+                self.rules = []
+        self.rebuild_index()
+
+    def save(self, lock=True):
+        try:
+            self.mtime = write_json(ALERTS_FILE, {"rules": self.rules, "next_id": self.next_id}, lock, indent=2)
+        except Exception as e:
+            print(f"保存提醒规则失败: {str(e)}")
+
+    def reload_if_changed(self, lock=True):
+        if file_mtime(ALERTS_FILE) == self.mtime:
+            return False
+        self.load(lock)
+        return True
+
+    def rebuild_index(self):
+        old_indexes = self.indexes
+        self.indexes = {}
+        self.rules_by_id = {}
+        for rule in self.rules:
+            self._index_rule(rule)
+        # 保留上一次观测值，避免重建索引后把当前状态误判为穿越
+        for key, index in self.indexes.items():
+            if key in old_indexes:
+                index.last_value = old_indexes[key].last_value
+
+    def _index_rule(self, rule):
+        self.rules_by_id[rule["id"]] = rule
+        key = (rule["code"], rule["field"])
+        index = self.indexes.get(key)
+        if index is None:
+            index = self.indexes[key] = AlertIndex()
+        threshold = rule["threshold"]
+        if rule["op"] == "above":
+            index.add(threshold, rule["id"], True)
+        elif rule["op"] == "below":
+            index.add(threshold, rule["id"], False)
+        else:
+            index.add(abs(threshold), rule["id"], True)
+            index.add(-abs(threshold), rule["id"], False)
+
+    # 与 HistoryManager 一样在文件锁内读-改-写，多个实例同时添加规则不会拿到相同的 id
+    def add_rule(self, code, field, op, threshold):
+        with file_lock(ALERTS_FILE):
+            self.reload_if_changed(lock=False)
+            rule = {
+                "id": self.next_id,
+                "code": code,
+                "field": field,
+                "op": op,
+                "threshold": float(threshold),
+                "enabled": True
+            }
+            self.next_id += 1
+            self.rules.append(rule)
+            self._index_rule(rule)
+            self.save(lock=False)
+        return rule
+
+    def remove_rule(self, rule_id):
+        with file_lock(ALERTS_FILE):
+            self.reload_if_changed(lock=False)
+            rule = self.rules_by_id.pop(rule_id, None)
+            if rule is None:
+                return False
+            self.rules = [r for r in self.rules if r["id"] != rule_id]
+            key = (rule["code"], rule["field"])
+            index = self.indexes.get(key)
+            if index is not None:
+                index.remove(rule_id)
+                if index.is_empty():
+                    del self.indexes[key]
+            self.save(lock=False)
+        return True
+
+    # funds 是有提醒规则的基金的当前值 {代码: {"name", 指标...}}，由调用方按行情给出，不限于当前组合；
+    # 组合汇总取自快照，切换组合后先重新记录一次，不把切换本身当成穿越
+    def evaluate(self, snapshot, funds):
+        totals = snapshot.get("totals", {})
+        if snapshot.get("portfolio") != self.portfolio:
+            self.portfolio = snapshot.get("portfolio")
+            for (code, field), index in self.indexes.items():
+                if code == PORTFOLIO_CODE:
+                    index.last_value = None
+        fired = []
+        for (code, field), index in self.indexes.items():
+            source = totals if code == PORTFOLIO_CODE else funds.get(code)
+            if not source or field not in source:
+                continue
+            value = source[field]
+            for rule_id, upward in index.crossed(value):
+                rule = self.rules_by_id.get(rule_id)
+                if rule and rule.get("enabled", True):
+                    fired.append((rule, value, upward))
+        for rule, value, upward in fired:
+            fund = funds.get(rule["code"], {})
+            name = "投资组合" if rule["code"] == PORTFOLIO_CODE else fund.get("name", rule["code"])
+            message = f"{self.describe(rule)}，当前 {self.format_value(rule['field'], value)}（{'上穿' if upward else '下穿'}）"
+            for listener in self.listeners:
+                listener(f"📢 {name}", message)
+        return fired
+
+    def watched_codes(self):
+        return {code for code, field in self.indexes if code != PORTFOLIO_CODE}
+
+    def describe(self, rule):
+        fields = PORTFOLIO_ALERT_FIELDS if rule["code"] == PORTFOLIO_CODE else FUND_ALERT_FIELDS
+        field_label = dict(fields).get(rule["field"], rule["field"])
+        op_label = dict(ALERT_OPS).get(rule["op"], rule["op"])
+        if rule["op"] == "abs":
+            threshold_text = self.format_value(rule["field"], abs(rule["threshold"])).lstrip("+")
+        else:
+            threshold_text = self.format_value(rule["field"], rule["threshold"])
+        return f"{field_label} {op_label} {threshold_text}"
+
+    @staticmethod
+    def format_value(field, value):
+        if field == "growth":
+            return f"{value:+.2f}%"
+        if field == "gsz":
+            return f"{value:.4f}"
+        return f"{value:+.2f}元"
+
+# ==================== 交易记录 ====================
+# 每只基金的买入/卖出/分红流水，追加写入 LEDGER_FILE（每行一笔），启动时顺序重放一次。
+# 持仓份额、剩余成本、已实现收益都是随交易增量维护的汇总值：记一笔交易或计算收益都不需要
+# 重新扫描流水。先进先出法把买入批次放在队列里，卖出只消耗队首批次
+class FundLedger:
+    def __init__(self, method=LEDGER_METHOD):
+        self.method = method
+        self.transactions = []
+        self.lots = deque()
+        self.shares = 0.0
+        self.cost_basis = 0.0
+        self.realized = 0.0
+        self.open_realized = 0.0
+        self.dividends = 0.0
+
+    @property
+    def avg_cost(self):
+        return self.cost_basis / self.shares if self.shares > 0 else 0.0
+
+    def unrealized(self, price):
+        return self.shares * price - self.cost_basis
+
+    # 返回本笔交易是否把持仓清空；清空时带回这一轮持仓的已实现收益和卖出前的份额、平均成本
+    def apply(self, tx):
+        self.transactions.append(tx)
+        kind = tx["type"]
+        fee = tx.get("fee", 0.0)
+        if kind == "buy":
+            shares = tx["shares"]
+            amount = shares * tx["price"] + fee
+            self.shares += shares
+            self.cost_basis += amount
+            if self.method == "fifo":
+                self.lots.append([shares, amount / shares])
+            return None
+        if kind == "dividend":
+            self.dividends += tx["amount"]
+            self.realized += tx["amount"]
+            self.open_realized += tx["amount"]
+            return None
+        shares = tx["shares"]
+        held_shares = self.shares
+        held_cost = self.avg_cost
+        if self.method == "average":
+            released = shares * held_cost
+        else:
+            released = 0.0
+            remaining = shares
+            while remaining > 1e-9 and self.lots:
+                lot = self.lots[0]
+                take = min(lot[0], remaining)
+                released += take * lot[1]
+                lot[0] -= take
+                remaining -= take
+                if lot[0] <= 1e-9:
+                    self.lots.popleft()
+        profit = shares * tx["price"] - fee - released
+        self.shares -= shares
+        self.cost_basis -= released
+        self.realized += profit
+        self.open_realized += profit
+        if self.shares <= 1e-9:
+            closed = (self.open_realized, held_shares, held_cost)
+            self.shares = 0.0
+            self.cost_basis = 0.0
+            self.lots.clear()
+            self.open_realized = 0.0
+            return closed
+        return None
+
+    def rebuild(self, method):
+        transactions = self.transactions
+        self.__init__(method)
+        for tx in transactions:
+            self.apply(tx)
+
+# 流水只追加，offset 记录已回放到的位置；其他实例追加的记录从这里接着回放即可
+class LedgerManager:
+    def __init__(self, path=LEDGER_FILE):
+        self.path = path
+        self.ledgers = {}
+        self.offset = 0
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with file_lock(self.path):
+                self._catch_up()
+        except Exception as e:
+            print(f"加载交易记录失败: {str(e)}")
+
+    def _catch_up(self):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                self._replay(record)
+
+    def reload_if_changed(self):
+        if not self.path or (os.path.getsize(self.path) if os.path.exists(self.path) else 0) == self.offset:
+            return False
+        self.load()
+        return True
+
+    def _replay(self, record):
+        key = (record["portfolio"], record["code"])
+        # 基金移出组合时记一条 reset，之后再加入的同一只基金从新的流水开始
+        if record["type"] == "reset":
+            self.ledgers.pop(key, None)
+            return None
+        ledger = self.ledgers.get(key)
+        if ledger is None:
+            ledger = self.ledgers[key] = FundLedger()
+        if record["type"] == "method":
+            ledger.rebuild(record["method"])
+            return None
+        return ledger.apply(record)
+
+    def _append(self, record):
+        if not self.path:
+            return
+        try:
+            with file_lock(self.path):
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                if os.path.exists(self.path):
+                    self._catch_up()
+                    # 上次写到一半中断留下的残行单独成行，回放时跳过
+                    if os.path.getsize(self.path) > self.offset:
+                        line = b"\n" + line
+                        self.offset = os.path.getsize(self.path)
+                with open(self.path, 'ab') as f:
+                    f.write(line)
+                self.offset += len(line)
+        except Exception as e:
+            print(f"保存交易记录失败: {str(e)}")
+
+    def get(self, portfolio, code):
+        ledger = self.ledgers.get((portfolio, code))
+        return ledger if ledger is not None and ledger.transactions else None
+
+    def add(self, portfolio, code, kind, shares=0.0, price=0.0, amount=0.0, fee=0.0, when=None):
+        record = {
+            "portfolio": portfolio,
+            "code": code,
+            "type": kind,
+            "time": when or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "shares": float(shares),
+            "price": float(price),
+            "amount": float(amount),
+            "fee": float(fee)
+        }
+        self._append(record)
+        return self._replay(record)
+
+    def set_method(self, portfolio, code, method):
+        record = {"portfolio": portfolio, "code": code, "type": "method", "method": method}
+        self._append(record)
+        self._replay(record)
+
+    def reset(self, portfolio, code):
+        if (portfolio, code) not in self.ledgers:
+            return
+        record = {"portfolio": portfolio, "code": code, "type": "reset",
+                  "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        self._append(record)
+        self._replay(record)
+
+# ==================== 自选管理 ====================
+# 自选中的一条持仓。行情不挂在持仓上，统一从 QuoteStore 读取，因此也不会被写进 watchlist.json；
+# 旧版本保存的 dwjz/gsz/growth 字段读取时忽略
+class Position:
+    __slots__ = ("code", "name", "cost", "shares", "is_closed", "last_profit")
+
+    def __init__(self, code, name=None, cost=0.0, shares=0.0, is_closed=False, last_profit=0.0):
+        self.code = code
+        self.name = name
+        self.cost = cost
+        self.shares = shares
+        self.is_closed = is_closed
+        self.last_profit = last_profit
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(str(data["code"]), data.get("name"), float(data.get("cost", 0)), float(data.get("shares", 0)),
+                   bool(data.get("is_closed", False)), float(data.get("last_profit", 0.0)))
+
+    def to_dict(self):
+        data = {"code": self.code, "name": self.name, "cost": self.cost, "shares": self.shares,
+                "is_closed": self.is_closed, "last_profit": self.last_profit}
+        if self.name is None:
+            del data["name"]
+        return data
+
+# 多个命名组合（不同家人、不同券商账户）。watchlist 始终指向当前组合；
+# 默认组合仍保存在 "funds" 中，旧版本读取同一文件时看到的就是默认组合
+class FundManager:
+    def __init__(self, quote_store=None):
+        self.portfolios = OrderedDict([(DEFAULT_PORTFOLIO, [])])
+        self.current = DEFAULT_PORTFOLIO
+        self.quote_store = quote_store if quote_store is not None else QuoteStore()
+        self.history_manager = HistoryManager()
+        self.alert_manager = AlertManager()
+        self.ledger = LedgerManager()
+        self.mtime = None
+        self.load()
+
+    @property
+    def watchlist(self):
+        return self.portfolios[self.current]
+
+    @watchlist.setter
+    def watchlist(self, funds):
+        self.portfolios[self.current] = funds
+
+    def load(self, lock=True):
+        if os.path.exists(DATA_FILE):
+            try:
+                data, self.mtime = read_json(DATA_FILE, lock)
+                self.portfolios = OrderedDict([(DEFAULT_PORTFOLIO, [Position.from_dict(fund) for fund in data.get("funds", [])])])
+                for name, portfolio in data.get("portfolios", {}).items():
+                    self.portfolios[name] = [Position.from_dict(fund) for fund in portfolio.get("funds", [])]
+                current = data.get("current", DEFAULT_PORTFOLIO)
+                self.current = current if current in self.portfolios else DEFAULT_PORTFOLIO
+            except Exception as e:
+                print(f"加载自选列表失败: {str(e)}")
+
+    def save(self, lock=True):
+        data = {"funds": [fund.to_dict() for fund in self.portfolios[DEFAULT_PORTFOLIO]]}
+        others = {name: {"funds": [fund.to_dict() for fund in funds]}
+                  for name, funds in self.portfolios.items() if name != DEFAULT_PORTFOLIO}
+        if others:
+            data["portfolios"] = others
+            data["current"] = self.current
+        try:
+            self.mtime = write_json(DATA_FILE, data, lock, indent=2)
+        except Exception as e:
+            print(f"保存自选列表失败: {str(e)}")
+
+    # 其他实例改过自选、历史、提醒或交易记录时重新读取；本实例正在查看的组合保持不变
+    def reload_if_changed(self, lock=True):
+        changed = self.ledger.reload_if_changed()
+        changed = self.history_manager.reload_if_changed() or changed
+        changed = self.alert_manager.reload_if_changed() or changed
+        if file_mtime(DATA_FILE) != self.mtime:
+            current = self.current
+            self.load(lock)
+            if current in self.portfolios:
+                self.current = current
+            changed = True
+        return changed
+
+    def portfolio_names(self):
+        return list(self.portfolios)
+
+    # 以下修改自选的操作都在文件锁内读-改-写：其他实例改过文件时先重新读取，在最新内容上修改后再保存，
+    # 不覆盖对方的改动。持仓对象在重新读取后会换成新的，所以都在锁内重新查找
+    def add_portfolio(self, name):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            if not name or name in self.portfolios:
+                return False
+            self.portfolios[name] = []
+            self.save(lock=False)
+        return True
+
+    def remove_portfolio(self, name):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            if name == DEFAULT_PORTFOLIO or name not in self.portfolios:
+                return False
+            for fund in self.portfolios.pop(name):
+                self.ledger.reset(name, fund.code)
+            if self.current == name:
+                self.current = DEFAULT_PORTFOLIO
+            self.save(lock=False)
+        return True
+
+    def switch_portfolio(self, name):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            if name not in self.portfolios or name == self.current:
+                return False
+            self.current = name
+            self.save(lock=False)
+        return True
+
+    # 所有组合持有基金代码的并集，当前组合排在前面；同一只基金只获取一次
+    def all_codes(self):
+        codes = dict.fromkeys(fund.code for fund in self.watchlist)
+        for funds in self.portfolios.values():
+            codes.update(dict.fromkeys(fund.code for fund in funds))
+        return list(codes)
+
+    def get_fund(self, code):
+        return next((fund for fund in self.watchlist if fund.code == code), None)
+
+    def current_price(self, code):
+        quote = self.quote_store.get(code)
+        return quote.gsz if quote is not None else 0
+
+    def get_ledger(self, code):
+        return self.ledger.get(self.current, code)
+
+    def add_fund(self, code, name, cost, shares):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            if self.get_fund(code) is not None:
+                return False
+            # 之前移出时没有留下 reset 的旧流水不再接管新加入的持仓
+            self.ledger.reset(self.current, code)
+            self.watchlist.append(Position(code, name, cost, shares))
+            self.save(lock=False)
+        return True
+
+    # 按交易记录计算持仓：第一次记账时把已有的持仓作为一笔期初买入，之后份额和成本都由流水汇总得出。
+    # 先校验再记账，被拒绝的交易不会留下期初买入
+    def add_transaction(self, code, kind, shares=0.0, price=0.0, amount=0.0, fee=0.0):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            return self._add_transaction(code, kind, shares, price, amount, fee)
+
+    def _add_transaction(self, code, kind, shares, price, amount, fee):
+        fund = self.get_fund(code)
+        if fund is None:
+            raise ValueError("基金不在当前组合中")
+        ledger = self.get_ledger(code)
+        held = ledger.shares if ledger is not None else fund.shares
+        if kind in ("buy", "sell") and (shares <= 0 or price <= 0):
+            raise ValueError("份额和价格必须 > 0")
+        if kind == "sell" and shares > held + 1e-9:
+            raise ValueError(f"卖出份额超过持仓 ({held:.2f})")
+        if kind == "dividend" and amount <= 0:
+            raise ValueError("分红金额必须 > 0")
+        if ledger is None and fund.shares > 0:
+            self.ledger.add(self.current, code, "buy", fund.shares, fund.cost)
+        closed = self.ledger.add(self.current, code, kind, shares, price, amount, fee)
+        ledger = self.get_ledger(code)
+        if closed is not None:
+            profit, closed_shares, closed_cost = closed
+            self.history_manager.record_closed_profit(self.current, code, fund.name or code, profit, closed_shares,
+                                                      closed_cost)
+            fund.last_profit = profit
+        fund.shares = ledger.shares
+        if ledger.shares > 0:
+            fund.cost = ledger.avg_cost
+        self.save(lock=False)
+        return ledger
+
+    def set_cost_method(self, code, method):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            fund = self.get_fund(code)
+            ledger = self.get_ledger(code)
+            if fund is None or ledger is None or ledger.method == method:
+                return False
+            self.ledger.set_method(self.current, code, method)
+            if ledger.shares > 0:
+                fund.cost = ledger.avg_cost
+            self.save(lock=False)
+        return True
+
+    # 批量导入：新基金追加到当前组合；已在组合中的按 merge 合并持仓或跳过，全部处理完只保存一次。
+    # 已按交易记录计算持仓的基金不在这里改动
+    def import_positions(self, positions, merge=True):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            return self._import_positions(positions, merge)
+
+    def _import_positions(self, positions, merge):
+        existing = {fund.code: fund for fund in self.watchlist}
+        added = []
+        merged = []
+        skipped = []
+        for code, name, shares, cost in positions:
+            fund = existing.get(code)
+            if fund is None:
+                self.ledger.reset(self.current, code)
+                fund = existing[code] = Position(code, name, cost, shares)
+                self.watchlist.append(fund)
+                added.append(code)
+            elif not merge:
+                skipped.append((code, "已在自选中"))
+            elif self.get_ledger(code) is not None:
+                skipped.append((code, "已有交易记录，请在交易记录中添加"))
+            else:
+                total = fund.shares + shares
+                fund.cost = (fund.shares * fund.cost + shares * cost) / total
+                fund.shares = total
+                fund.is_closed = False
+                merged.append(code)
+        if added or merged:
+            self.save(lock=False)
+        return added, merged, skipped
+
+    def update_fund(self, code, cost=None, shares=None):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            return self._update_fund(code, cost, shares)
+
+    def _update_fund(self, code, cost, shares):
+        fund = self.get_fund(code)
+        if fund is None:
+            return False
+        old_shares = fund.shares
+        current_shares = shares if shares is not None else old_shares
+        if old_shares > 0 and current_shares == 0:
+            closed_profit = old_shares * (self.current_price(code) - fund.cost)
+            self.history_manager.record_closed_profit(
+                self.current, code, fund.name or code, closed_profit, old_shares, fund.cost
+            )
+            fund.last_profit = closed_profit
+        if cost is not None:
+            fund.cost = float(cost)
+        if shares is not None:
+            fund.shares = float(shares)
+        if fund.is_closed and shares and shares > 0:
+            fund.is_closed = False
+        self.save(lock=False)
+        return True
+
+    def remove_fund(self, code):
+        with file_lock(DATA_FILE):
+            self.reload_if_changed(lock=False)
+            fund = self.get_fund(code)
+            if fund is None:
+                return False
+            if fund.shares > 0:
+                closed_profit = fund.shares * (self.current_price(code) - fund.cost)
+                self.history_manager.record_closed_profit(
+                    self.current, code, fund.name or code, closed_profit, fund.shares, fund.cost
+                )
+            self.watchlist = [f for f in self.watchlist if f.code != code]
+            self.ledger.reset(self.current, code)
+            self.save(lock=False)
+        return True
+
+# ==================== 批量导入 ====================
+# 读取 CSV 或券商导出的持仓文件（代码、份额、成本价）。有表头时按列名识别，没有表头时按前三列；
+# 同一文件中重复的代码合并为一条，份额相加、成本按份额加权
+def read_import_file(path):
+    text = None
+    for encoding in IMPORT_ENCODINGS:
+        try:
+            with open(path, 'r', encoding=encoding, newline='') as f:
+                text = f.read()
+            break
+        except UnicodeDecodeError:
+            continue
+    if text is None:
+        raise ValueError("无法识别文件编码")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",\t;")
+    except csv.Error:
+        dialect = csv.excel
+    columns = None
+    entries = OrderedDict()
+    errors = []
+    for line, row in enumerate(csv.reader(text.splitlines(), dialect), 1):
+        cells = [cell.strip().strip('="\'') for cell in row]
+        if not any(cells):
+            continue
+        if columns is None:
+            found = {field: next((i for i, cell in enumerate(cells) if cell.lower() in names), None)
+                     for field, names in IMPORT_COLUMNS.items()}
+            if all(i is not None for i in found.values()):
+                columns = found
+                continue
+            columns = {"code": 0, "shares": 1, "cost": 2}
+        try:
+            code = cells[columns["code"]]
+            shares = float(cells[columns["shares"]].replace(",", ""))
+            cost = float(cells[columns["cost"]].replace(",", ""))
+        except (IndexError, ValueError):
+            errors.append((line, ",".join(row), "格式错误"))
+            continue
+        # 表格软件会去掉代码前面的 0
+        if not code.isdigit() or len(code) > 6:
+            errors.append((line, code, "基金代码无效"))
+            continue
+        code = code.zfill(6)
+        if shares <= 0 or cost <= 0:
+            errors.append((line, code, "份额和成本价必须大于0"))
+            continue
+        entry = entries.get(code)
+        if entry is None:
+            entries[code] = [line, shares, cost]
+        else:
+            total = entry[1] + shares
+            entry[2] = (entry[1] * entry[2] + shares * cost) / total
+            entry[1] = total
+    return entries, errors
+
+# 所有代码一次性提交给行情获取（批量接口按块并发，缺失的再逐只获取），拿不到行情的视为无效
+def validate_import(fetcher, path):
+    entries, errors = read_import_file(path)
+    futures = fetcher.submit_many(entries)
+    wait(list(futures.values()), IMPORT_VALIDATE_TIMEOUT)
+    fetched_at = time.time()
+    valid = []
+    for code, (line, shares, cost) in entries.items():
+        future = futures[code]
+        quote = future.result() if future.done() and not future.exception() else None
+        if quote is None:
+            future.cancel()
+            errors.append((line, code, "未找到基金或获取超时"))
+            continue
+        valid.append((code, quote, shares, cost))
+    errors.sort()
+    return valid, errors, fetched_at
+
+# ==================== 数据导出 ====================
+# 清仓记录、收盘归档和交易流水按块流式写出：归档和流水逐行读取文件，每攒够 EXPORT_CHUNK_ROWS 行
+# 写一次，多年的数据也不会整体读进内存。先写到临时文件，完成后再替换目标文件
+# 给定 needles 时先在原始字节上筛一遍，不含任何一个的行不必解析；解析后仍会按字段精确过滤
+def iter_jsonl(path, needles=None):
+    if not path or not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        for line in f:
+            if needles and not any(needle in line for needle in needles):
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+def iter_export_rows(dataset, history_manager, ledger_path, codes=None, start=None, end=None):
+    if dataset == "history":
+        source = ({"portfolio": portfolio, "code": code, "name": fund.get("name"), **position}
+                  for portfolio, funds in list(history_manager.history.items())
+                  for code, fund in list(funds.items())
+                  for position in list(fund["closed_positions"]))
+    else:
+        needles = [code.encode("utf-8") for code in codes] if codes else None
+        if dataset == "daily":
+            source = iter_jsonl(ARCHIVE_FILE, needles)
+        else:
+            source = (record for record in iter_jsonl(ledger_path, needles) if record.get("type") not in ("method", "reset"))
+    date_field = EXPORT_DATE_FIELDS[dataset]
+    for row in source:
+        if codes and row.get("code") not in codes:
+            continue
+        date = str(row.get(date_field, ""))[:10]
+        if (start and date < start) or (end and date > end):
+            continue
+        yield row
+
+def export_rows(rows, path, fmt, columns):
+    temp_path = path + ".part"
+    try:
+        if fmt == "csv":
+            count = _export_csv(rows, temp_path, columns)
+        else:
+            count = _export_arrow(rows, temp_path, fmt, columns)
+        os.replace(temp_path, path)
+        return count
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def _export_csv(rows, path, columns):
+    names = [name for name, _ in columns]
+    count = 0
+    # 带 BOM 的 UTF-8，表格软件直接打开不乱码
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        while True:
+            chunk = list(itertools.islice(rows, EXPORT_CHUNK_ROWS))
+            if not chunk:
+                return count
+            writer.writerows([row.get(name) for name in names] for row in chunk)
+            count += len(chunk)
+
+def _export_arrow(rows, path, fmt, columns):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("导出 Parquet/Arrow 需要安装 pyarrow")
+    schema = pa.schema([(name, pa.float64() if kind == "float" else pa.string()) for name, kind in columns])
+    count = 0
+    with (pq.ParquetWriter(path, schema) if fmt == "parquet" else pa.ipc.new_file(path, schema)) as writer:
+        while True:
+            chunk = list(itertools.islice(rows, EXPORT_CHUNK_ROWS))
+            if not chunk:
+                return count
+            data = {}
+            for name, kind in columns:
+                cast = float if kind == "float" else str
+                data[name] = [None if row.get(name) is None else cast(row[name]) for row in chunk]
+            batch = pa.RecordBatch.from_pydict(data, schema=schema)
+            if fmt == "parquet":
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+            count += len(chunk)
+
+def arrow_available():
+    try:
+        import pyarrow
+    except ImportError:
+        return False
+    return True
+
+# ==================== 最近有效行情 ====================
+# 每只基金最近一次成功获取的行情，跨重启保存；按获取发起时间比较，较旧的结果不会覆盖较新的
+class QuoteStore:
+    def __init__(self, path=QUOTES_FILE):
+        self.path = path
+        self.quotes = {}
+        self.dirty = False
+        self.saving = False
+        self.last_saved = time.monotonic()
+        self.save_interval = QUOTE_SAVE_INTERVAL
+        self.mtime = None
+        self.load()
+
+    def load(self):
+        if self.path and os.path.exists(self.path):
+            try:
+                data, self.mtime = read_json(self.path)
+                self.quotes = {code: Quote.from_dict(quote) for code, quote in data.items()}
+            except Exception as e:
+                print(f"加载行情缓存失败: {str(e)}")
+                self.quotes = {}
+
+    # 非主实例读取主实例写下的行情，逐只按获取时间合并，本实例刚搜索/导入得到的较新行情不会被覆盖；
+    # 主实例已换成确认净值的行情总是取用，同一天的估值不会盖过它
+    def reload_if_changed(self):
+        if not self.path or file_mtime(self.path) == self.mtime:
+            return False
+        try:
+            data, self.mtime = read_json(self.path)
+        except Exception as e:
+            print(f"加载行情缓存失败: {str(e)}")
+            return False
+        changed = False
+        for code, item in data.items():
+            quote = Quote.from_dict(item)
+            current = self.quotes.get(code)
+            if current is None or self.supersedes(quote, current) or (
+                    (current.fetched_at or 0) < (quote.fetched_at or 0) and not self.supersedes(current, quote)):
+                self.quotes[code] = quote
+                changed = True
+        return changed
+
+    def save(self):
+        if not self.path:
+            self.dirty = False
+            return
+        try:
+            self.mtime = self._write(self.quotes)
+            self.dirty = False
+            self.last_saved = time.monotonic()
+        except Exception as e:
+            print(f"保存行情缓存失败: {str(e)}")
+
+    def _write(self, quotes):
+        return write_json(self.path, {code: quote.to_dict() for code, quote in quotes.items()}, sync=True)
+
+    # 有变化且到了间隔才写；给出 runner 时在后台线程中序列化和写入，界面线程只复制一份字典。
+    # Quote 存入后不再修改，复制出的字典在后台读取是安全的
+    def maybe_save(self, runner=None):
+        if not self.dirty or self.saving or time.monotonic() - self.last_saved < self.save_interval:
+            return
+        if runner is None or not self.path:
+            self.save()
+            return
+        self.saving = True
+        self.dirty = False
+        runner.submit(self._write, dict(self.quotes), callback=self._on_saved)
+
+    def _on_saved(self, mtime, error):
+        self.saving = False
+        self.last_saved = time.monotonic()
+        if error is not None:
+            print(f"保存行情缓存失败: {str(error)}")
+            self.dirty = True
+            return
+        self.mtime = mtime
+
+    def get(self, code):
+        return self.quotes.get(code)
+
+    # 已用确认净值替换估值的行情，同一天或更早的估值不再覆盖它
+    @staticmethod
+    def supersedes(quote, current):
+        return quote.confirmed and not current.confirmed and quote.time[:10] >= current.time[:10]
+
+    @staticmethod
+    def values(quote):
+        return quote.name, quote.dwjz, quote.gsz, quote.growth, quote.time, quote.nav_date, quote.confirmed
+
+    # 只有获取时间变了的行情不需要重新写入缓存
+    def update(self, code, quote, fetched_at):
+        current = self.quotes.get(code)
+        if current is not None and (current.fetched_at or 0) > fetched_at:
+            return False
+        if current is not None and self.supersedes(current, quote):
+            return False
+        stored = Quote(quote.name, quote.dwjz, quote.gsz, quote.growth, quote.time, fetched_at, quote.nav_date)
+        if current is None or self.values(current) != self.values(stored):
+            self.dirty = True
+        self.quotes[code] = stored
+        return True
+
+    # 确认净值替换估值 gsz，dwjz 换回前一日净值（行情中的 dwjz 可能已是这份确认净值），今日收益和涨幅按两者计算
+    def confirm(self, code, nav, date, prev_nav=None):
+        current = self.quotes.get(code)
+        if current is None:
+            return False
+        dwjz = prev_nav if prev_nav is not None else current.dwjz
+        growth = round((nav / dwjz - 1) * 100, 2) if dwjz else 0.0
+        self.quotes[code] = Quote(current.name, dwjz, nav, growth, date, time.time(), current.nav_date, True)
+        self.dirty = True
+        return True
+
+# ==================== 刷新调度 ====================
+# 所有刷新触发（定时器、手动刷新、编辑、添加基金）都经过这里：同一时间最多一次刷新在进行，
+# 进行中的额外请求合并为最多一次后续刷新。超过 REFRESH_SOFT_DEADLINE 仍未返回的请求不再
+# 阻塞本次刷新，返回后在后台补进行情；失败的基金继续显示最近一次有效行情并在后台重新获取
+class RefreshCoordinator(QObject):
+    refresh_started = pyqtSignal()
+    snapshot_ready = pyqtSignal(object)
+    _quote_arrived = pyqtSignal(object, object, object)
+
+    def __init__(self, fund_manager, fetcher, parent=None, quote_store=None, instance_lock=None):
+        super().__init__(parent)
+        self.fund_manager = fund_manager
+        self.fetcher = fetcher
+        self.quote_store = quote_store if quote_store is not None else fund_manager.quote_store
+        # 没有实例锁时（测试、脚本）总是自己获取行情
+        self.instance_lock = instance_lock
+        self.leader = instance_lock is None
+        if instance_lock is not None:
+            self.quote_store.save_interval = SHARED_QUOTE_SAVE_INTERVAL
+        self.runner = TaskRunner(max_workers=1, parent=self)
+        # 行情缓存在单独的线程中写入，不排在等待刷新结果的任务后面
+        self.save_runner = TaskRunner(max_workers=1, parent=self)
+        self.in_flight = False
+        self.pending = False
+        self.generation = 0
+        self.latest_snapshot = None
+        self.outstanding = set()
+        self.failed_codes = set()
+        self.refresh_started_at = 0.0
+        self.pending_full = False
+        self.tick = 0
+        self.visible_codes = {}
+        self.accuracy = AccuracyTracker()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.request_refresh)
+        # 后台补进的行情合并成一次快照更新
+        self.rebuild_timer = QTimer(self)
+        self.rebuild_timer.setSingleShot(True)
+        self.rebuild_timer.setInterval(200)
+        self.rebuild_timer.timeout.connect(self.publish_snapshot)
+        self._quote_arrived.connect(self._on_late_quote)
+
+    def start(self, delay=500):
+        self.timer.start(REFRESH_INTERVAL)
+        QTimer.singleShot(delay, self.request_refresh)
+
+    def stop(self):
+        self.timer.stop()
+        self.runner.shutdown()
+        # 等后台的写入结束再写最后一次，旧的内容不会在之后覆盖新的
+        self.save_runner.shutdown(wait=True)
+        if self.leader and (self.quote_store.dirty or self.quote_store.saving):
+            self.quote_store.save()
+        if self.instance_lock is not None:
+            self.instance_lock.release()
+
+    def request_refresh(self, full=False):
+        self.pending_full = self.pending_full or full
+        if self.in_flight:
+            if not self.pending:
+                metrics.inc("refresh_coalesced_total")
+            self.pending = True
+            return
+        self._start_refresh()
+
+    def update_leadership(self):
+        if not self.leader and self.instance_lock.try_acquire():
+            self.leader = True
+            print("已成为主实例，开始获取行情")
+        return self.leader
+
+    # 非主实例不发请求，直接读取主实例写下的行情和其他实例改过的数据文件
+    def _follow(self):
+        self.pending = False
+        self.pending_full = False
+        self.quote_store.reload_if_changed()
+        self.fund_manager.reload_if_changed()
+        self.publish_snapshot()
+
+    def _start_refresh(self):
+        if not self.update_leadership():
+            self._follow()
+            return
+        self.fund_manager.reload_if_changed()
+        self.in_flight = True
+        self.pending = False
+        full, self.pending_full = self.pending_full, False
+        profiler.begin_cycle()
+        self.refresh_started_at = time.perf_counter()
+        futures = self._submit(self.select_codes(full))
+        self.refresh_started.emit()
+        self.runner.submit(
+            wait, [future for future, _ in futures.values()], REFRESH_SOFT_DEADLINE,
+            callback=lambda result, error, f=futures: self._on_fetched(f)
+        )
+
+    # 视野内的基金和有提醒规则的基金每次都获取，并排在前面先提交；其余基金按在自选中的
+    # 位置分成 OFFSCREEN_REFRESH_EVERY 组轮流获取。还没有任何视图上报可见行时全部获取
+    def select_codes(self, full=False):
+        self.tick += 1
+        all_codes = self.fund_manager.all_codes()
+        if full or not self.visible_codes:
+            return all_codes
+        priority = self.fund_manager.alert_manager.watched_codes().union(*self.visible_codes.values())
+        slot = self.tick % OFFSCREEN_REFRESH_EVERY
+        codes = []
+        offscreen = []
+        for i, code in enumerate(all_codes):
+            if code in priority or self.quote_store.get(code) is None:
+                codes.append(code)
+            elif i % OFFSCREEN_REFRESH_EVERY == slot:
+                offscreen.append(code)
+        metrics.inc("offscreen_deferred_total", len(all_codes) - len(codes) - len(offscreen))
+        return codes + offscreen
+
+    def set_visible_codes(self, view, codes):
+        previous = self.visible_codes.get(view, set())
+        self.visible_codes[view] = codes
+        # 刚滚动进视野的基金如果行情已超过一个刷新周期，不等下一次刷新立即获取
+        now = time.time()
+        stale = []
+        for code in codes - previous:
+            quote = self.quote_store.get(code)
+            if quote is None or now - quote.fetched_at > REFRESH_INTERVAL / 1000:
+                stale.append(code)
+        if stale:
+            self.fetch_in_background(stale, "visible_fetches_total")
+
+    def _submit(self, codes):
+        # 仍在进行中的请求不重复发送
+        fetched_at = time.time()
+        codes = [code for code in dict.fromkeys(codes) if code not in self.outstanding]
+        futures = {}
+        for code, future in self.fetcher.submit_many(codes).items():
+            self.outstanding.add(code)
+            futures[code] = (future, fetched_at)
+        return futures
+
+    def _on_fetched(self, futures):
+        self.in_flight = False
+        metrics.observe("fetch_seconds", time.perf_counter() - self.refresh_started_at)
+        failed = []
+        try:
+            for code, (future, fetched_at) in futures.items():
+                if future.done():
+                    if not self._apply_result(code, future, fetched_at):
+                        failed.append(code)
+                else:
+                    metrics.inc("late_quotes_total")
+                    future.add_done_callback(lambda f, c=code, t=fetched_at: self._quote_arrived.emit(c, f, t))
+            self.publish_snapshot()
+            metrics.observe("refresh_seconds", time.perf_counter() - self.refresh_started_at)
+        except Exception as e:
+            metrics.inc("refresh_failures_total", stage="snapshot")
+            print(f"刷新数据失败: {str(e)}")
+        finally:
+            profiler.end_cycle()
+        if failed:
+            QTimer.singleShot(REVALIDATE_DELAY, lambda codes=failed: self.revalidate(codes))
+        if self.pending:
+            self._start_refresh()
+
+    def revalidate(self, codes):
+        self.fetch_in_background(codes, "revalidations_total")
+
+    def fetch_in_background(self, codes, counter):
+        if not self.leader:
+            return
+        watched = set(self.fund_manager.all_codes())
+        futures = self._submit(code for code in codes if code in watched)
+        for code, (future, fetched_at) in futures.items():
+            metrics.inc(counter)
+            future.add_done_callback(lambda f, c=code, t=fetched_at: self._quote_arrived.emit(c, f, t))
+
+    def _on_late_quote(self, code, future, fetched_at):
+        if self._apply_result(code, future, fetched_at):
+            self.rebuild_timer.start()
+
+    def _apply_result(self, code, future, fetched_at):
+        self.outstanding.discard(code)
+        est = None if future.cancelled() or future.exception() else future.result()
+        if not est:
+            self.failed_codes.add(code)
+            return False
+        self.failed_codes.discard(code)
+        self.quote_store.update(code, est, fetched_at)
+        return True
+
+    def publish_snapshot(self):
+        self.generation += 1
+        snapshot = self.build_snapshot(self.generation)
+        self.latest_snapshot = snapshot
+        # 提醒只由主实例发出，多个实例不会重复通知
+        if self.leader:
+            self.fund_manager.alert_manager.evaluate(snapshot, self.alert_values())
+        self.snapshot_ready.emit(snapshot)
+        if self.leader:
+            self.quote_store.maybe_save(self.save_runner)
+
+    # 有提醒规则的基金按行情取值，只在其他组合中持有的基金也照常判断，切换组合不影响；
+    # 基金的今日收益按所有组合持有份额的合计计算。获取失败的基金不参与判断
+    def alert_values(self):
+        watched = self.fund_manager.alert_manager.watched_codes()
+        if not watched:
+            return {}
+        shares = dict.fromkeys(watched, 0.0)
+        names = {}
+        for funds in self.fund_manager.portfolios.values():
+            for fund in funds:
+                if fund.code in shares:
+                    shares[fund.code] += fund.shares
+                    names.setdefault(fund.code, fund.name)
+        values = {}
+        for code in watched:
+            quote = self.quote_store.get(code)
+            if quote is None or code in self.failed_codes:
+                continue
+            values[code] = {"name": names.get(code) or quote.name, "growth": quote.growth, "gsz": quote.gsz,
+                            "today_profit": shares[code] * (quote.gsz - quote.dwjz)}
+        return values
+
+    def build_snapshot(self, generation):
+        now = time.time()
+        funds = []
+        total_today_profit = 0
+        total_yesterday_value = 0
+        total_value = 0
+        total_cost = 0
+        ledgers = self.fund_manager.ledger.ledgers
+        portfolio = self.fund_manager.current
+        total_realized = 0
+        total_error_band = 0
+        for fund in self.fund_manager.watchlist:
+            code = fund.code
+            quote = self.quote_store.get(code)
+            has_quote = quote is not None
+            ledger = ledgers.get((portfolio, code))
+            # 持仓期间部分卖出和分红的已实现收益；清仓后转入历史收益
+            realized = ledger.open_realized if ledger is not None else 0.0
+            total_realized += realized
+            if has_quote:
+                name = fund.name or quote.name
+                dwjz = quote.dwjz
+                gsz = quote.gsz
+                growth = quote.growth
+                age = now - quote.fetched_at
+            else:
+                name = fund.name or code
+                dwjz = gsz = growth = 0
+                age = None
+            cost = fund.cost
+            shares = fund.shares
+            today_profit = shares * (gsz - dwjz)
+            stale = not has_quote or code in self.failed_codes
+            accuracy = self.accuracy.get(code)
+            # 按历史平均误差估计今日收益可能的偏差；已经换成确认净值的基金没有误差
+            error_band = 0.0
+            if accuracy is not None and has_quote and not quote.confirmed:
+                error_band = shares * dwjz * accuracy.mae / 100
+            funds.append({
+                "code": code,
+                "name": name,
+                "cost": cost,
+                "shares": shares,
+                "dwjz": dwjz,
+                "gsz": gsz,
+                "growth": growth,
+                "today_profit": today_profit,
+                "total_profit": shares * (gsz - cost) + realized,
+                "realized": realized,
+                "error_band": error_band,
+                "accuracy": accuracy,
+                "ok": not stale,
+                "has_quote": has_quote,
+                "age": age
+            })
+            # 没有任何行情的基金无法估值，不计入汇总，避免把成本误算成亏损
+            if not has_quote:
+                continue
+            total_yesterday_value += shares * dwjz
+            total_today_profit += today_profit
+            total_error_band += error_band
+            total_value += shares * gsz
+            total_cost += shares * cost
+        total_closed_profit = self.fund_manager.history_manager.get_total_closed_profit(portfolio)
+        current_profit = total_value - total_cost + total_realized
+        # 其他组合复用同一份行情，只计算汇总，不生成逐行数据
+        portfolios = OrderedDict()
+        for portfolio_name, positions in self.fund_manager.portfolios.items():
+            if portfolio_name == self.fund_manager.current:
+                portfolios[portfolio_name] = {"today_profit": total_today_profit, "current_profit": current_profit,
+                                              "value": total_value, "count": len(positions)}
+            else:
+                portfolios[portfolio_name] = self.portfolio_totals(positions)
+        return {
+            "generation": generation,
+            "time": datetime.now(),
+            "funds": funds,
+            "portfolio": self.fund_manager.current,
+            "portfolios": portfolios,
+            "totals": {
+                "today_profit": total_today_profit,
+                "today_error_band": total_error_band,
+                "yesterday_value": total_yesterday_value,
+                "value": total_value,
+                "cost": total_cost,
+                "current_profit": current_profit,
+                "closed_profit": total_closed_profit,
+                "realized_profit": total_realized,
+                "total_profit": current_profit + total_closed_profit
+            }
+        }
+
+    def portfolio_totals(self, positions):
+        today_profit = 0
+        value = 0
+        cost = 0
+        for fund in positions:
+            quote = self.quote_store.get(fund.code)
+            if quote is None:
+                continue
+            today_profit += fund.shares * (quote.gsz - quote.dwjz)
+            value += fund.shares * quote.gsz
+            cost += fund.shares * fund.cost
+        return {"today_profit": today_profit, "current_profit": value - cost, "value": value, "count": len(positions)}
+
+    def switch_portfolio(self, name):
+        # 各组合共用行情缓存，切换后立即用已有行情重算，不需要重新获取
+        if self.fund_manager.switch_portfolio(name):
+            self.publish_snapshot()
+
+# ==================== 估值准确度 ====================
+# 每只基金收盘前最后一次估值与确认净值之差，按涨幅百分点计：(估值 - 净值) / 前一日净值 * 100。
+# 只保存累计量和误差最大的几天，新的一天到来时 O(1) 更新
+class EstimateAccuracy:
+    __slots__ = ("count", "error_sum", "abs_sum", "worst", "last_date")
+
+    def __init__(self):
+        self.count = 0
+        self.error_sum = 0.0
+        self.abs_sum = 0.0
+        self.worst = []
+        self.last_date = ""
+
+    @property
+    def bias(self):
+        return self.error_sum / self.count if self.count else 0.0
+
+    @property
+    def mae(self):
+        return self.abs_sum / self.count if self.count else 0.0
+
+    def observe(self, date, error):
+        # 同一天在多个组合中各有一条归档，只计一次
+        if date <= self.last_date:
+            return False
+        self.last_date = date
+        self.count += 1
+        self.error_sum += error
+        self.abs_sum += abs(error)
+        heapq.heappush(self.worst, (abs(error), date, error))
+        if len(self.worst) > ACCURACY_WORST_DAYS:
+            heapq.heappop(self.worst)
+        return True
+
+    def worst_days(self):
+        return [(date, error) for _, date, error in sorted(self.worst, reverse=True)]
+
+class AccuracyTracker:
+    def __init__(self):
+        self.stats = {}
+
+    def get(self, code):
+        return self.stats.get(code)
+
+    def observe(self, code, date, estimate, nav, prev_nav):
+        if not prev_nav:
+            return False
+        stats = self.stats.get(code)
+        if stats is None:
+            stats = self.stats[code] = EstimateAccuracy()
+        return stats.observe(date, (estimate - nav) / prev_nav * 100)
+
+# ==================== 收盘归档 ====================
+# 收盘后并发获取持仓基金的确认净值，替换当天的估值，并按 (日期, 组合, 基金) 向 archive.jsonl
+# 追加一条当日记录。已归档的条目启动时读入，重复运行只补缺少的部分；每条记录获取到就写入，
+# 中途退出后下次启动从断点继续，写了一半的末行读取时跳过。文件只追加，像交易记录一样从上次读到的
+# 位置继续读取，非主实例借此跟上主实例写下的记录和准确度统计
+class NavArchiver(QObject):
+    _nav_arrived = pyqtSignal(object, object)
+
+    def __init__(self, fund_manager, coordinator, path=ARCHIVE_FILE, parent=None):
+        super().__init__(parent)
+        self.fund_manager = fund_manager
+        self.coordinator = coordinator
+        self.quote_store = coordinator.quote_store
+        self.accuracy = coordinator.accuracy
+        self.path = path
+        self.archived = set()
+        self.outstanding = set()
+        # 历史净值中没有前一日净值、当天无法归档的 (日期, 代码)，当天不再重复获取
+        self.unavailable = set()
+        # 每轮开始时建立的 {代码: [(组合, 持仓)]}，获取和写入时不再逐只扫描所有组合
+        self.holders = {}
+        self.offset = 0
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.run)
+        self._nav_arrived.connect(self._on_nav)
+        self.coordinator.snapshot_ready.connect(self._on_snapshot)
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return False
+        latest = {}
+        try:
+            with file_lock(self.path):
+                self._catch_up(latest)
+        except Exception as e:
+            print(f"加载收盘归档失败: {str(e)}")
+        # 上次确认后行情缓存可能还没来得及保存，按归档重新替换一次
+        for code, (date, nav, prev_nav) in latest.items():
+            quote = self.quote_store.get(code)
+            if quote is not None and not quote.confirmed and quote.time[:10] == date:
+                self.quote_store.confirm(code, nav, date, prev_nav)
+        return bool(latest)
+
+    def _catch_up(self, latest):
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self.offset += len(line)
+                try:
+                    record = json.loads(line)
+                    date, code, nav, prev_nav = record["date"], record["code"], record["nav"], record["prev_nav"]
+                    self.archived.add((date, record["portfolio"], code))
+                    self.accuracy.observe(code, date, record["estimate"], nav, prev_nav)
+                except (ValueError, KeyError):
+                    continue
+                if date >= latest.get(code, ("",))[0]:
+                    latest[code] = (date, nav, prev_nav)
+
+    def reload_if_changed(self):
+        if not self.path or (os.path.getsize(self.path) if os.path.exists(self.path) else 0) == self.offset:
+            return False
+        return self.load()
+
+    # 非主实例每次读取完主实例的行情后顺带读入新的归档，有新记录时重新生成一次快照
+    def _on_snapshot(self, snapshot):
+        if not self.coordinator.leader and self.reload_if_changed():
+            self.coordinator.rebuild_timer.start()
+
+    def start(self, delay=5000):
+        self.timer.start(ARCHIVE_INTERVAL)
+        QTimer.singleShot(delay, self.run)
+
+    def stop(self):
+        self.timer.stop()
 
-    def get_total_closed_profit(self, code=None):
-        total = 0.0
-        if code:
-            if code in self.history:
-                for pos in self.history[code]["closed_positions"]:
-                    total += pos["profit"]
-        else:
-            for fund in self.history.values():
-                for pos in fund["closed_positions"]:
-                    total += pos["profit"]
-        return total
+    def build_holders(self):
+        holders = {}
+        for name, funds in self.fund_manager.portfolios.items():
+            for fund in funds:
+                if fund.shares > 0:
+                    holders.setdefault(fund.code, []).append((name, fund))
+        return holders
 
-    def get_fund_history(self, code):
-        return self.history.get(code, None)
+    # 以行情时间所在的交易日为准；当天收盘前不获取。缓存中的行情仍是之前交易日的（上次退出后还没刷新）时，
+    # 未归档的部分随时补上
+    def pending_codes(self):
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        closed = (now.hour, now.minute) >= ARCHIVE_START
+        codes = []
+        for code, holders in self.holders.items():
+            quote = self.quote_store.get(code)
+            if quote is None or code in self.outstanding:
+                continue
+            date = quote.time[:10]
+            if (date == today and not closed) or (date, code) in self.unavailable:
+                continue
+            if any((date, name, code) not in self.archived for name, _ in holders):
+                codes.append(code)
+        return codes
 
-# ==================== 自选管理 ====================
-class FundManager:
-    def __init__(self):
-        self.watchlist = []
-        self.history_manager = HistoryManager()
-        self.load()
+    def run(self):
+        if not self.coordinator.leader:
+            return
+        # 刚接替主实例时先读入之前的主实例写下的记录，不重复归档
+        self.reload_if_changed()
+        self.holders = self.build_holders()
+        codes = self.pending_codes()
+        if not codes:
+            return
+        self.outstanding.update(codes)
+        # 行情中的 dwjz 已是估值当日公布的净值时，前一日净值要从历史净值中取
+        history_codes = set()
+        for code in codes:
+            quote = self.quote_store.get(code)
+            if quote.nav_date >= quote.time[:10]:
+                history_codes.add(code)
+        for code, future in self.coordinator.fetcher.submit_navs(codes, history_codes).items():
+            future.add_done_callback(lambda f, c=code: self._nav_arrived.emit(c, f))
 
-    def load(self):
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.watchlist = data.get("funds", [])
-                    for fund in self.watchlist:
-                        fund.setdefault("last_profit", 0.0)
-                        fund.setdefault("is_closed", False)
-            except Exception as e:
-                print(f"加载自选列表失败: {str(e)}")
+    def _on_nav(self, code, future):
+        self.outstanding.discard(code)
+        result = None if future.cancelled() or future.exception() else future.result()
+        quote = self.quote_store.get(code)
+        # 净值还没公布（日期仍是前一交易日）时留到下一轮
+        if result is None or quote is None or result[0] != quote.time[:10]:
+            return
+        date, nav, prev_nav = result
+        dwjz = quote.dwjz
+        # 行情中的 dwjz 已经是这份净值时以历史净值中的前一条为前一日净值；历史净值只有一条时当天放弃
+        if date <= quote.nav_date:
+            if prev_nav is None:
+                self.unavailable.add((date, code))
+                return
+            dwjz = prev_nav
+        estimate = quote.gsz
+        records = []
+        for name, fund in self.holders.get(code, ()):
+            if (date, name, code) in self.archived:
+                continue
+            records.append({
+                "date": date, "portfolio": name, "code": code, "name": fund.name or quote.name,
+                "nav": nav, "prev_nav": dwjz, "estimate": estimate, "shares": fund.shares, "cost": fund.cost,
+                "profit": round(fund.shares * (nav - dwjz), 2),
+                "position_profit": round(fund.shares * (nav - fund.cost), 2)
+            })
+        if records and not self._append(records):
+            return
+        self.archived.update((date, record["portfolio"], code) for record in records)
+        if records:
+            self.accuracy.observe(code, date, estimate, nav, dwjz)
+        self.quote_store.confirm(code, nav, date, dwjz)
+        self.coordinator.rebuild_timer.start()
 
-    def save(self):
+    def _append(self, records):
+        if not self.path:
+            return True
         try:
-            with open(DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump({"funds": self.watchlist}, f, ensure_ascii=False, indent=2)
+            with file_lock(self.path), open(self.path, 'ab+') as f:
+                # 上次写到一半中断时先补上换行，新记录从新的一行开始
+                f.seek(0, os.SEEK_END)
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")
+                f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8"))
+            return True
         except Exception as e:
-            print(f"保存自选列表失败: {str(e)}")
-
-    def update_fund(self, code, cost=None, shares=None):
-        for fund in self.watchlist:
-            if fund["code"] == code:
-                old_shares = fund.get("shares", 0)
-                current_shares = shares if shares is not None else old_shares
-                if old_shares > 0 and current_shares == 0:
-                    dwjz = fund.get("dwjz", 0)
-                    gsz = fund.get("gsz", dwjz)
-                    closed_profit = old_shares * (gsz - fund.get("cost", 0))
-                    self.history_manager.record_closed_profit(
-                        code, fund.get("name", code), closed_profit, old_shares, fund.get("cost", 0)
-                    )
-                    fund["last_profit"] = closed_profit
-                if cost is not None:
-                    fund["cost"] = float(cost)
-                if shares is not None:
-                    fund["shares"] = float(shares)
-                if fund.get("is_closed") and shares and shares > 0:
-                    fund["is_closed"] = False
-                self.save()
-                return True
-        return False
-
-    def remove_fund(self, code):
-        for fund in self.watchlist:
-            if fund["code"] == code and fund["shares"] > 0:
-                dwjz = fund.get("dwjz", 0)
-                gsz = fund.get("gsz", dwjz)
-                closed_profit = fund["shares"] * (gsz - fund["cost"])
-                self.history_manager.record_closed_profit(
-                    code, fund.get("name", code), closed_profit, fund["shares"], fund["cost"]
-                )
-        self.watchlist = [f for f in self.watchlist if f["code"] != code]
-        self.save()
+            print(f"保存收盘归档失败: {str(e)}")
+            return False
 
 # ==================== 悬浮按钮 ====================
 class FloatingButton(QWidget):
@@ -296,8 +2737,80 @@ class ResizableWindow(QWidget):
         self.max_width = SWITCH_THRESHOLD
         self.float_button = FloatingButton()
         self.float_button.clicked.connect(self.show_from_hidden)
+        self.pending_snapshot = None
+        self.visible_rows_timer = QTimer(self)
+        self.visible_rows_timer.setSingleShot(True)
+        self.visible_rows_timer.setInterval(VISIBLE_ROWS_DEBOUNCE)
+        self.visible_rows_timer.timeout.connect(self.report_visible_codes)
         self.setMouseTracking(True)
 
+    # 窗口隐藏到边缘、最小化或切换到另一模式时暂停渲染，只记住最新的快照，
+    # 重新可见时一次性应用
+    def is_view_visible(self):
+        return self.isVisible() and not self.isMinimized() and self.hidden_side is None
+
+    def defer_snapshot(self, snapshot):
+        if self.is_view_visible():
+            return False
+        self.pending_snapshot = snapshot
+        metrics.inc("render_skipped_total", view=type(self).__name__)
+        return True
+
+    def flush_pending_snapshot(self):
+        if self.pending_snapshot is not None and self.is_view_visible():
+            snapshot, self.pending_snapshot = self.pending_snapshot, None
+            self.apply_snapshot(snapshot)
+
+    def apply_snapshot(self, snapshot):
+        pass
+
+    # 向刷新调度上报当前能看到的基金，供其优先获取；不可见时上报空集合
+    def schedule_visible_report(self):
+        self.visible_rows_timer.start()
+
+    def report_visible_codes(self):
+        coordinator = getattr(self, 'coordinator', None)
+        if coordinator is not None:
+            coordinator.set_visible_codes(type(self).__name__, self.visible_codes() if self.is_view_visible() else set())
+
+    def visible_codes(self):
+        return set()
+
+    # 组合下拉框，两个窗口共用；各组合的今日收益显示在提示中
+    def create_portfolio_combo(self):
+        combo = QComboBox()
+        combo.setToolTip("切换组合")
+        combo.activated.connect(lambda index: self.coordinator.switch_portfolio(combo.itemText(index)))
+        return combo
+
+    def sync_portfolio_combo(self, combo, snapshot):
+        portfolios = snapshot["portfolios"]
+        names = list(portfolios)
+        if [combo.itemText(i) for i in range(combo.count())] != names:
+            combo.clear()
+            combo.addItems(names)
+        if combo.currentText() != snapshot["portfolio"]:
+            combo.setCurrentText(snapshot["portfolio"])
+        for i, name in enumerate(names):
+            totals = portfolios[name]
+            combo.setItemData(i, f"{totals['count']} 只基金  今日 {totals['today_profit']:+.2f}元  "
+                                 f"持有收益 {totals['current_profit']:+.2f}元", Qt.ToolTipRole)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.flush_pending_snapshot()
+        self.schedule_visible_report()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.schedule_visible_report()
+
+    def changeEvent(self, event):
+        super().changeEvent(event)
+        if event.type() == QEvent.WindowStateChange:
+            self.flush_pending_snapshot()
+            self.schedule_visible_report()
+
     def get_resize_edge(self, pos):
         rect = self.rect()
         corner_size = self.resize_margin * 2
@@ -404,6 +2917,7 @@ class ResizableWindow(QWidget):
             return
         self.is_hidden = True
         self.hidden_side = side
+        self.schedule_visible_report()
         screen = QApplication.primaryScreen().geometry()
         animation = QPropertyAnimation(self, b"pos")
         animation.setDuration(300)
@@ -443,19 +2957,22 @@ class ResizableWindow(QWidget):
         animation.start()
         self.show_animation = animation
         self.hidden_side = None
+        self.flush_pending_snapshot()
+        self.schedule_visible_report()
 
 # ==================== 极简模式窗口 ====================
 class SimpleWindow(ResizableWindow):
     switch_to_full = pyqtSignal()
-    def __init__(self, fund_manager, fetcher):
+    def __init__(self, fund_manager, coordinator):
         super().__init__()
         self._switching = False
         self.fund_manager = fund_manager
-        self.fetcher = fetcher
-        self.timer = None
+        self.coordinator = coordinator
+        self.applied_generation = 0
         self.current_data = []
         self.init_ui()
-        QTimer.singleShot(800, self.refresh_data)
+        self.coordinator.refresh_started.connect(self.on_refresh_started)
+        self.coordinator.snapshot_ready.connect(self.apply_snapshot)
 
     def init_ui(self):
         self.setWindowFlags(Qt.WindowStaysOnTopHint | Qt.FramelessWindowHint | Qt.Tool)
@@ -498,11 +3015,13 @@ class SimpleWindow(ResizableWindow):
             background: rgba(191, 219, 254, 180);
         }
         """)
+        self.list_widget.verticalScrollBar().valueChanged.connect(self.schedule_visible_report)
         layout.addWidget(self.list_widget)
         self.status_label = QLabel("正在初始化...")
         self.status_label.setFont(get_app_font(DEFAULT_FONT_SIZE, 0, True))
         self.status_label.setAlignment(Qt.AlignCenter)
         self.status_label.setStyleSheet("color: #64748b; padding: 5px;")
+        self.status_color = None
         layout.addWidget(self.status_label)
         self.switch_to_full_btn = QPushButton("⇄ 切换到完整版")
         self.switch_to_full_btn.setFont(get_app_font(DEFAULT_FONT_SIZE, 1, True))
@@ -567,6 +3086,11 @@ class SimpleWindow(ResizableWindow):
         title.setStyleSheet("color: #1e40af;")
         title.setCursor(Qt.SizeAllCursor)
         layout.addWidget(title, 1)
+        # 只有一个组合时不占标题栏空间
+        self.portfolio_combo = self.create_portfolio_combo()
+        self.portfolio_combo.setFont(get_app_font(DEFAULT_FONT_SIZE))
+        self.portfolio_combo.hide()
+        layout.addWidget(self.portfolio_combo)
         hide_btn = QPushButton("📌")
         hide_btn.setFont(get_app_font(DEFAULT_FONT_SIZE))
         hide_btn.setToolTip("隐藏到边缘")
@@ -576,7 +3100,7 @@ class SimpleWindow(ResizableWindow):
         refresh_btn = QPushButton("🔄")
         refresh_btn.setFont(get_app_font(DEFAULT_FONT_SIZE))
         refresh_btn.setToolTip("立即刷新")
-        refresh_btn.clicked.connect(self.refresh_data)
+        refresh_btn.clicked.connect(self.manual_refresh)
         refresh_btn.setFixedSize(28, 28)
         refresh_btn.setStyleSheet(self.get_button_style("#dbeafe", "#bfdbfe"))
         close_btn = QPushButton("×")
@@ -612,68 +3136,78 @@ class SimpleWindow(ResizableWindow):
         else:
             self.hide_to_edge('left')
 
-    def setup_timer(self):
-        if self.timer is None:
-            self.timer = QTimer()
-            self.timer.timeout.connect(self.refresh_data)
-            self.timer.start(REFRESH_INTERVAL)
-
     def refresh_data(self):
-        if self.timer is None:
-            self.setup_timer()
-        self.status_label.setText("🔄 正在刷新...")
-        self.status_label.setStyleSheet("color: #2563eb;")
-        QApplication.processEvents()
-        self.update_data()
-
-    def update_data(self):
+        self.coordinator.request_refresh()
+
+    def manual_refresh(self):
+        self.coordinator.request_refresh(full=True)
+
+    def visible_codes(self):
+        viewport = self.list_widget.viewport()
+        first = self.list_widget.indexAt(QPoint(0, 0)).row()
+        if first < 0:
+            return set()
+        last = self.list_widget.indexAt(QPoint(0, viewport.height() - 1)).row()
+        if last < 0:
+            last = self.list_widget.count() - 1
+        return {self.list_widget.item(row).data(Qt.UserRole) for row in range(first, last + 1)}
+
+    def on_refresh_started(self):
+        if self.is_view_visible():
+            self.set_status("🔄 正在刷新...", "#2563eb")
+
+    def set_status(self, text, color):
+        self.status_label.setText(text)
+        # 样式表每次设置都会重新解析，颜色不变时跳过
+        if color != self.status_color:
+            self.status_color = color
+            self.status_label.setStyleSheet(f"color: {color};")
+
+    def apply_snapshot(self, snapshot):
+        if snapshot["generation"] <= self.applied_generation or self.defer_snapshot(snapshot):
+            return
+        self.applied_generation = snapshot["generation"]
         try:
-            funds = self.fund_manager.watchlist
+            self.sync_portfolio_combo(self.portfolio_combo, snapshot)
+            self.portfolio_combo.setVisible(len(snapshot["portfolios"]) > 1)
+            funds = snapshot["funds"]
             if not funds:
                 self.list_widget.clear()
                 self.summary_label.setText("暂无持仓数据\n点击完整版添加基金")
-                self.status_label.setText("无数据")
-                self.status_label.setStyleSheet("color: #64748b;")
+                self.set_status("无数据", "#64748b")
                 return
-            self.list_widget.clear()
-            total_today_profit = 0
-            total_yesterday_value = 0
-            total_value = 0
-            total_cost = 0
-            total_closed_profit = self.fund_manager.history_manager.get_total_closed_profit()
+            started = time.perf_counter()
+            row = 0
             for fund in funds:
-                est = self.fetcher.get_fund_estimate(fund["code"])
-                if est:
-                    name = fund.get("name", est["name"])
-                    growth = est["growth"]
-                    shares = fund["shares"]
-                    dwjz = est["dwjz"]
-                    gsz = est["gsz"]
-                    today_profit = shares * (gsz - dwjz)
-                    name_display = name[:8] + ".." if len(name) > 10 else name
-                    item_text = f"{name_display}  {growth:+.2f}%  {today_profit:+.2f}元"
-                    item = QListWidgetItem(item_text)
+                if not fund["has_quote"]:
+                    continue
+                name = fund["name"]
+                growth = fund["growth"]
+                today_profit = fund["today_profit"]
+                name_display = name[:8] + ".." if len(name) > 10 else name
+                item_text = f"{name_display}  {growth:+.2f}%  {today_profit:+.2f}元"
+                if not fund["ok"]:
+                    item_text += f"  ⏱{format_age(fund['age'])}" if fund["age"] is not None else "  ⏱"
+                # 复用已有的列表项，只更新内容，避免每次刷新都重建
+                item = self.list_widget.item(row)
+                if item is None:
+                    item = QListWidgetItem()
                     item.setFont(get_app_font(DEFAULT_FONT_SIZE))
-                    if growth > 0:
-                        item.setForeground(QColor(220, 38, 38))
-                    elif growth < 0:
-                        item.setForeground(QColor(21, 128, 61))
-                    else:
-                        item.setForeground(QColor(75, 85, 99))
-                    item.setData(Qt.UserRole, {
-                        "code": fund["code"],
-                        "name": name,
-                        "growth": growth,
-                        "today_profit": today_profit
-                    })
                     self.list_widget.addItem(item)
-                    total_yesterday_value += shares * dwjz
-                    total_today_profit += today_profit
-                    total_value += shares * gsz
-                    total_cost += shares * fund["cost"]
-            total_profit = (total_value - total_cost) + total_closed_profit
-            total_rate = (total_profit / (total_cost + 1e-6)) * 100
-            today_rate = (total_today_profit / (total_yesterday_value + 1e-6)) * 100
+                row += 1
+                item.setText(item_text)
+                item.setForeground(get_profit_color(growth) or NEUTRAL_COLOR)
+                if item.data(Qt.UserRole) != fund["code"]:
+                    item.setData(Qt.UserRole, fund["code"])
+            while self.list_widget.count() > row:
+                self.list_widget.takeItem(self.list_widget.count() - 1)
+            self.schedule_visible_report()
+            totals = snapshot["totals"]
+            total_today_profit = totals["today_profit"]
+            total_closed_profit = totals["closed_profit"]
+            total_profit = totals["total_profit"]
+            total_rate = (total_profit / (totals["cost"] + 1e-6)) * 100
+            today_rate = (total_today_profit / (totals["yesterday_value"] + 1e-6)) * 100
             today_icon = get_weather_icon(today_rate)
             total_icon = get_weather_icon(total_rate)
             summary_text = f"{today_icon} 今日: {total_today_profit:+.2f}元 ({today_rate:+.2f}%)\n{total_icon} 累计: {total_profit:+.2f}元 ({total_rate:+.2f}%)"
@@ -682,18 +3216,23 @@ class SimpleWindow(ResizableWindow):
             elif total_closed_profit < 0:
                 summary_text += f"\n(历史收益: {total_closed_profit:.2f}元)"
             self.summary_label.setText(summary_text)
-            current_time = datetime.now().strftime("%H:%M:%S")
-            self.status_label.setText(f"已更新: {current_time}")
-            self.status_label.setStyleSheet("color: #047857;")
+            metrics.observe("render_seconds", time.perf_counter() - started, view="simple")
+            current_time = snapshot["time"].strftime("%H:%M:%S")
+            stale_count = sum(1 for fund in funds if not fund["ok"])
+            if stale_count:
+                self.set_status(f"已更新: {current_time}（{stale_count} 只使用缓存数据）", "#b45309")
+            else:
+                self.set_status(f"已更新: {current_time}", "#047857")
         except Exception as e:
+            metrics.inc("refresh_failures_total", view="simple")
             print(f"更新数据失败: {str(e)}")
-            self.status_label.setText(f"❌ 更新失败: {str(e)}")
-            self.status_label.setStyleSheet("color: #dc2626;")
+            self.set_status(f"❌ 更新失败: {str(e)}", "#dc2626")
 
     def resizeEvent(self, event):
         super().resizeEvent(event)
         if hasattr(self, 'container'):
             self.container.setGeometry(0, 0, self.width(), self.height())
+        self.schedule_visible_report()
         if self._switching or not self.isVisible():
             return
         if self.width() >= SWITCH_THRESHOLD - 5:
@@ -701,27 +3240,396 @@ class SimpleWindow(ResizableWindow):
             self.switch_to_full.emit()
 
     def closeEvent(self, event):
-        if self.timer and self.timer.isActive():
-            self.timer.stop()
         self.float_button.close()
         event.accept()
 
+# ==================== 自选表格模型 ====================
+# 表格只保存快照里的行，单元格文本在视图绘制可见行时才生成。
+# 排序/筛选结果保存在 order 中：按 (排序键, 行号) 有序的列表，降序时倒着取。
+# 报价变化时只把排序键变了的行用 bisect 移到新位置，不必每次刷新都整体重排
+class FundTableModel(QAbstractTableModel):
+    edit_requested = pyqtSignal(str, int, str)
+    HEADERS = ["代码", "名称", "成本价", "份额", "预估净值", "今日涨幅", "今日收益", "累计收益", "操作"]
+    EDITABLE_COLUMNS = (2, 3)
+    ACTION_COLUMN = 8
+    SORT_FIELDS = {0: "code", 1: "name", 2: "cost", 3: "shares", 4: "gsz",
+                   5: "growth", 6: "today_profit", 7: "total_profit"}
+    QUOTE_FIELDS = ("gsz", "growth", "today_profit", "total_profit")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.codes = []
+        self.order = []
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self.filter_text = ""
+        self.display_rows = None
+        self.metadata = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def row_at(self, display_row):
+        if self.sort_order == Qt.DescendingOrder:
+            display_row = len(self.order) - 1 - display_row
+        return self.order[display_row][1]
+
+    def entry_at(self, display_row):
+        return self.rows[self.row_at(display_row)]
+
+    def display_row_of(self, code):
+        if self.display_rows is None:
+            self.display_rows = {self.codes[self.row_at(row)]: row for row in range(len(self.order))}
+        return self.display_rows.get(code)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        fund = self.entry_at(index.row())
+        col = index.column()
+        if role == Qt.DisplayRole:
+            return self.display_text(fund, col)
+        if role == Qt.EditRole:
+            if col == 2:
+                return f"{fund['cost']:.4f}"
+            if col == 3:
+                return f"{fund['shares']:.2f}"
+            return self.display_text(fund, col)
+        if role == Qt.ForegroundRole:
+            if not fund["has_quote"]:
+                return None
+            if col == 4 and not fund["ok"]:
+                return NEUTRAL_COLOR
+            if col in (5, 6, 7):
+                return get_profit_color(fund[self.SORT_FIELDS[col]])
+            return None
+        if role == Qt.ToolTipRole:
+            if col == 1:
+                # 悬停时才查询基金资料，缺失的在后台获取，下次悬停即可看到
+                if self.metadata is None:
+                    return fund["name"]
+                return "\n".join([fund["name"]] + self.metadata.describe(fund["code"]))
+            if col == 4:
+                if not fund["has_quote"]:
+                    return "暂无行情数据"
+                if not fund["ok"]:
+                    age_text = format_age(fund["age"]) if fund["age"] is not None else "之前"
+                    return f"行情获取失败，显示{age_text}的数据，正在后台重新获取"
+            if col in (5, 6):
+                return self.accuracy_tooltip(fund)
+            return None
+        return None
+
+    def accuracy_tooltip(self, fund):
+        accuracy = fund["accuracy"]
+        if accuracy is None:
+            return None
+        lines = [f"估值误差（{accuracy.count}个交易日）: 平均偏差 {accuracy.bias:+.2f}%  平均绝对误差 {accuracy.mae:.2f}%"]
+        if fund["error_band"] > 0:
+            lines.append(f"今日收益可能偏差 ±{fund['error_band']:.2f}元")
+        lines.append("误差最大的几天:")
+        lines.extend(f"  {date}  {error:+.2f}%" for date, error in accuracy.worst_days())
+        return "\n".join(lines)
+
+    def display_text(self, fund, col):
+        if col == 0:
+            return fund["code"]
+        if col == 1:
+            return fund["name"]
+        if col == 2:
+            return f"{fund['cost']:.4f}"
+        if col == 3:
+            return f"{fund['shares']:.2f}"
+        if col == self.ACTION_COLUMN:
+            return None
+        if not fund["has_quote"]:
+            return "--"
+        if col == 4:
+            return f"{fund['gsz']:.4f}" if fund["ok"] else f"⏱{fund['gsz']:.4f}"
+        if col == 5:
+            return f"{fund['growth']:+.2f}%"
+        return f"{fund[self.SORT_FIELDS[col]]:+.2f}"
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() in self.EDITABLE_COLUMNS:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if role != Qt.EditRole or not index.isValid() or index.column() not in self.EDITABLE_COLUMNS:
+            return False
+        if str(value).strip() == self.data(index, Qt.EditRole):
+            return False
+        self.edit_requested.emit(self.entry_at(index.row())["code"], index.column(), str(value))
+        return True
+
+    def sort_key(self, row):
+        if self.sort_column < 0:
+            return row
+        field = self.SORT_FIELDS[self.sort_column]
+        fund = self.rows[row]
+        if field in self.QUOTE_FIELDS and not fund["has_quote"]:
+            return float("-inf")
+        return fund[field]
+
+    def matches(self, fund):
+        text = self.filter_text
+        return not text or text in fund["code"] or text in fund["name"].casefold()
+
+    def rebuild_order(self):
+        self.order = sorted((self.sort_key(row), row) for row, fund in enumerate(self.rows) if self.matches(fund))
+        self.display_rows = None
+
+    def update_rows(self, funds):
+        codes = [fund["code"] for fund in funds]
+        if codes != self.codes:
+            self.beginResetModel()
+            self.rows = funds
+            self.codes = codes
+            self.rebuild_order()
+            self.endResetModel()
+            return
+        old_rows = self.rows
+        changed = [row for row, fund in enumerate(funds) if fund != old_rows[row]]
+        if not changed:
+            self.rows = funds
+            return
+        # 拿到行情后名称由代码变为基金名称，过滤条件可能由不命中变为命中或反之，这时重新过滤
+        renamed = [row for row in changed if funds[row]["name"] != old_rows[row]["name"]]
+        if self.filter_text and any(self.matches(old_rows[row]) != self.matches(funds[row]) for row in renamed):
+            self.beginResetModel()
+            self.rows = funds
+            self.rebuild_order()
+            self.endResetModel()
+            return
+        old_keys = None
+        if self.sort_column >= 0:
+            old_keys = {row: self.sort_key(row) for row in changed}
+        self.rows = funds
+        if old_keys is not None:
+            moved = [row for row in changed if old_keys[row] != self.sort_key(row)]
+            if moved:
+                self._begin_layout_change()
+                if len(moved) > len(funds) * FULL_RESORT_RATIO:
+                    self.rebuild_order()
+                else:
+                    for row in moved:
+                        old_entry = (old_keys[row], row)
+                        pos = bisect.bisect_left(self.order, old_entry)
+                        if pos < len(self.order) and self.order[pos] == old_entry:
+                            del self.order[pos]
+                            bisect.insort(self.order, (self.sort_key(row), row))
+                    self.display_rows = None
+                self._end_layout_change()
+        # 只通知内容有变化的行，相邻的行合并成一段
+        display_rows = sorted(r for r in (self.display_row_of(self.codes[row]) for row in changed) if r is not None)
+        start = 0
+        for i in range(1, len(display_rows) + 1):
+            if i == len(display_rows) or display_rows[i] != display_rows[i - 1] + 1:
+                self.dataChanged.emit(self.index(display_rows[start], 0),
+                                      self.index(display_rows[i - 1], self.ACTION_COLUMN - 1))
+                start = i
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column == self.ACTION_COLUMN:
+            column = -1
+        self._begin_layout_change()
+        self.sort_column = column
+        self.sort_order = order if column >= 0 else Qt.AscendingOrder
+        self.rebuild_order()
+        self._end_layout_change()
+
+    def set_filter(self, text):
+        text = text.strip().casefold()
+        if text == self.filter_text:
+            return
+        self.beginResetModel()
+        self.filter_text = text
+        self.rebuild_order()
+        self.endResetModel()
+
+    # 选中行等持久索引按基金代码跟随到新位置
+    def _begin_layout_change(self):
+        self.layoutAboutToBeChanged.emit()
+        self._persistent = [(index, self.entry_at(index.row())["code"]) for index in self.persistentIndexList()]
+
+    def _end_layout_change(self):
+        old_indexes, new_indexes = [], []
+        for index, code in self._persistent:
+            row = self.display_row_of(code)
+            old_indexes.append(index)
+            new_indexes.append(self.index(row, index.column()) if row is not None else QModelIndex())
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self._persistent = []
+        self.layoutChanged.emit()
+
+# 表格内的操作按钮由委托直接绘制，不为每行创建 QWidget/QPushButton
+class ButtonDelegate(QStyledItemDelegate):
+    clicked = pyqtSignal(int, int)
+
+    def __init__(self, labels, tooltips=None, parent=None, bg_color=None, hover_color=None):
+        super().__init__(parent)
+        self.labels = labels
+        self.tooltips = tooltips or labels
+        self.bg_color = bg_color or QColor(59, 130, 246)
+        self.hover_color = hover_color or QColor(37, 99, 235)
+
+    def button_rects(self, rect):
+        height = max(16, min(rect.height() - 8, 30))
+        width = max(40, int(height * 1.6))
+        spacing = 4
+        total = len(self.labels) * width + (len(self.labels) - 1) * spacing
+        x = rect.x() + max(0, (rect.width() - total) // 2)
+        y = rect.y() + (rect.height() - height) // 2
+        return [QRect(x + i * (width + spacing), y, width, height) for i in range(len(self.labels))]
+
+    def button_at(self, rect, pos):
+        for i, button_rect in enumerate(self.button_rects(rect)):
+            if button_rect.contains(pos):
+                return i
+        return -1
+
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        hovered = -1
+        if option.state & QStyle.State_MouseOver and option.widget is not None:
+            hovered = self.button_at(option.rect, option.widget.viewport().mapFromGlobal(QCursor.pos()))
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setFont(option.font)
+        for i, rect in enumerate(self.button_rects(option.rect)):
+            path = QPainterPath()
+            radius = min(rect.width(), rect.height()) * 0.25
+            path.addRoundedRect(QRectF(rect), radius, radius)
+            painter.fillPath(path, self.hover_color if i == hovered else self.bg_color)
+            painter.setPen(QColor(255, 255, 255))
+            painter.drawText(rect, Qt.AlignCenter, self.labels[i])
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            button = self.button_at(option.rect, event.pos())
+            if button >= 0:
+                self.clicked.emit(index.row(), button)
+                return True
+        return super().editorEvent(event, model, option, index)
+
+    def helpEvent(self, event, view, option, index):
+        if event.type() == QEvent.ToolTip:
+            button = self.button_at(option.rect, event.pos())
+            if button >= 0:
+                QToolTip.showText(event.globalPos(), self.tooltips[button], view)
+                return True
+        return super().helpEvent(event, view, option, index)
+
+# 清仓记录按页从 HistoryManager 取出：视图滚动到底部时 Qt 调用 fetchMore 再取一页，
+# 打开对话框只需要准备第一页，记录再多也不会卡
+class ClosedPositionModel(QAbstractTableModel):
+    HEADERS = ["时间", "份额", "成本价", "收益金额", "操作"]
+    ACTION_COLUMN = 4
+
+    def __init__(self, history_manager, portfolio, code, parent=None):
+        super().__init__(parent)
+        self.history_manager = history_manager
+        self.portfolio = portfolio
+        self.code = code
+        self.total = history_manager.count_closed_positions(portfolio, code)
+        self.positions = history_manager.get_closed_positions(portfolio, code, 0, HISTORY_PAGE_SIZE)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.positions)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and len(self.positions) < self.total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        page = self.history_manager.get_closed_positions(self.portfolio, self.code, len(self.positions),
+                                                         HISTORY_PAGE_SIZE)
+        if not page:
+            self.total = len(self.positions)
+            return
+        start = len(self.positions)
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self.positions.extend(page)
+        self.endInsertRows()
+
+    def position_at(self, row):
+        return self.positions[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        position = self.positions[index.row()]
+        col = index.column()
+        if role == Qt.DisplayRole:
+            if col == 0:
+                return position["close_time"]
+            if col == 1:
+                return f"{position['shares']:.2f}"
+            if col == 2:
+                return f"{position['cost']:.4f}"
+            if col == 3:
+                return f"{position['profit']:+.2f}"
+            return None
+        if role == Qt.ForegroundRole and col == 3:
+            return get_profit_color(position["profit"])
+        if role == Qt.TextAlignmentRole and col in (1, 2, 3):
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
 # ==================== 完整模式窗口 ====================
 class FullWindow(ResizableWindow):
     switch_to_simple = pyqtSignal()
-    def __init__(self, fund_manager, fetcher):
+    def __init__(self, fund_manager, coordinator):
         super().__init__()
         self.fund_manager = fund_manager
-        self.fetcher = fetcher
-        self.timer = None
+        self.coordinator = coordinator
+        self.fetcher = coordinator.fetcher
+        self.applied_generation = 0
         self.show_search_panel = True
-        self.last_search_text = ""
+        self.search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        self.search_runner = TaskRunner(max_workers=2, parent=self)
+        # 导出可能耗时较长，单独一个线程，不占用搜索
+        self.export_runner = TaskRunner(max_workers=1, parent=self)
+        self.search_future = None
+        self.search_seq = 0
+        self.metadata = FundMetadataCache(self.fetcher, parent=self)
+        self.metadata.updated.connect(self.on_metadata_updated)
         self.min_width = SWITCH_THRESHOLD
         self.max_width = FULL_MODE_MAX_WIDTH
         self.base_font_size = DEFAULT_FONT_SIZE
         self.dynamic_font_size = self.base_font_size
+        self.applied_font_size = None
+        # 拖动窗口边缘时连续的 resize 事件合并为停止拖动后的一次字体更新
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_DEBOUNCE)
+        self.resize_timer.timeout.connect(self.update_font_sizes)
         self.init_ui()
-        self.setup_timer()
+        self.coordinator.snapshot_ready.connect(self.apply_snapshot)
+        if self.coordinator.latest_snapshot is not None:
+            self.apply_snapshot(self.coordinator.latest_snapshot)
+        QTimer.singleShot(500, self.refresh_data)
 
     def init_ui(self):
         self.setWindowFlags(Qt.WindowStaysOnTopHint | Qt.FramelessWindowHint | Qt.Tool)
@@ -743,8 +3651,13 @@ class FullWindow(ResizableWindow):
         self.search_btn = QPushButton("🔍 搜索")
         self.search_btn.setFixedHeight(42)
         self.search_btn.clicked.connect(self.search_fund)
+        self.import_btn = QPushButton("📥 导入")
+        self.import_btn.setToolTip("从 CSV 或券商导出的持仓文件批量导入（代码、份额、成本价）")
+        self.import_btn.setFixedHeight(42)
+        self.import_btn.clicked.connect(self.import_funds)
         search_layout.addWidget(self.search_input, 4)
         search_layout.addWidget(self.search_btn, 1)
+        search_layout.addWidget(self.import_btn, 1)
         search_panel_layout.addLayout(search_layout)
         self.search_result_label = QLabel("")
         self.search_result_label.setWordWrap(True)
@@ -780,33 +3693,44 @@ class FullWindow(ResizableWindow):
         self.add_group.setLayout(add_layout)
         search_panel_layout.addWidget(self.add_group)
         main_layout.addWidget(self.search_panel)
-        self.table = QTableWidget()
-        self.table.setColumnCount(9)
-        self.table.setHorizontalHeaderLabels([
-            "代码", "名称", "成本价", "份额", "预估净值",
-            "今日涨幅", "今日收益", "累计收益", "操作"
-        ])
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("筛选代码或名称")
+        self.filter_input.setClearButtonEnabled(True)
+        self.filter_input.textChanged.connect(self.apply_filter)
+        main_layout.addWidget(self.filter_input)
+        self.table_model = FundTableModel(self)
+        self.table_model.metadata = self.metadata
+        # 排队执行：编辑器提交完成后再更新持仓，避免在 setData 内部重置模型
+        self.table_model.edit_requested.connect(self.finish_inline_edit, Qt.QueuedConnection)
+        self.table = QTableView()
+        self.table.setModel(self.table_model)
         self.table.setAlternatingRowColors(True)
         self.table.setShowGrid(True)
         self.table.horizontalHeader().setStretchLastSection(False)
         self.table.verticalHeader().setVisible(False)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.setEditTriggers(QAbstractItemView.DoubleClicked | QAbstractItemView.EditKeyPressed)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
         self.table.setWordWrap(False)
+        self.table.setMouseTracking(True)
         self.table.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        # 列宽由 fit_table_columns 按字号设定，不用 ResizeToContents 逐行测量
         header = self.table.horizontalHeader()
-        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        for col in TABLE_COLUMN_SAMPLES:
+            header.setSectionResizeMode(col, QHeaderView.Interactive)
         header.setSectionResizeMode(1, QHeaderView.Stretch)
-        header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(4, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(5, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(6, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(7, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(8, QHeaderView.Fixed)
-        header.resizeSection(8, 120)
-        self.table.cellDoubleClicked.connect(self.on_cell_double_clicked)
+        header.setSectionResizeMode(FundTableModel.ACTION_COLUMN, QHeaderView.Fixed)
+        header.resizeSection(FundTableModel.ACTION_COLUMN, 160)
+        # 初始不排序，保持自选列表顺序；点击表头后按该列排序
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.action_delegate = ButtonDelegate(["DEL", "HIS", "TX"], ["删除", "查看历史", "交易记录"], self.table)
+        self.action_delegate.clicked.connect(self.on_action_clicked)
+        self.table.setItemDelegateForColumn(FundTableModel.ACTION_COLUMN, self.action_delegate)
+        self.table.verticalScrollBar().valueChanged.connect(self.schedule_visible_report)
+        self.table_model.modelReset.connect(self.schedule_visible_report)
+        self.table_model.layoutChanged.connect(self.schedule_visible_report)
         main_layout.addWidget(self.table)
         self.summary_box = QWidget()
         summary_layout = QHBoxLayout(self.summary_box)
@@ -822,6 +3746,10 @@ class FullWindow(ResizableWindow):
         summary_layout.addWidget(self.history_label)
         summary_layout.addStretch()
         main_layout.addWidget(self.summary_box)
+        self.diagnostics_panel = self.create_diagnostics_panel()
+        self.diagnostics_panel.hide()
+        main_layout.addWidget(self.diagnostics_panel)
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.toggle_diagnostics)
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         layout.addWidget(self.container)
@@ -840,16 +3768,23 @@ class FullWindow(ResizableWindow):
         max_size = 16
         width_factor = min(2.0, max(0.8, self.width() / 800))
         dynamic_size = base_size * width_factor
-        return max(min_size, min(max_size, dynamic_size))
+        # 量化到整数字号档位，同一档位的字体和样式表都只生成一次
+        return int(round(max(min_size, min(max_size, dynamic_size))))
 
     def update_font_sizes(self):
-        self.dynamic_font_size = self.get_dynamic_font_size()
+        font_size = self.get_dynamic_font_size()
+        if font_size == self.applied_font_size:
+            return
+        self.applied_font_size = font_size
+        self.dynamic_font_size = font_size
         self.setFont(get_app_font(self.dynamic_font_size))
         self.update_stylesheet()
         self.update_table_style()
         self.update_summary_style()
         self.search_input.setFont(get_app_font(self.dynamic_font_size))
+        self.filter_input.setFont(get_app_font(self.dynamic_font_size))
         self.search_btn.setFont(get_app_font(self.dynamic_font_size, 0, True))
+        self.import_btn.setFont(get_app_font(self.dynamic_font_size, 0, True))
         self.search_result_label.setFont(get_app_font(self.dynamic_font_size))
         self.cost_input.setFont(get_app_font(self.dynamic_font_size))
         self.shares_input.setFont(get_app_font(self.dynamic_font_size))
@@ -861,6 +3796,7 @@ class FullWindow(ResizableWindow):
             header.setFont(get_app_font(self.dynamic_font_size, 0, True))
         row_height = max(30, int(self.dynamic_font_size * 3.5))
         self.table.verticalHeader().setDefaultSectionSize(row_height)
+        self.fit_table_columns()
         self.today_label.setFont(get_app_font(self.dynamic_font_size, 2, True))
         self.total_label.setFont(get_app_font(self.dynamic_font_size, 2, True))
         self.history_label.setFont(get_app_font(self.dynamic_font_size, 2, True))
@@ -868,15 +3804,24 @@ class FullWindow(ResizableWindow):
 
     def update_title_bar_buttons(self):
         btn_height = int(self.dynamic_font_size * 2.2)
-        for btn in [self.toggle_search_btn, self.hide_btn, self.refresh_btn, self.minimize_btn, self.close_btn]:
+        self.portfolio_combo.setFont(get_app_font(self.dynamic_font_size))
+        self.portfolio_combo.setFixedHeight(btn_height)
+        for btn in [self.add_portfolio_btn, self.remove_portfolio_btn]:
+            btn.setFixedSize(btn_height, btn_height)
+        for btn in [self.toggle_search_btn, self.hide_btn, self.refresh_btn, self.alert_btn, self.export_btn,
+                    self.minimize_btn, self.close_btn]:
             if btn.objectName() != "close_btn":
                 btn.setFixedHeight(btn_height)
             else:
                 btn.setFixedSize(btn_height, btn_height)
 
     def update_stylesheet(self):
-        font_size = self.dynamic_font_size
-        self.container.setStyleSheet(f"""
+        self.container.setStyleSheet(self.build_container_stylesheet(self.dynamic_font_size))
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def build_container_stylesheet(font_size):
+        return f"""
         #container {{
             background: white;
             border-radius: 16px;
@@ -926,18 +3871,22 @@ class FullWindow(ResizableWindow):
         QLabel {{
             font-size: {font_size}px;
         }}
-        """)
+        """
 
     def update_table_style(self):
-        font_size = self.dynamic_font_size
-        self.table.setStyleSheet(f"""
-        QTableWidget {{
+        self.table.setStyleSheet(self.build_table_stylesheet(self.dynamic_font_size))
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def build_table_stylesheet(font_size):
+        return f"""
+        QTableView {{
             border: 1px solid #e2e8f0;
             border-radius: 8px;
             gridline-color: #f1f5f9;
             font-size: {font_size}px;
         }}
-        QTableWidget::item {{
+        QTableView::item {{
             padding: 8px 6px;
         }}
         QHeaderView::section {{
@@ -962,11 +3911,15 @@ class FullWindow(ResizableWindow):
         QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {{
             height: 0px;
         }}
-        """)
+        """
 
     def update_summary_style(self):
-        font_size = self.dynamic_font_size
-        self.summary_box.setStyleSheet(f"""
+        self.summary_box.setStyleSheet(self.build_summary_stylesheet(self.dynamic_font_size))
+
+    @staticmethod
+    @lru_cache(maxsize=16)
+    def build_summary_stylesheet(font_size):
+        return f"""
         QWidget {{
             background: qlineargradient(x1:0, y1:0, x2:1, y2:0,
                 stop:0 #3b82f6, stop:1 #2563eb);
@@ -978,7 +3931,7 @@ class FullWindow(ResizableWindow):
             font-size: {font_size + 1}px;
             font-weight: bold;
         }}
-        """)
+        """
 
     def create_title_bar(self):
         title_bar = QWidget()
@@ -993,6 +3946,28 @@ class FullWindow(ResizableWindow):
         title.setCursor(Qt.SizeAllCursor)
         layout.addWidget(title, 1)
 
+        self.portfolio_combo = self.create_portfolio_combo()
+        self.portfolio_combo.setMinimumWidth(120)
+        self.add_portfolio_btn = RoundedButton("＋", self,
+            bg_color=QColor(219, 234, 254),
+            hover_color=QColor(191, 219, 254),
+            pressed_color=QColor(147, 197, 253)
+        )
+        self.add_portfolio_btn.setToolTip("新建组合")
+        self.add_portfolio_btn.clicked.connect(self.add_portfolio)
+        self.add_portfolio_btn.setFixedSize(34, 34)
+        self.remove_portfolio_btn = RoundedButton("－", self,
+            bg_color=QColor(219, 234, 254),
+            hover_color=QColor(191, 219, 254),
+            pressed_color=QColor(147, 197, 253)
+        )
+        self.remove_portfolio_btn.setToolTip("删除当前组合")
+        self.remove_portfolio_btn.clicked.connect(self.remove_portfolio)
+        self.remove_portfolio_btn.setFixedSize(34, 34)
+        layout.addWidget(self.portfolio_combo)
+        layout.addWidget(self.add_portfolio_btn)
+        layout.addWidget(self.remove_portfolio_btn)
+
         self.toggle_search_btn = RoundedButton("-", self,
             bg_color=QColor(219, 234, 254),
             hover_color=QColor(191, 219, 254),
@@ -1017,9 +3992,27 @@ class FullWindow(ResizableWindow):
             pressed_color=QColor(147, 197, 253)
         )
         self.refresh_btn.setToolTip("立即刷新")
-        self.refresh_btn.clicked.connect(self.refresh_data)
+        self.refresh_btn.clicked.connect(self.manual_refresh)
         self.refresh_btn.setFixedHeight(34)
 
+        self.alert_btn = RoundedButton("🔔 提醒", self,
+            bg_color=QColor(219, 234, 254),
+            hover_color=QColor(191, 219, 254),
+            pressed_color=QColor(147, 197, 253)
+        )
+        self.alert_btn.setToolTip("价格/收益提醒")
+        self.alert_btn.clicked.connect(self.show_alerts)
+        self.alert_btn.setFixedHeight(34)
+
+        self.export_btn = RoundedButton("📤 导出", self,
+            bg_color=QColor(219, 234, 254),
+            hover_color=QColor(191, 219, 254),
+            pressed_color=QColor(147, 197, 253)
+        )
+        self.export_btn.setToolTip("导出清仓记录、每日记录和交易流水")
+        self.export_btn.clicked.connect(self.show_export_dialog)
+        self.export_btn.setFixedHeight(34)
+
         self.minimize_btn = RoundedButton("⇄ 简洁版", self,
             bg_color=QColor(254, 243, 199),
             hover_color=QColor(253, 230, 138),
@@ -1041,10 +4034,69 @@ class FullWindow(ResizableWindow):
         layout.addWidget(self.toggle_search_btn)
         layout.addWidget(self.hide_btn)
         layout.addWidget(self.refresh_btn)
+        layout.addWidget(self.alert_btn)
+        layout.addWidget(self.export_btn)
         layout.addWidget(self.minimize_btn)
         layout.addWidget(self.close_btn)
         return title_bar
 
+    def create_diagnostics_panel(self):
+        panel = QGroupBox("诊断 (Ctrl+Shift+D)")
+        panel_layout = QVBoxLayout(panel)
+        self.diagnostics_text = QPlainTextEdit()
+        self.diagnostics_text.setReadOnly(True)
+        self.diagnostics_text.setFixedHeight(180)
+        self.diagnostics_text.setFont(QFont("Consolas", 9))
+        panel_layout.addWidget(self.diagnostics_text)
+        button_layout = QHBoxLayout()
+        self.metrics_checkbox = QCheckBox("采集指标")
+        self.metrics_checkbox.setChecked(metrics.enabled)
+        self.metrics_checkbox.toggled.connect(self.set_metrics_enabled)
+        reset_btn = QPushButton("重置")
+        reset_btn.clicked.connect(lambda: (metrics.reset(), self.update_diagnostics()))
+        json_btn = QPushButton("导出 JSON")
+        json_btn.clicked.connect(lambda: self.export_metrics("json"))
+        prom_btn = QPushButton("导出 Prometheus")
+        prom_btn.clicked.connect(lambda: self.export_metrics("prometheus"))
+        button_layout.addWidget(self.metrics_checkbox)
+        button_layout.addStretch(1)
+        button_layout.addWidget(reset_btn)
+        button_layout.addWidget(json_btn)
+        button_layout.addWidget(prom_btn)
+        panel_layout.addLayout(button_layout)
+        return panel
+
+    def toggle_diagnostics(self):
+        visible = not self.diagnostics_panel.isVisible()
+        self.diagnostics_panel.setVisible(visible)
+        if visible:
+            self.update_diagnostics()
+
+    def set_metrics_enabled(self, enabled):
+        metrics.enabled = enabled
+        self.update_diagnostics()
+
+    def update_diagnostics(self):
+        if not metrics.enabled:
+            self.diagnostics_text.setPlainText("指标采集未开启（勾选“采集指标”或设置环境变量 PROSPER_METRICS=1）")
+            return
+        self.diagnostics_text.setPlainText(metrics.summary())
+
+    def export_metrics(self, fmt):
+        if fmt == "json":
+            path, _ = QFileDialog.getSaveFileName(self, "导出指标", "metrics.json", "JSON (*.json)")
+            content = metrics.to_json()
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "导出指标", "metrics.prom", "Prometheus (*.prom *.txt)")
+            content = metrics.to_prometheus()
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        except Exception as e:
+            QMessageBox.warning(self, "导出失败", str(e))
+
     def toggle_search_panel(self):
         self.show_search_panel = not self.show_search_panel
         self.search_panel.setVisible(self.show_search_panel)
@@ -1058,40 +4110,73 @@ class FullWindow(ResizableWindow):
         else:
             self.hide_to_edge('left')
 
-    def setup_timer(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.refresh_data)
-        self.timer.start(REFRESH_INTERVAL)
-        QTimer.singleShot(500, self.refresh_data)
-
     def search_fund(self):
         code = self.search_input.text().strip()
         if not code:
             self.show_message("⚠️ 请输入基金代码", "error")
             return
-        if code == self.last_search_text:
+        # 新查询到达后，旧查询的结果一律丢弃；尚未开始的旧任务直接取消
+        self.search_seq += 1
+        if self.search_future is not None:
+            self.search_future.cancel()
+            self.search_future = None
+        est = self.search_cache.get(code)
+        metrics.inc("cache_requests_total", cache="search", result="hit" if est is not None else "miss")
+        if est is not None:
+            self.search_btn.setText("🔍 搜索")
+            self.show_search_result(code, est)
             return
-        self.last_search_text = code
-        self.search_btn.setEnabled(False)
         self.search_btn.setText("搜索中...")
         self.search_result_label.setText("🔍 正在搜索基金数据...")
         self.search_result_label.show()
-        QApplication.processEvents()
-        est = self.fetcher.get_fund_estimate(code)
-        self.search_btn.setEnabled(True)
+        self.add_group.setVisible(False)
+        seq = self.search_seq
+        self.search_future = self.search_runner.submit(
+            self.fetcher.get_fund_estimate, code,
+            callback=lambda est, error, s=seq, c=code: self.on_search_finished(s, c, est)
+        )
+
+    # 被新查询取代的结果不再显示，但查到了仍然放进缓存
+    def on_search_finished(self, seq, code, est):
+        if est:
+            self.search_cache.put(code, est)
+        if seq != self.search_seq:
+            return
+        self.search_future = None
         self.search_btn.setText("🔍 搜索")
+        self.show_search_result(code, est)
+
+    def show_search_result(self, code, est):
         if est:
             self.code_input = code
-            self.name_input = est["name"]
-            self.cost_input.setText(f"{est['dwjz']:.4f}")
-            result_text = f"✅ 找到基金: {est['name']}\n昨日净值: {est['dwjz']:.4f}元  预估净值: {est['gsz']:.4f}元  涨幅: {est['growth']:+.2f}%"
-            self.search_result_label.setText(result_text)
+            self.name_input = est.name
+            self.search_est = est
+            self.cost_input.setText(f"{est.dwjz:.4f}")
+            self.search_result_label.setText(self.search_result_text(code, est))
+            self.search_result_label.show()
             self.add_group.setVisible(True)
             self.cost_input.setFocus()
         else:
             self.search_result_label.setText(f"❌ 未找到基金代码: {code}")
+            self.search_result_label.show()
             self.add_group.setVisible(False)
 
+    def search_result_text(self, code, est):
+        text = f"✅ 找到基金: {est.name}\n昨日净值: {est.dwjz:.4f}元  预估净值: {est.gsz:.4f}元  涨幅: {est.growth:+.2f}%"
+        info = self.metadata.get(code)
+        details = [info[field] for field in ("type", "company") if info.get(field)]
+        if info.get("management_fee"):
+            details.append(f"管理费 {info['management_fee']}")
+        if details:
+            text += "\n" + "  ".join(details)
+        return text
+
+    # 资料在后台获取完成后，如果搜索结果还停留在这只基金上就补上显示
+    def on_metadata_updated(self, code):
+        est = getattr(self, 'search_est', None)
+        if est is not None and getattr(self, 'code_input', None) == code and self.add_group.isVisible():
+            self.search_result_label.setText(self.search_result_text(code, est))
+
     def amount_to_shares(self):
         try:
             amount = float(self.amount_input.text())
@@ -1129,24 +4214,63 @@ class FullWindow(ResizableWindow):
         if not code or not name:
             self.show_message("⚠️ 请先搜索基金", "warning")
             return
-        existing = [f for f in self.fund_manager.watchlist if f["code"] == code]
-        if existing:
+        if self.fund_manager.get_fund(code) is not None:
+            self.show_message("⚠️ 该基金已在自选列表中", "warning")
+            return
+        # 先用搜索结果填充行情，新基金在下一次刷新完成前也能正常显示
+        est = getattr(self, 'search_est', None)
+        if est and est.name == name:
+            self.fund_manager.quote_store.update(code, est, time.time())
+        if not self.fund_manager.add_fund(code, name, cost, shares):
             self.show_message("⚠️ 该基金已在自选列表中", "warning")
             return
-        new_fund = {
-            "code": code,
-            "name": name,
-            "cost": cost,
-            "shares": shares,
-            "is_closed": False,
-            "last_profit": 0.0
-        }
-        self.fund_manager.watchlist.append(new_fund)
-        self.fund_manager.save()
         self.show_message(f"✅ 已添加 {name}", "info")
         self.clear_search_form()
         self.refresh_data()
 
+    def import_funds(self):
+        path, _ = QFileDialog.getOpenFileName(self, "导入持仓", "", "CSV (*.csv *.txt);;所有文件 (*)")
+        if not path:
+            return
+        self.import_btn.setEnabled(False)
+        self.import_btn.setText("导入中...")
+        self.show_message("📥 正在校验导入的基金...", "info")
+        self.search_result_label.show()
+        self.search_runner.submit(validate_import, self.fetcher, path, callback=self.on_import_validated)
+
+    def on_import_validated(self, result, error):
+        self.import_btn.setEnabled(True)
+        self.import_btn.setText("📥 导入")
+        if error is not None:
+            self.show_message(f"❌ 导入失败: {str(error)}", "error")
+            return
+        valid, errors, fetched_at = result
+        merge = True
+        held = {fund.code for fund in self.fund_manager.watchlist}
+        duplicates = sum(1 for code, _, _, _ in valid if code in held)
+        if duplicates:
+            reply = QMessageBox.question(
+                self, "导入持仓", f"有 {duplicates} 只基金已在自选中，是否合并持仓？\n选择“否”将跳过这些基金。",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+            )
+            merge = reply == QMessageBox.Yes
+        for code, quote, _, _ in valid:
+            self.fund_manager.quote_store.update(code, quote, fetched_at)
+        added, merged, skipped = self.fund_manager.import_positions(
+            [(code, quote.name, shares, cost) for code, quote, shares, cost in valid], merge
+        )
+        summary = f"新增 {len(added)} 只，合并 {len(merged)} 只，跳过 {len(skipped)} 只，无效 {len(errors)} 行"
+        self.show_message(f"✅ 导入完成：{summary}", "info" if not errors else "warning")
+        if errors or skipped:
+            box = QMessageBox(QMessageBox.Information, "导入结果", summary, QMessageBox.Ok, self)
+            details = [f"第 {line} 行  {text}  {reason}" for line, text, reason in errors]
+            details.extend(f"{code}  {reason}" for code, reason in skipped)
+            box.setDetailedText("\n".join(details))
+            box.exec_()
+        if added or merged:
+            self.coordinator.publish_snapshot()
+            self.refresh_data()
+
     def clear_search_form(self):
         self.search_input.clear()
         self.cost_input.clear()
@@ -1154,7 +4278,6 @@ class FullWindow(ResizableWindow):
         self.amount_input.clear()
         self.search_result_label.hide()
         self.add_group.setVisible(False)
-        self.last_search_text = ""
 
     def show_message(self, text, msg_type="info"):
         style_map = {
@@ -1177,102 +4300,84 @@ class FullWindow(ResizableWindow):
         self.search_result_label.setText(text)
         self.search_result_label.show()
 
-    def on_cell_double_clicked(self, row, col):
-        if col in (2, 3):  # 成本价 or 份额
-            self.start_inline_edit(row, col)
+    def apply_filter(self, text):
+        self.table_model.set_filter(text)
+
+    def on_action_clicked(self, row, button):
+        fund = self.table_model.entry_at(row)
+        # 离开委托的事件处理后再弹出对话框
+        if button == 0:
+            QTimer.singleShot(0, lambda code=fund["code"]: self.remove_fund(code))
+        elif button == 1:
+            QTimer.singleShot(0, lambda code=fund["code"], name=fund["name"]: self.show_history(code, name))
+        else:
+            QTimer.singleShot(0, lambda code=fund["code"], name=fund["name"]: self.show_transactions(code, name))
 
-    def start_inline_edit(self, row, col):
-        item = self.table.item(row, col)
-        if not item:
+    def finish_inline_edit(self, code, col, text):
+        fund = self.fund_manager.get_fund(code)
+        if fund is not None and self.fund_manager.get_ledger(code) is not None:
+            QMessageBox.information(self, "交易记录", "该基金的份额和成本由交易记录计算，请通过添加买入/卖出交易调整")
+            self.show_transactions(code, fund.name or code)
             return
-        original_text = item.text()
-        line_edit = QLineEdit(original_text)
-        line_edit.setFont(get_app_font(self.dynamic_font_size))
-        line_edit.setAlignment(Qt.AlignCenter)
-        line_edit.setFixedHeight(self.table.rowHeight(row) - 8)
-        line_edit.editingFinished.connect(lambda: self.finish_inline_edit(row, col, line_edit, original_text))
-        self.table.setCellWidget(row, col, line_edit)
-        line_edit.setFocus()
-        line_edit.selectAll()
-
-    def finish_inline_edit(self, row, col, editor, original_text):
-        new_text = editor.text().strip()
-        self.table.removeCellWidget(row, col)
         try:
-            new_val = float(new_text)
+            if fund is None:
+                raise ValueError("更新失败")
+            new_val = float(text.strip())
             if col == 2:  # 成本价
                 if new_val <= 0:
                     raise ValueError("成本价必须 > 0")
-                cost = new_val
-                shares = float(self.table.item(row, 3).text())
+                cost, shares = new_val, fund.shares
             else:  # 份额
                 if new_val < 0:
                     raise ValueError("份额不能为负")
-                shares = new_val
-                cost = float(self.table.item(row, 2).text())
-            code = self.table.item(row, 0).text()
-            if self.fund_manager.update_fund(code, cost=cost, shares=shares):
-                self.table.setItem(row, 2, QTableWidgetItem(f"{cost:.4f}"))
-                self.table.setItem(row, 3, QTableWidgetItem(f"{shares:.2f}"))
-                self.refresh_data()
-            else:
+                cost, shares = fund.cost, new_val
+            if not self.fund_manager.update_fund(code, cost=cost, shares=shares):
                 raise ValueError("更新失败")
+            # 先用已有行情重算一次快照，编辑结果立即可见
+            self.coordinator.publish_snapshot()
+            self.refresh_data()
         except Exception as e:
-            self.table.setItem(row, col, QTableWidgetItem(original_text))
             QMessageBox.warning(self, "输入错误", f"无效输入:\n{str(e)}")
 
     def show_history(self, code, name):
-        history = self.fund_manager.history_manager.get_fund_history(code)
-        if not history:
+        history_manager = self.fund_manager.history_manager
+        portfolio = self.fund_manager.current
+        if not history_manager.count_closed_positions(portfolio, code):
             QMessageBox.information(self, "历史记录", f"基金 {name} 暂无历史记录")
             return
         dialog = QDialog(self)
         dialog.setWindowTitle(f"{name} 历史记录")
         dialog.setMinimumSize(800, 400)
         layout = QVBoxLayout(dialog)
-        table = QTableWidget()
-        table.setColumnCount(5)
-        table.setHorizontalHeaderLabels(["时间", "份额", "成本价", "收益金额", "操作"])
-        table.setEditTriggers(QTableWidget.NoEditTriggers)
-        positions = history["closed_positions"]
-        table.setRowCount(len(positions))
-        total_profit = 0
-        for row, pos in enumerate(positions):
-            table.setItem(row, 0, QTableWidgetItem(pos["close_time"]))
-            table.setItem(row, 1, QTableWidgetItem(f"{pos['shares']:.2f}"))
-            table.setItem(row, 2, QTableWidgetItem(f"{pos['cost']:.4f}"))
-            profit = pos["profit"]
-            total_profit += profit
-            profit_item = QTableWidgetItem(f"{profit:+.2f}")
-            if profit > 0:
-                profit_item.setForeground(QColor(220, 38, 38))
-            elif profit < 0:
-                profit_item.setForeground(QColor(21, 128, 61))
-            table.setItem(row, 3, profit_item)
-            btn_widget = QWidget()
-            btn_layout = QHBoxLayout(btn_widget)
-            btn_layout.setContentsMargins(0, 0, 0, 0)
-            btn_layout.setAlignment(Qt.AlignCenter)
-            detail_btn = QPushButton("详情")
-            detail_btn.setFixedSize(60, 25)
-            detail_btn.setStyleSheet("""
-            QPushButton {
-                background: #dbeafe;
-                border: none;
-                border-radius: 4px;
-            }
-            QPushButton:hover {
-                background: #bfdbfe;
-            }
-            """)
-            detail_btn.clicked.connect(lambda checked, p=pos: self.show_position_detail(p))
-            btn_layout.addWidget(detail_btn)
-            table.setCellWidget(row, 4, btn_widget)
+        info_lines = self.metadata.describe(code)
+        if info_lines:
+            info_label = QLabel("  ".join(info_lines))
+            info_label.setWordWrap(True)
+            info_label.setStyleSheet("color: #475569; padding: 4px;")
+            layout.addWidget(info_label)
+        model = ClosedPositionModel(history_manager, portfolio, code, dialog)
+        table = QTableView()
+        table.setModel(model)
+        table.setEditTriggers(QTableView.NoEditTriggers)
+        table.setSelectionBehavior(QTableView.SelectRows)
+        table.setMouseTracking(True)
+        table.verticalHeader().setVisible(False)
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        detail_delegate = ButtonDelegate(["详情"], ["查看清仓详情"], table)
+        # 离开委托的事件处理后再弹出对话框
+        detail_delegate.clicked.connect(
+            lambda row, button: QTimer.singleShot(0, lambda: self.show_position_detail(model.position_at(row))))
+        table.setItemDelegateForColumn(ClosedPositionModel.ACTION_COLUMN, detail_delegate)
+        # 列宽按样例文本一次算好，不随内容逐行测量
         header = table.horizontalHeader()
-        for i in range(5):
-            header.setSectionResizeMode(i, QHeaderView.ResizeToContents)
+        font_metrics = table.fontMetrics()
+        padding = font_metrics.horizontalAdvance("0") * 4
+        for col, sample in enumerate(["0000-00-00 00:00:00", "0000000.00", "00.0000", "+000000.00"]):
+            header.resizeSection(col, font_metrics.horizontalAdvance(sample) + padding)
+        header.setStretchLastSection(True)
         layout.addWidget(table)
-        total_label = QLabel(f"累计历史收益: {total_profit:+.2f}元")
+        total_profit = history_manager.get_total_closed_profit(portfolio, code)
+        total_label = QLabel(f"累计历史收益: {total_profit:+.2f}元（共 {model.total} 笔）")
         total_label.setFont(get_app_font(DEFAULT_FONT_SIZE, 1, True))
         total_label.setStyleSheet("color: #1e40af; font-weight: bold; padding: 10px;")
         layout.addWidget(total_label)
@@ -1292,6 +4397,262 @@ class FullWindow(ResizableWindow):
         layout.addWidget(close_btn)
         dialog.exec_()
 
+    def show_export_dialog(self):
+        dialog = QDialog(self)
+        dialog.setWindowTitle("导出数据")
+        dialog.setMinimumWidth(420)
+        layout = QVBoxLayout(dialog)
+        form = QFormLayout()
+        dataset_combo = QComboBox()
+        for dataset, label in EXPORT_DATASETS:
+            dataset_combo.addItem(label, dataset)
+        format_combo = QComboBox()
+        has_arrow = arrow_available()
+        for fmt, label, _ in EXPORT_FORMATS:
+            format_combo.addItem(label if fmt == "csv" or has_arrow else f"{label}（需要 pyarrow）", fmt)
+            if fmt != "csv" and not has_arrow:
+                format_combo.model().item(format_combo.count() - 1).setEnabled(False)
+        start_input = QLineEdit()
+        start_input.setPlaceholderText("YYYY-MM-DD，留空不限")
+        end_input = QLineEdit()
+        end_input.setPlaceholderText("YYYY-MM-DD，留空不限")
+        codes_input = QLineEdit()
+        codes_input.setPlaceholderText("基金代码，多个用逗号分隔，留空导出全部")
+        form.addRow("数据:", dataset_combo)
+        form.addRow("格式:", format_combo)
+        form.addRow("开始日期:", start_input)
+        form.addRow("结束日期:", end_input)
+        form.addRow("基金:", codes_input)
+        layout.addLayout(form)
+        export_btn = QPushButton("导出")
+        layout.addWidget(export_btn)
+
+        def start_export():
+            dates = []
+            for widget in (start_input, end_input):
+                text = widget.text().strip()
+                if text:
+                    try:
+                        text = datetime.strptime(text, "%Y-%m-%d").strftime("%Y-%m-%d")
+                    except ValueError:
+                        QMessageBox.warning(dialog, "输入错误", "日期格式应为 YYYY-MM-DD")
+                        return
+                dates.append(text or None)
+            codes = {code.strip() for code in re.split(r"[,，\s]+", codes_input.text()) if code.strip()}
+            dataset = dataset_combo.currentData()
+            fmt = format_combo.currentData()
+            ext = next(ext for key, _, ext in EXPORT_FORMATS if key == fmt)
+            path, _ = QFileDialog.getSaveFileName(dialog, "导出数据", f"{dataset}.{ext}", f"{format_combo.currentText()} (*.{ext})")
+            if not path:
+                return
+            rows = iter_export_rows(dataset, self.fund_manager.history_manager, self.fund_manager.ledger.path,
+                                    codes, dates[0], dates[1])
+            self.export_btn.setEnabled(False)
+            self.export_btn.setText("导出中...")
+            self.export_runner.submit(export_rows, rows, path, fmt, EXPORT_COLUMNS[dataset],
+                                      callback=lambda count, error, p=path: self.on_export_finished(p, count, error))
+            dialog.accept()
+
+        export_btn.clicked.connect(start_export)
+        dialog.exec_()
+
+    def on_export_finished(self, path, count, error):
+        self.export_btn.setEnabled(True)
+        self.export_btn.setText("📤 导出")
+        if error is not None:
+            QMessageBox.warning(self, "导出失败", str(error))
+            return
+        self.show_message(f"✅ 已导出 {count} 行到 {os.path.basename(path)}", "info")
+        self.search_result_label.show()
+
+    def show_alerts(self):
+        alert_manager = self.fund_manager.alert_manager
+        dialog = QDialog(self)
+        dialog.setWindowTitle("价格/收益提醒")
+        dialog.setMinimumSize(640, 420)
+        layout = QVBoxLayout(dialog)
+        table = QTableWidget()
+        table.setColumnCount(3)
+        table.setHorizontalHeaderLabels(["对象", "条件", "操作"])
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        header = table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.Stretch)
+        header.setSectionResizeMode(2, QHeaderView.Fixed)
+        header.resizeSection(2, 80)
+        names = {f.code: f.name or f.code for f in self.fund_manager.watchlist}
+
+        def reload_rules():
+            table.setRowCount(len(alert_manager.rules))
+            for row, rule in enumerate(alert_manager.rules):
+                code = rule["code"]
+                target = "投资组合" if code == PORTFOLIO_CODE else f"{code} {names.get(code, '')}"
+                table.setItem(row, 0, QTableWidgetItem(target))
+                table.setItem(row, 1, QTableWidgetItem(alert_manager.describe(rule)))
+                del_btn = QPushButton("删除")
+                del_btn.clicked.connect(lambda checked, rid=rule["id"]: (alert_manager.remove_rule(rid), reload_rules()))
+                table.setCellWidget(row, 2, del_btn)
+
+        layout.addWidget(table)
+        form = QHBoxLayout()
+        target_combo = QComboBox()
+        target_combo.addItem("投资组合", PORTFOLIO_CODE)
+        for code, name in names.items():
+            target_combo.addItem(f"{code} {name}", code)
+        field_combo = QComboBox()
+        op_combo = QComboBox()
+        for op, label in ALERT_OPS:
+            op_combo.addItem(label, op)
+        threshold_input = QLineEdit()
+        threshold_input.setPlaceholderText("阈值")
+
+        def reload_fields():
+            field_combo.clear()
+            fields = PORTFOLIO_ALERT_FIELDS if target_combo.currentData() == PORTFOLIO_CODE else FUND_ALERT_FIELDS
+            for field, label in fields:
+                field_combo.addItem(label, field)
+
+        def add_rule():
+            try:
+                threshold = float(threshold_input.text())
+            except ValueError:
+                QMessageBox.warning(dialog, "输入错误", "请输入有效的阈值")
+                return
+            alert_manager.add_rule(target_combo.currentData(), field_combo.currentData(), op_combo.currentData(), threshold)
+            threshold_input.clear()
+            reload_rules()
+
+        target_combo.currentIndexChanged.connect(reload_fields)
+        reload_fields()
+        add_btn = QPushButton("添加")
+        add_btn.clicked.connect(add_rule)
+        form.addWidget(target_combo, 3)
+        form.addWidget(field_combo, 2)
+        form.addWidget(op_combo, 2)
+        form.addWidget(threshold_input, 2)
+        form.addWidget(add_btn, 1)
+        layout.addLayout(form)
+        hint = QLabel("提醒在指标穿越阈值时触发一次，通过系统托盘通知显示")
+        hint.setStyleSheet("color: #64748b;")
+        layout.addWidget(hint)
+        reload_rules()
+        dialog.exec_()
+
+    def show_transactions(self, code, name):
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"{name} 交易记录")
+        dialog.setMinimumSize(720, 460)
+        layout = QVBoxLayout(dialog)
+        summary_label = QLabel()
+        summary_label.setFont(get_app_font(DEFAULT_FONT_SIZE, 1, True))
+        summary_label.setStyleSheet("color: #1e40af; padding: 6px;")
+        layout.addWidget(summary_label)
+        table = QTableWidget()
+        table.setColumnCount(6)
+        table.setHorizontalHeaderLabels(["时间", "类型", "份额", "价格", "金额", "费用"])
+        table.setEditTriggers(QTableWidget.NoEditTriggers)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        layout.addWidget(table)
+        type_labels = dict(TRANSACTION_TYPES)
+        quote = self.fund_manager.quote_store.get(code)
+
+        def reload_transactions():
+            ledger = self.fund_manager.get_ledger(code)
+            fund = self.fund_manager.get_fund(code)
+            if ledger is None:
+                shares = fund.shares if fund else 0.0
+                summary_label.setText(f"暂无交易记录，当前持仓 {shares:.2f} 份，添加第一笔交易时作为期初买入记入")
+                table.setRowCount(0)
+                return
+            text = (f"持有 {ledger.shares:.2f} 份  平均成本 {ledger.avg_cost:.4f}  "
+                    f"已实现 {ledger.realized:+.2f}元（含分红 {ledger.dividends:.2f}元）")
+            if quote is not None:
+                text += f"  浮动 {ledger.unrealized(quote.gsz):+.2f}元"
+            summary_label.setText(text)
+            # 只显示最近的交易，流水再长打开也不卡
+            recent = ledger.transactions[-TRANSACTION_DISPLAY_LIMIT:][::-1]
+            table.setRowCount(len(recent))
+            for row, tx in enumerate(recent):
+                amount = tx["amount"] if tx["type"] == "dividend" else tx["shares"] * tx["price"]
+                table.setItem(row, 0, QTableWidgetItem(tx["time"]))
+                table.setItem(row, 1, QTableWidgetItem(type_labels.get(tx["type"], tx["type"])))
+                table.setItem(row, 2, QTableWidgetItem(f"{tx['shares']:.2f}" if tx["type"] != "dividend" else ""))
+                table.setItem(row, 3, QTableWidgetItem(f"{tx['price']:.4f}" if tx["type"] != "dividend" else ""))
+                table.setItem(row, 4, QTableWidgetItem(f"{amount:.2f}"))
+                table.setItem(row, 5, QTableWidgetItem(f"{tx.get('fee', 0.0):.2f}"))
+
+        form = QHBoxLayout()
+        type_combo = QComboBox()
+        for kind, label in TRANSACTION_TYPES:
+            type_combo.addItem(label, kind)
+        shares_input = QLineEdit()
+        shares_input.setPlaceholderText("份额")
+        price_input = QLineEdit()
+        price_input.setPlaceholderText("价格")
+        if quote is not None:
+            price_input.setText(f"{quote.gsz:.4f}")
+        amount_input = QLineEdit()
+        amount_input.setPlaceholderText("分红金额")
+        amount_input.setEnabled(False)
+        fee_input = QLineEdit()
+        fee_input.setPlaceholderText("费用")
+        add_btn = QPushButton("记一笔")
+
+        def on_type_changed():
+            dividend = type_combo.currentData() == "dividend"
+            shares_input.setEnabled(not dividend)
+            price_input.setEnabled(not dividend)
+            amount_input.setEnabled(dividend)
+
+        def number(widget):
+            text = widget.text().strip()
+            return float(text) if text and widget.isEnabled() else 0.0
+
+        def add_transaction():
+            kind = type_combo.currentData()
+            try:
+                self.fund_manager.add_transaction(code, kind, number(shares_input), number(price_input),
+                                                  number(amount_input), number(fee_input))
+            except ValueError as e:
+                QMessageBox.warning(dialog, "输入错误", f"无效输入:\n{str(e)}")
+                return
+            shares_input.clear()
+            amount_input.clear()
+            fee_input.clear()
+            reload_transactions()
+            self.coordinator.publish_snapshot()
+
+        type_combo.currentIndexChanged.connect(on_type_changed)
+        add_btn.clicked.connect(add_transaction)
+        form.addWidget(type_combo, 1)
+        form.addWidget(shares_input, 2)
+        form.addWidget(price_input, 2)
+        form.addWidget(amount_input, 2)
+        form.addWidget(fee_input, 1)
+        form.addWidget(add_btn, 1)
+        layout.addLayout(form)
+        method_layout = QHBoxLayout()
+        method_layout.addWidget(QLabel("成本计算:"))
+        method_combo = QComboBox()
+        for method, label in LEDGER_METHODS:
+            method_combo.addItem(label, method)
+        ledger = self.fund_manager.get_ledger(code)
+        method_combo.setCurrentIndex(method_combo.findData(ledger.method if ledger else LEDGER_METHOD))
+
+        def on_method_changed():
+            if self.fund_manager.set_cost_method(code, method_combo.currentData()):
+                reload_transactions()
+                self.coordinator.publish_snapshot()
+
+        method_combo.currentIndexChanged.connect(on_method_changed)
+        method_layout.addWidget(method_combo)
+        method_layout.addStretch()
+        layout.addLayout(method_layout)
+        reload_transactions()
+        dialog.exec_()
+
     def show_position_detail(self, position):
         detail_text = (
             f"清仓详情:\n"
@@ -1303,98 +4664,93 @@ class FullWindow(ResizableWindow):
         QMessageBox.information(self, "清仓详情", detail_text)
 
     def refresh_data(self):
+        self.coordinator.request_refresh()
+
+    def manual_refresh(self):
+        self.coordinator.request_refresh(full=True)
+
+    def add_portfolio(self):
+        name, ok = QInputDialog.getText(self, "新建组合", "组合名称:")
+        name = name.strip()
+        if not ok or not name:
+            return
+        if not self.fund_manager.add_portfolio(name):
+            QMessageBox.warning(self, "新建组合", f"组合 {name} 已存在")
+            return
+        self.coordinator.switch_portfolio(name)
+
+    def remove_portfolio(self):
+        name = self.fund_manager.current
+        if name == DEFAULT_PORTFOLIO:
+            QMessageBox.information(self, "删除组合", "默认组合不能删除")
+            return
+        reply = QMessageBox.question(
+            self, "删除组合",
+            f"确定要删除组合 {name} 吗？\n其中的持仓将一并移除，不记录为清仓",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply == QMessageBox.Yes and self.fund_manager.remove_portfolio(name):
+            self.coordinator.publish_snapshot()
+
+    def visible_codes(self):
+        first = self.table.rowAt(0)
+        if first < 0:
+            return set()
+        last = self.table.rowAt(self.table.viewport().height() - 1)
+        if last < 0:
+            last = self.table_model.rowCount() - 1
+        return {self.table_model.entry_at(row)["code"] for row in range(first, last + 1)}
+
+    def apply_snapshot(self, snapshot):
+        if snapshot["generation"] <= self.applied_generation or self.defer_snapshot(snapshot):
+            return
+        self.applied_generation = snapshot["generation"]
         try:
-            funds = self.fund_manager.watchlist
+            self.sync_portfolio_combo(self.portfolio_combo, snapshot)
+            funds = snapshot["funds"]
+            started = time.perf_counter()
+            self.table_model.update_rows(funds)
             if not funds:
-                self.table.setRowCount(0)
                 self.today_label.setText("今日: 暂无数据")
                 self.total_label.setText("累计: 暂无数据")
                 self.history_label.setText("历史: 0.00元")
                 return
-            self.table.setRowCount(len(funds))
-            total_today_profit = 0
-            total_yesterday_value = 0
-            total_value = 0
-            total_cost = 0
-            total_closed_profit = self.fund_manager.history_manager.get_total_closed_profit()
-            for row, fund in enumerate(funds):
-                est = self.fetcher.get_fund_estimate(fund["code"])
-                if not est:
-                    name = fund.get("name", fund["code"])
-                    dwjz = fund.get("dwjz", 0)
-                    gsz = fund.get("gsz", dwjz)
-                    growth = fund.get("growth", 0)
-                else:
-                    name = fund.get("name", est["name"])
-                    dwjz = est["dwjz"]
-                    gsz = est["gsz"]
-                    growth = est["growth"]
-                    fund["dwjz"] = dwjz
-                    fund["gsz"] = gsz
-                    fund["growth"] = growth
-                code = fund["code"]
-                cost = fund["cost"]
-                shares = fund["shares"]
-                today_profit = shares * (gsz - dwjz)
-                total_profit = shares * (gsz - cost)
-                self.table.setItem(row, 0, QTableWidgetItem(code))
-                name_item = QTableWidgetItem(name)
-                name_item.setToolTip(name)
-                self.table.setItem(row, 1, name_item)
-                self.table.setItem(row, 2, QTableWidgetItem(f"{cost:.4f}"))
-                self.table.setItem(row, 3, QTableWidgetItem(f"{shares:.2f}"))
-                self.table.setItem(row, 4, QTableWidgetItem(f"{gsz:.4f}"))
-                growth_item = QTableWidgetItem(f"{growth:+.2f}%")
-                if growth > 0:
-                    growth_item.setForeground(QColor(220, 38, 38))
-                elif growth < 0:
-                    growth_item.setForeground(QColor(21, 128, 61))
-                self.table.setItem(row, 5, growth_item)
-                today_item = QTableWidgetItem(f"{today_profit:+.2f}")
-                if today_profit > 0:
-                    today_item.setForeground(QColor(220, 38, 38))
-                elif today_profit < 0:
-                    today_item.setForeground(QColor(21, 128, 61))
-                self.table.setItem(row, 6, today_item)
-                total_item = QTableWidgetItem(f"{total_profit:+.2f}")
-                if total_profit > 0:
-                    total_item.setForeground(QColor(220, 38, 38))
-                elif total_profit < 0:
-                    total_item.setForeground(QColor(21, 128, 61))
-                self.table.setItem(row, 7, total_item)
-                action_widget = QWidget()
-                action_layout = QHBoxLayout(action_widget)
-                action_layout.setContentsMargins(0, 0, 0, 0)
-                action_layout.setSpacing(4)
-                action_layout.setAlignment(Qt.AlignCenter)
-                del_btn = QPushButton("DEL")
-                del_btn.setFont(get_app_font(self.dynamic_font_size))
-                del_btn.setToolTip("删除")
-                del_btn.clicked.connect(lambda checked, c=code: self.remove_fund(c))
-                history_btn = QPushButton("HIS")
-                history_btn.setFont(get_app_font(self.dynamic_font_size))
-                history_btn.setToolTip("查看历史")
-                history_btn.clicked.connect(lambda checked, c=code, n=name: self.show_history(c, n))
-                action_layout.addWidget(del_btn)
-                action_layout.addWidget(history_btn)
-                action_layout.addStretch(1)
-                self.table.setCellWidget(row, 8, action_widget)
-                total_yesterday_value += shares * dwjz
-                total_today_profit += today_profit
-                total_value += shares * gsz
-                total_cost += shares * cost
-            current_profit = total_value - total_cost
-            total_profit = current_profit + total_closed_profit
+            totals = snapshot["totals"]
+            total_today_profit = totals["today_profit"]
+            total_cost = totals["cost"]
+            current_profit = totals["current_profit"]
+            total_profit = totals["total_profit"]
             total_rate = (total_profit / (total_cost + 1e-6)) * 100
-            today_rate = (total_today_profit / (total_yesterday_value + 1e-6)) * 100
+            today_rate = (total_today_profit / (totals["yesterday_value"] + 1e-6)) * 100
             today_icon = get_weather_icon(today_rate)
             total_icon = get_weather_icon(total_rate)
-            self.today_label.setText(f"{today_icon} 今日: {total_today_profit:+.2f}元 ({today_rate:+.2f}%)")
+            today_text = f"{today_icon} 今日: {total_today_profit:+.2f}元 ({today_rate:+.2f}%)"
+            error_band = totals["today_error_band"]
+            if error_band >= 0.005:
+                today_text += f" ±{error_band:.2f}"
+                self.today_label.setToolTip(f"按各基金估值的历史平均误差估算，今日收益可能偏差 ±{error_band:.2f}元")
+            else:
+                self.today_label.setToolTip("")
+            self.today_label.setText(today_text)
             self.total_label.setText(f"{total_icon} 当前: {current_profit:+.2f}元 ({(current_profit/(total_cost+1e-6))*100:+.2f}%)")
-            self.history_label.setText(f"历史: {total_closed_profit:+.2f}元")
+            self.history_label.setText(f"历史: {totals['closed_profit']:+.2f}元")
+            metrics.observe("render_seconds", time.perf_counter() - started, view="full")
+            if self.diagnostics_panel.isVisible():
+                self.update_diagnostics()
         except Exception as e:
+            metrics.inc("refresh_failures_total", view="full")
             print(f"刷新数据失败: {str(e)}")
 
+    def fit_table_columns(self):
+        header = self.table.horizontalHeader()
+        header_metrics = header.fontMetrics()
+        cell_metrics = self.table.fontMetrics()
+        padding = int(self.dynamic_font_size * 1.5)
+        for col, sample in TABLE_COLUMN_SAMPLES.items():
+            title = FundTableModel.HEADERS[col]
+            width = max(cell_metrics.horizontalAdvance(sample), header_metrics.horizontalAdvance(title) + self.dynamic_font_size * 2)
+            header.resizeSection(col, width + padding)
+
     def remove_fund(self, code):
         reply = QMessageBox.question(
             self, "确认删除",
@@ -1409,14 +4765,13 @@ class FullWindow(ResizableWindow):
         super().resizeEvent(event)
         if hasattr(self, 'container'):
             self.container.setGeometry(0, 0, self.width(), self.height())
-        QTimer.singleShot(50, self.update_font_sizes)
-        if hasattr(self, 'table') and self.table.columnCount() > 0:
-            header = self.table.horizontalHeader()
-            header.setSectionResizeMode(1, QHeaderView.Stretch)
+        self.resize_timer.start()
+        self.schedule_visible_report()
 
     def closeEvent(self, event):
-        if self.timer and self.timer.isActive():
-            self.timer.stop()
+        self.search_runner.shutdown()
+        self.export_runner.shutdown()
+        self.metadata.shutdown()
         self.float_button.close()
         event.accept()
 
@@ -1426,15 +4781,55 @@ class FundApp(QApplication):
         super().__init__(argv)
         self.fund_manager = FundManager()
         self.fetcher = DataFetcher()
-        self.simple_window = SimpleWindow(self.fund_manager, self.fetcher)
+        self.coordinator = RefreshCoordinator(self.fund_manager, self.fetcher, self,
+                                              instance_lock=InstanceLock() if SINGLE_POLLER else None)
+        self.simple_window = SimpleWindow(self.fund_manager, self.coordinator)
         self.full_window = None
         self.simple_window.switch_to_full.connect(self.switch_to_full_mode)
         self.simple_window.show()
+        self.tray_icon = None
+        if QSystemTrayIcon.isSystemTrayAvailable():
+            self.tray_icon = QSystemTrayIcon(self.style().standardIcon(QStyle.SP_ComputerIcon), self)
+            self.tray_icon.setToolTip("基金助手")
+            self.tray_icon.show()
+        self.fund_manager.alert_manager.listeners.append(self.show_notification)
+        if self.coordinator.update_leadership():
+            self.fetcher.prewarm()
+        self.coordinator.start(800)
+        self.aboutToQuit.connect(self.coordinator.stop)
+        self.archiver = NavArchiver(self.fund_manager, self.coordinator, parent=self)
+        self.archiver.start()
+        self.aboutToQuit.connect(self.archiver.stop)
+        self.aboutToQuit.connect(self.fetcher.shutdown)
+        self.memory_timer = None
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self.simple_window, self.start_profiling)
+        if PROFILE_CYCLES > 0:
+            profiler.arm(PROFILE_CYCLES)
+        if TRACEMALLOC_MINUTES > 0:
+            self.start_memory_snapshots(TRACEMALLOC_MINUTES)
+
+    def start_profiling(self):
+        profiler.arm(PROFILE_CYCLES or DEFAULT_PROFILE_CYCLES)
+        if self.memory_timer is None:
+            self.start_memory_snapshots(TRACEMALLOC_MINUTES or DEFAULT_TRACEMALLOC_MINUTES)
+
+    def start_memory_snapshots(self, minutes):
+        profiler.start_tracemalloc()
+        self.memory_timer = QTimer(self)
+        self.memory_timer.timeout.connect(profiler.take_memory_snapshot)
+        self.memory_timer.start(int(minutes * 60 * 1000))
+
+    def show_notification(self, title, message):
+        if self.tray_icon is not None and QSystemTrayIcon.supportsMessages():
+            self.tray_icon.showMessage(title, message, QSystemTrayIcon.Information, 8000)
+        else:
+            print(f"{title}: {message}")
 
     def switch_to_full_mode(self):
         if self.full_window is None:
-            self.full_window = FullWindow(self.fund_manager, self.fetcher)
+            self.full_window = FullWindow(self.fund_manager, self.coordinator)
             self.full_window.switch_to_simple.connect(self.switch_to_simple_mode)
+            QShortcut(QKeySequence("Ctrl+Shift+P"), self.full_window, self.start_profiling)
         pos = self.simple_window.pos()
         self.simple_window.hide()
         self.simple_window.float_button.hide()
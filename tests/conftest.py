@@ -0,0 +1,36 @@
+import os
+import sys
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+@pytest.fixture(scope="session")
+def qapp():
+    app = QApplication.instance() or QApplication([])
+    yield app
+
+# 各管理器按相对路径读写数据文件，测试都在临时目录中进行
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def mock_server():
+    from tools.mock_server import start_mock_server
+    server = start_mock_server(published=False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+# 指向本地模拟行情服务的 DataFetcher
+@pytest.fixture
+def mock_fetcher(mock_server):
+    from main import DataFetcher
+    from tools.mock_server import mock_urls
+    fetcher = DataFetcher(**mock_urls(mock_server))
+    yield fetcher
+    fetcher.shutdown()
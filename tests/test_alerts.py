@@ -0,0 +1,37 @@
+from main import AlertIndex
+
+def make_index():
+    index = AlertIndex()
+    index.add(1.0, "up1", True)
+    index.add(2.0, "up2", True)
+    index.add(-1.0, "down1", False)
+    index.add(0.0, "down0", False)
+    return index
+
+def test_first_value_only_sets_baseline():
+    index = make_index()
+    assert index.crossed(5.0) == []
+
+def test_upward_crossing_includes_threshold_reached_exactly():
+    index = make_index()
+    index.crossed(0.5)
+    assert index.crossed(1.0) == [("up1", True)]
+    assert index.crossed(3.0) == [("up2", True)]
+    # 停在阈值之上不会重复提醒
+    assert index.crossed(2.5) == []
+
+def test_downward_crossing_skips_upward_rules():
+    index = make_index()
+    index.crossed(1.5)
+    assert index.crossed(-1.0) == [("down1", False), ("down0", False)]
+    assert index.crossed(-0.5) == []
+
+def test_removed_rule_no_longer_fires():
+    index = make_index()
+    index.remove("up1")
+    index.crossed(0.0)
+    assert index.crossed(1.5) == []
+    index.remove("up2")
+    index.remove("down1")
+    index.remove("down0")
+    assert index.is_empty()
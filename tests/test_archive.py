@@ -0,0 +1,94 @@
+import json
+import time
+from concurrent.futures import Future
+
+from PyQt5.QtCore import QCoreApplication
+
+import main
+from main import FundManager, NavArchiver, Position, Quote, QuoteStore, RefreshCoordinator
+
+def make_archiver(fetcher, codes):
+    fund_manager = FundManager(QuoteStore(None))
+    fund_manager.watchlist = [Position(code, f"模拟基金{code}", 1.0, 100.0) for code in codes]
+    coordinator = RefreshCoordinator(fund_manager, fetcher)
+    return NavArchiver(fund_manager, coordinator), coordinator.quote_store
+
+def fetch_quotes(fetcher, quote_store, codes):
+    fetched_at = time.time()
+    for code, future in fetcher.submit_many(codes).items():
+        quote_store.update(code, future.result(timeout=10), fetched_at)
+
+def wait_archived(archiver, timeout=10):
+    deadline = time.monotonic() + timeout
+    while archiver.outstanding and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.01)
+    assert not archiver.outstanding
+
+def read_archive(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+# 晚间净值公布后批量行情仍在刷新，归档和替换后的行情都必须以前一日净值为基准
+def test_archive_uses_previous_nav_after_publication(qapp, workdir, mock_server, mock_fetcher, monkeypatch):
+    monkeypatch.setattr(main, "ARCHIVE_START", (0, 0))
+    codes = ["000001", "000002"]
+    archiver, quote_store = make_archiver(mock_fetcher, codes)
+    fetch_quotes(mock_fetcher, quote_store, codes)
+    prev_navs = {code: quote_store.get(code).dwjz for code in codes}
+    mock_server.published = True
+    fetch_quotes(mock_fetcher, quote_store, codes)
+    archiver.run()
+    wait_archived(archiver)
+    records = read_archive(workdir / "archive.jsonl")
+    assert sorted(record["code"] for record in records) == codes
+    for record in records:
+        code = record["code"]
+        _, nav, _ = mock_fetcher.get_confirmed_nav(code)
+        assert record["prev_nav"] == prev_navs[code]
+        assert record["nav"] == nav != record["prev_nav"]
+        assert record["profit"] == round(100.0 * (nav - prev_navs[code]), 2) != 0
+        quote = quote_store.get(code)
+        assert (quote.dwjz, quote.gsz) == (prev_navs[code], nav)
+        assert quote.growth == round((nav / prev_navs[code] - 1) * 100, 2) != 0
+
+# 净值公布后才启动：行情中的 dwjz 已是当日净值，前一日净值从历史净值中取，归档完成后不再重复获取
+def test_archive_completes_when_quotes_already_carry_todays_nav(qapp, workdir, mock_server, mock_fetcher,
+                                                                monkeypatch):
+    monkeypatch.setattr(main, "ARCHIVE_START", (0, 0))
+    codes = ["000001", "000002"]
+    archiver, quote_store = make_archiver(mock_fetcher, codes)
+    mock_server.published = True
+    fetch_quotes(mock_fetcher, quote_store, codes)
+    estimates = {code: quote_store.get(code).gsz for code in codes}
+    history = {code: mock_fetcher.get_confirmed_nav(code) for code in codes}
+    for code in codes:
+        assert quote_store.get(code).dwjz == history[code][1]
+    archiver.run()
+    wait_archived(archiver)
+    records = read_archive(workdir / "archive.jsonl")
+    assert sorted(record["code"] for record in records) == codes
+    for record in records:
+        date, nav, prev_nav = history[record["code"]]
+        assert (record["date"], record["nav"], record["prev_nav"]) == (date, nav, prev_nav)
+        assert record["estimate"] == estimates[record["code"]]
+        assert record["profit"] == round(100.0 * (nav - prev_nav), 2) != 0
+        quote = quote_store.get(record["code"])
+        assert quote.confirmed and (quote.dwjz, quote.gsz) == (prev_nav, nav)
+    assert archiver.coordinator.accuracy.get("000001") is not None
+    assert archiver.pending_codes() == []
+
+# 历史净值只有一条时当天无法得到前一日净值，不归档也不替换，当天不再重复获取
+def test_archive_gives_up_without_previous_nav(qapp, workdir, monkeypatch):
+    monkeypatch.setattr(main, "ARCHIVE_START", (0, 0))
+    archiver, quote_store = make_archiver(None, ["000001"])
+    quote_store.update("000001", Quote("甲", 1.215, 1.212, -0.25, "2026-10-19 15:00", nav_date="2026-10-19"),
+                       time.time())
+    archiver.holders = archiver.build_holders()
+    assert archiver.pending_codes() == ["000001"]
+    future = Future()
+    future.set_result(("2026-10-19", 1.215, None))
+    archiver._on_nav("000001", future)
+    assert not (workdir / "archive.jsonl").exists()
+    assert quote_store.get("000001").gsz == 1.212
+    assert archiver.pending_codes() == []
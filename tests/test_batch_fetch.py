@@ -0,0 +1,54 @@
+import pytest
+
+from main import decode_batch
+
+def batch_payload(*items):
+    import json
+    return json.dumps({"Datas": list(items), "ErrCode": 0, "ErrMsg": None}).encode("utf-8")
+
+def test_decode_batch_skips_rows_without_estimate():
+    quotes = decode_batch(batch_payload(
+        {"FCODE": "000001", "SHORTNAME": "甲", "PDATE": "2026-10-16", "NAV": "1.2000", "GSZ": "1.2120",
+         "GSZZL": "1.00", "GZTIME": "2026-10-19 15:00"},
+        {"FCODE": "000002", "SHORTNAME": "乙", "PDATE": "2026-10-16", "NAV": "1.0000", "GSZ": "--",
+         "GSZZL": "--", "GZTIME": "--"}
+    ))
+    assert list(quotes) == ["000001"]
+    quote = quotes["000001"]
+    assert (quote.name, quote.dwjz, quote.gsz, quote.growth) == ("甲", 1.2, 1.212, 1.0)
+
+def test_decode_batch_raises_on_error_code():
+    with pytest.raises(ValueError):
+        decode_batch(b'{"Datas": null, "ErrCode": 1, "ErrMsg": "bad"}')
+
+# 批量接口缺少估值的基金（代码以 9 结尾）逐只回退到 JSONP，不存在的基金结果为 None
+def test_submit_many_falls_back_per_code(mock_fetcher):
+    codes = ["000001", "000019", "110000"]
+    futures = mock_fetcher.submit_many(codes)
+    results = {code: future.result(timeout=10) for code, future in futures.items()}
+    assert results["000001"].name == "模拟基金000001"
+    assert results["000019"].name == "模拟基金000019"
+    assert results["110000"] is None
+
+# 晚间公布当日净值后 NAV 已是当日净值，不能再当作前一日净值使用
+def test_decode_batch_skips_rows_with_todays_nav():
+    quotes = decode_batch(batch_payload(
+        {"FCODE": "000001", "SHORTNAME": "甲", "PDATE": "2026-10-19", "NAV": "1.2150", "GSZ": "1.2120",
+         "GSZZL": "1.00", "GZTIME": "2026-10-19 15:00"}
+    ))
+    assert quotes == {}
+
+# 公布后回退到 JSONP 的行情由 nav_date 标明 dwjz 已是当日净值，历史净值同时给出前一日净值
+def test_quotes_after_publication_carry_nav_date(mock_server, mock_fetcher):
+    before = mock_fetcher.submit_many(["000001", "000002"])
+    before = {code: future.result(timeout=10) for code, future in before.items()}
+    mock_server.published = True
+    after = mock_fetcher.submit_many(["000001", "000002"])
+    after = {code: future.result(timeout=10) for code, future in after.items()}
+    for code in ("000001", "000002"):
+        assert before[code].nav_date < before[code].time[:10]
+        assert after[code].nav_date == after[code].time[:10]
+        date, nav, prev_nav = mock_fetcher.get_confirmed_nav(code)
+        # 模拟服务的当日确认净值与前一日净值不同
+        assert (date, nav, prev_nav) == (after[code].nav_date, after[code].dwjz, before[code].dwjz)
+        assert nav != prev_nav
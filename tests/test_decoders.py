@@ -0,0 +1,28 @@
+import pytest
+
+from main import Quote, decode_fundgz
+from tools.bench_parser import BENCH_PAYLOADS, decode_fundgz_regex
+
+def jsonp(body):
+    return f"jsonpgz({body});".encode("utf-8")
+
+def test_decode_fundgz():
+    quote = decode_fundgz(BENCH_PAYLOADS[0])
+    assert quote == Quote("富国文体健康股票A", 2.153, 2.1812, 1.31, "2026-10-19 15:00", nav_date="2026-10-16")
+
+@pytest.mark.parametrize("payload", BENCH_PAYLOADS)
+def test_decode_fundgz_matches_regex_decoder(payload):
+    assert decode_fundgz(payload) == decode_fundgz_regex(payload)
+
+@pytest.mark.parametrize("payload", [
+    b"",
+    b"jsonpgz();",
+    b"jsonpgz(",
+    b'callback({"name":"x"});',
+    jsonp('{"name":"x","dwjz":"1.0","gsz":"1.1","gszzl":"1.0"}'),
+    jsonp('{"name":"x","dwjz":"--","gsz":"1.1","gszzl":"1.0","gztime":"2026-10-19 15:00"}'),
+    jsonp('{"name":null,"dwjz":"1.0","gsz":"1.1","gszzl":"1.0","gztime":"2026-10-19 15:00"}'),
+    jsonp('{"name":"x","dwjz":"1.0","gsz":"1.1","gszzl":"1.0","gztime":'),
+])
+def test_decode_fundgz_rejects_malformed(payload):
+    assert decode_fundgz(payload) is None
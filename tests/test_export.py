@@ -0,0 +1,95 @@
+import csv
+import json
+import sys
+
+import pytest
+
+import main
+from main import EXPORT_COLUMNS, HistoryManager, LedgerManager, export_rows, iter_export_rows
+
+def write_jsonl(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # 写到一半中断的行直接跳过
+        f.write('{"date": "2026-10')
+
+def archive_record(date, code, portfolio="默认"):
+    return {"date": date, "portfolio": portfolio, "code": code, "name": f"基金{code}", "nav": 1.1, "prev_nav": 1.0,
+            "estimate": 1.09, "shares": 100.0, "cost": 1.0, "profit": 10.0, "position_profit": 10.0}
+
+def read_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+@pytest.fixture
+def data(workdir):
+    write_jsonl(workdir / "archive.jsonl", [
+        archive_record("2026-10-15", "000001"), archive_record("2026-10-16", "000001"),
+        archive_record("2026-10-16", "000002", "家人"), archive_record("2026-10-19", "000001")])
+    ledger = LedgerManager(str(workdir / "ledger.jsonl"))
+    ledger.add("默认", "000001", "buy", 100, 1.0, when="2026-10-15 10:00:00")
+    ledger.set_method("默认", "000001", "average")
+    ledger.add("默认", "000001", "sell", 40, 1.2, when="2026-10-16 10:00:00")
+    ledger.add("默认", "000002", "buy", 10, 2.0, when="2026-10-16 11:00:00")
+    ledger.reset("默认", "000002")
+    return workdir
+
+def test_daily_rows_filtered_by_code_and_dates(data):
+    rows = iter_export_rows("daily", HistoryManager(), str(data / "ledger.jsonl"), {"000001"},
+                            "2026-10-16", "2026-10-19")
+    count = export_rows(rows, str(data / "daily.csv"), "csv", EXPORT_COLUMNS["daily"])
+    exported = read_csv(data / "daily.csv")
+    assert count == 2
+    assert [(row["date"], row["code"]) for row in exported] == [("2026-10-16", "000001"), ("2026-10-19", "000001")]
+    assert list(exported[0]) == [name for name, _ in EXPORT_COLUMNS["daily"]]
+
+def test_transactions_skip_method_and_reset_records(data):
+    rows = iter_export_rows("transactions", HistoryManager(), str(data / "ledger.jsonl"), end="2026-10-16")
+    export_rows(rows, str(data / "transactions.csv"), "csv", EXPORT_COLUMNS["transactions"])
+    exported = read_csv(data / "transactions.csv")
+    assert [(row["code"], row["type"], row["shares"]) for row in exported] == [
+        ("000001", "buy", "100.0"), ("000001", "sell", "40.0"), ("000002", "buy", "10.0")]
+
+def test_history_rows_carry_portfolio(data):
+    history = HistoryManager()
+    history.record_closed_profit("家人", "000003", "丙", 12.5, 10, 1.0, "2026-10-16 14:00:00")
+    history.record_closed_profit("默认", "000003", "丙", 3.0, 5, 1.0, "2026-09-01 14:00:00")
+    rows = iter_export_rows("history", history, None, start="2026-10-01")
+    export_rows(rows, str(data / "history.csv"), "csv", EXPORT_COLUMNS["history"])
+    assert [(row["portfolio"], row["profit"]) for row in read_csv(data / "history.csv")] == [("家人", "12.5")]
+
+# 分块写出时跨块的行数和顺序都不变，行按需逐块读取
+def test_rows_are_streamed_in_chunks(workdir, monkeypatch):
+    monkeypatch.setattr(main, "EXPORT_CHUNK_ROWS", 2)
+    pulled = []
+
+    def source():
+        for i in range(5):
+            pulled.append(i)
+            yield {"date": f"2026-10-{i + 10}", "code": "000001"}
+
+    rows = source()
+    assert export_rows(rows, str(workdir / "daily.csv"), "csv", EXPORT_COLUMNS["daily"]) == 5
+    assert pulled == list(range(5))
+    assert [row["date"] for row in read_csv(workdir / "daily.csv")] == [f"2026-10-{i + 10}" for i in range(5)]
+
+# 没有安装 pyarrow 时报错，不留下半成品文件，也不覆盖已有的目标文件
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_arrow_formats_need_pyarrow(data, monkeypatch, fmt):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    target = data / f"daily.{fmt}"
+    target.write_text("old")
+    rows = iter_export_rows("daily", HistoryManager(), None)
+    with pytest.raises(ValueError, match="pyarrow"):
+        export_rows(rows, str(target), fmt, EXPORT_COLUMNS["daily"])
+    assert target.read_text() == "old"
+    assert not (data / f"daily.{fmt}.part").exists()
+    assert not main.arrow_available()
+
+def test_parquet_export_round_trips(data):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = iter_export_rows("daily", HistoryManager(), None, {"000002"})
+    assert export_rows(rows, str(data / "daily.parquet"), "parquet", EXPORT_COLUMNS["daily"]) == 1
+    table = pq.read_table(str(data / "daily.parquet"))
+    assert table.column("portfolio").to_pylist() == ["家人"]
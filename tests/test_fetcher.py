@@ -0,0 +1,46 @@
+import time
+
+import main
+from main import DataFetcher, TokenBucket
+
+def test_token_bucket_spaces_requests_beyond_burst():
+    bucket = TokenBucket("test", rate=50, burst=2)
+    started = time.monotonic()
+    for _ in range(7):
+        bucket.acquire()
+    # 突发额度用完后剩余 5 个请求按 50 次/秒排队
+    assert time.monotonic() - started >= 0.09
+
+def test_token_bucket_backs_off_and_recovers():
+    bucket = TokenBucket("test", rate=8, burst=1, min_rate=1)
+    for _ in range(5):
+        bucket.penalize()
+    assert bucket.rate == 1
+    for _ in range(200):
+        bucket.reward()
+    assert bucket.rate == 8
+
+def test_prewarm_covers_batch_host():
+    fetcher = DataFetcher("gz.example", batch_url="https://batch.example/api")
+    fetcher.batching = True
+    warmed = []
+    fetcher._prewarm_connection = lambda host, url: warmed.append((host, url))
+    fetcher.prewarm(connections=2)
+    fetcher.executor.shutdown(wait=True)
+    assert sorted(set(warmed)) == [("batch.example", "https://batch.example/"), ("gz.example", "http://gz.example/")]
+    assert len(warmed) == 4
+
+def test_shutdown_cancels_queued_requests():
+    fetcher = DataFetcher()
+    futures = [fetcher.executor.submit(time.sleep, 0.2) for _ in range(40)]
+    fetcher.shutdown()
+    assert any(future.cancelled() for future in futures)
+
+# 每个主机各有一个连接池，共用会话的各类请求不会互相挤掉连接
+def test_connection_pools_cover_every_host():
+    fetcher = DataFetcher("gz.example", batch_url="https://batch.example/a", nav_url="https://nav.example/b",
+                          metadata_url="https://batch.example/c")
+    adapter = fetcher.session.get_adapter("https://batch.example/")
+    expected = 4 if fetcher.hedging and main.HEDGE_HOST != "gz.example" else 3
+    assert adapter._pool_connections == expected
+    fetcher.shutdown()
@@ -0,0 +1,38 @@
+import threading
+
+from main import FundManager, QuoteStore
+
+def make_manager():
+    return FundManager(QuoteStore(None))
+
+def codes_on_disk():
+    return [fund.code for fund in make_manager().watchlist]
+
+# 两个实例基于各自读到的旧内容修改，后保存的一方不能覆盖先保存的一方
+def test_edits_from_two_instances_are_merged(workdir):
+    first = make_manager()
+    second = make_manager()
+    assert first.add_fund("000001", "甲", 1.0, 100.0)
+    assert second.add_fund("000002", "乙", 1.0, 200.0)
+    assert second.update_fund("000001", shares=150.0)
+    assert first.add_portfolio("家人")
+    assert first.import_positions([("000003", "丙", 50.0, 1.1)])[0] == ["000003"]
+    assert second.remove_fund("000002")
+    assert not first.add_fund("000001", "甲", 1.0, 100.0)
+    manager = make_manager()
+    assert [(fund.code, fund.shares) for fund in manager.watchlist] == [("000001", 150.0), ("000003", 50.0)]
+    assert manager.portfolio_names() == ["默认", "家人"]
+
+def test_concurrent_adds_are_not_lost(workdir):
+    managers = [make_manager() for _ in range(4)]
+
+    def add_many(index, manager):
+        for i in range(15):
+            manager.add_fund(f"{index}{i:05d}", "x", 1.0, 1.0)
+
+    threads = [threading.Thread(target=add_many, args=(i, m)) for i, m in enumerate(managers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(codes_on_disk()) == 60
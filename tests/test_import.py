@@ -0,0 +1,38 @@
+import pytest
+
+from main import read_import_file
+
+def write(path, text, encoding="utf-8"):
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+def test_broker_export_in_gbk_with_chinese_headers(tmp_path):
+    path = write(tmp_path / "持仓.csv", "证券代码\t证券名称\t可用份额\t参考成本价\n"
+                                        "1\t华夏成长\t1,000.00\t1.2000\n"
+                                        "110022\t易方达消费\t500\t2.5\n", "gbk")
+    entries, errors = read_import_file(path)
+    assert errors == []
+    assert list(entries.items()) == [("000001", [2, 1000.0, 1.2]), ("110022", [3, 500.0, 2.5])]
+
+def test_headerless_file_uses_first_three_columns(tmp_path):
+    path = write(tmp_path / "funds.csv", '="000001",100,1.5\n161725,200,0.8\n')
+    entries, errors = read_import_file(path)
+    assert errors == []
+    assert entries["000001"] == [1, 100.0, 1.5]
+    assert entries["161725"] == [2, 200.0, 0.8]
+
+def test_duplicate_codes_merge_with_weighted_cost(tmp_path):
+    path = write(tmp_path / "funds.csv", "code,shares,cost\n000001,100,1.0\n000001,300,2.0\n")
+    entries, errors = read_import_file(path)
+    assert errors == []
+    line, shares, cost = entries["000001"]
+    assert (line, shares) == (2, 400.0)
+    assert cost == pytest.approx(1.75)
+
+def test_invalid_rows_are_reported_by_line(tmp_path):
+    path = write(tmp_path / "funds.csv", "code,shares,cost\nabc,100,1.0\n000002,-5,1.0\n000003,x,1.0\n"
+                                         "1234567,1,1\n000004,10,1.1\n")
+    entries, errors = read_import_file(path)
+    assert list(entries) == ["000004"]
+    assert [(line, reason) for line, _, reason in errors] == [
+        (2, "基金代码无效"), (3, "份额和成本价必须大于0"), (4, "格式错误"), (5, "基金代码无效")]
@@ -0,0 +1,81 @@
+import pytest
+
+from main import FundLedger, FundManager, QuoteStore
+
+def buy(shares, price, fee=0.0):
+    return {"type": "buy", "shares": shares, "price": price, "fee": fee}
+
+def sell(shares, price, fee=0.0):
+    return {"type": "sell", "shares": shares, "price": price, "fee": fee}
+
+def test_fifo_sells_consume_oldest_lots():
+    ledger = FundLedger("fifo")
+    ledger.apply(buy(100, 1.0))
+    ledger.apply(buy(100, 2.0))
+    assert ledger.apply(sell(150, 3.0)) is None
+    assert ledger.realized == pytest.approx(150 * 3.0 - (100 * 1.0 + 50 * 2.0))
+    assert ledger.shares == pytest.approx(50)
+    assert ledger.avg_cost == pytest.approx(2.0)
+    assert ledger.unrealized(2.5) == pytest.approx(25)
+
+def test_average_cost_sells_release_average_cost():
+    ledger = FundLedger("average")
+    ledger.apply(buy(100, 1.0))
+    ledger.apply(buy(100, 2.0, fee=10))
+    ledger.apply(sell(100, 2.0))
+    assert ledger.realized == pytest.approx(200 - 100 * 1.55)
+    assert ledger.avg_cost == pytest.approx(1.55)
+
+def test_closing_sell_reports_round_and_resets():
+    ledger = FundLedger("fifo")
+    ledger.apply(buy(100, 1.0))
+    ledger.apply({"type": "dividend", "amount": 5.0})
+    ledger.apply(sell(40, 1.5))
+    closed = ledger.apply(sell(60, 0.5, fee=1))
+    assert closed == pytest.approx((5.0 + 40 * 0.5 + 60 * -0.5 - 1, 60, 1.0))
+    assert (ledger.shares, ledger.cost_basis, ledger.open_realized) == (0.0, 0.0, 0.0)
+    assert ledger.realized == pytest.approx(closed[0])
+
+def test_rebuild_switches_method():
+    ledger = FundLedger("fifo")
+    for tx in (buy(100, 1.0), buy(100, 2.0), sell(100, 2.0)):
+        ledger.apply(tx)
+    assert ledger.avg_cost == pytest.approx(2.0)
+    ledger.rebuild("average")
+    assert ledger.avg_cost == pytest.approx(1.5)
+    assert ledger.realized == pytest.approx(50)
+
+def test_rejected_transaction_does_not_seed_ledger(workdir):
+    manager = FundManager(QuoteStore(None))
+    manager.add_fund("000001", "甲", 1.0, 100.0)
+    with pytest.raises(ValueError):
+        manager.add_transaction("000001", "buy", 0, 0)
+    with pytest.raises(ValueError):
+        manager.add_transaction("000001", "sell", 101, 1.0)
+    assert manager.get_ledger("000001") is None
+    assert FundManager(QuoteStore(None)).get_ledger("000001") is None
+    ledger = manager.add_transaction("000001", "sell", 100, 1.2)
+    assert ledger.shares == 0 and ledger.realized == pytest.approx(20)
+
+# 移出后再加入的基金从新的持仓开始，不被旧流水接管
+def test_removed_fund_does_not_inherit_old_ledger(workdir):
+    manager = FundManager(QuoteStore(None))
+    manager.add_fund("000001", "甲", 1.0, 100.0)
+    manager.add_transaction("000001", "buy", 50, 1.2)
+    manager.remove_fund("000001")
+    manager.add_fund("000001", "甲", 1.1, 10.0)
+    assert manager.add_transaction("000001", "buy", 5, 1.2).shares == pytest.approx(15)
+    reloaded = FundManager(QuoteStore(None))
+    assert reloaded.get_ledger("000001").shares == pytest.approx(15)
+    assert reloaded.get_fund("000001").shares == pytest.approx(15)
+
+def test_import_over_leftover_ledger_starts_fresh(workdir):
+    manager = FundManager(QuoteStore(None))
+    manager.add_fund("000001", "甲", 1.0, 100.0)
+    manager.add_transaction("000001", "buy", 50, 1.2)
+    # 旧版本移出基金时不清理流水
+    manager.watchlist = []
+    manager.save()
+    assert manager.import_positions([("000001", "甲", 10.0, 1.1)])[0] == ["000001"]
+    assert manager.get_ledger("000001") is None
+    assert manager.add_transaction("000001", "buy", 5, 1.2).shares == pytest.approx(15)
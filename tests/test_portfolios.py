@@ -0,0 +1,60 @@
+import json
+import time
+
+from main import FundManager, Position, Quote, QuoteStore, RefreshCoordinator
+
+def make_coordinator():
+    fund_manager = FundManager(QuoteStore(None))
+    fund_manager.add_fund("000001", "甲", 1.0, 100.0)
+    fund_manager.add_portfolio("家人")
+    fund_manager.switch_portfolio("家人")
+    fund_manager.add_fund("000002", "乙", 1.0, 100.0)
+    fund_manager.switch_portfolio("默认")
+    return RefreshCoordinator(fund_manager, None)
+
+def set_quote(coordinator, code, gsz):
+    coordinator.quote_store.update(code, Quote(code, 1.0, gsz, round((gsz - 1) * 100, 2), "2026-10-19 14:00"),
+                                   time.time())
+
+def test_closed_history_is_kept_per_portfolio(workdir):
+    coordinator = make_coordinator()
+    fund_manager = coordinator.fund_manager
+    set_quote(coordinator, "000002", 1.5)
+    fund_manager.switch_portfolio("家人")
+    fund_manager.remove_fund("000002")
+    assert coordinator.build_snapshot(0)["totals"]["closed_profit"] == 50
+    fund_manager.switch_portfolio("默认")
+    assert coordinator.build_snapshot(0)["totals"]["closed_profit"] == 0
+    assert fund_manager.history_manager.count_closed_positions("默认", "000002") == 0
+    assert fund_manager.history_manager.count_closed_positions("家人", "000002") == 1
+
+def test_old_history_file_belongs_to_default_portfolio(workdir):
+    with open("history.json", "w", encoding="utf-8") as f:
+        json.dump({"000001": {"name": "甲", "closed_positions": [
+            {"profit": 12.0, "shares": 10, "cost": 1.0, "close_time": "2026-01-01 10:00:00"}]}}, f)
+    history = FundManager(QuoteStore(None)).history_manager
+    assert history.get_total_closed_profit("默认") == 12.0
+    assert history.get_total_closed_profit("家人") == 0
+
+# 只在其他组合中持有的基金照常提醒，切换组合不会造成误判
+def test_alerts_cover_funds_outside_current_portfolio(workdir):
+    coordinator = make_coordinator()
+    alerts = coordinator.fund_manager.alert_manager
+    alerts.add_rule("000002", "growth", "above", 2.0)
+    alerts.add_rule("*", "today_profit", "above", 5.0)
+    fired = []
+    alerts.listeners.append(lambda title, message: fired.append(title))
+    set_quote(coordinator, "000001", 1.01)
+    set_quote(coordinator, "000002", 1.01)
+    coordinator.publish_snapshot()
+    set_quote(coordinator, "000002", 1.03)
+    coordinator.publish_snapshot()
+    assert fired == ["📢 乙"]
+    # 默认组合今日收益 1 元，家人组合 3 元；切换后重新记录基准，不算上穿
+    coordinator.switch_portfolio("家人")
+    set_quote(coordinator, "000002", 1.06)
+    coordinator.publish_snapshot()
+    assert fired == ["📢 乙", "📢 投资组合"]
+    coordinator.switch_portfolio("默认")
+    coordinator.publish_snapshot()
+    assert fired == ["📢 乙", "📢 投资组合"]
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from PyQt5.QtCore import QCoreApplication
+
+from main import DataFetcher, FullWindow, FundManager, Quote, QuoteStore, RefreshCoordinator
+
+# 不访问网络：估值按给定顺序返回，基金资料一律没有
+class StubFetcher(DataFetcher):
+    def __init__(self, results):
+        super().__init__()
+        self.batching = False
+        self.results = list(results)
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def get_fund_estimate(self, code):
+        self.calls.append(code)
+        self.release.wait(5)
+        return self.results.pop(0) if self.results else None
+
+    def get_fund_metadata(self, code):
+        return None
+
+def make_window(fetcher):
+    fund_manager = FundManager(QuoteStore(None))
+    coordinator = RefreshCoordinator(fund_manager, fetcher)
+    return FullWindow(fund_manager, coordinator)
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.01)
+    assert condition()
+
+def search(window, code):
+    window.search_input.setText(code)
+    window.search_fund()
+    wait_for(lambda: window.search_btn.text() == "🔍 搜索")
+
+def make_quote(name):
+    return Quote(name, 1.0, 1.01, 1.0, "2026-10-19 14:00")
+
+# 失败的查询再搜一次同一代码会重新获取，成功后在有效期内直接取缓存
+def test_repeated_search_retries_after_failure(qapp, workdir):
+    fetcher = StubFetcher([None, make_quote("甲")])
+    window = make_window(fetcher)
+    search(window, "000001")
+    assert window.add_group.isHidden()
+    search(window, "000001")
+    assert window.name_input == "甲"
+    search(window, "000001")
+    assert fetcher.calls == ["000001", "000001"]
+
+# 被新查询取代的结果不显示，但会进入缓存
+def test_superseded_result_is_cached(qapp, workdir):
+    fetcher = StubFetcher([make_quote("甲"), make_quote("乙")])
+    fetcher.release.clear()
+    window = make_window(fetcher)
+    window.search_input.setText("000001")
+    window.search_fund()
+    wait_for(lambda: fetcher.calls)
+    window.search_input.setText("000002")
+    window.search_fund()
+    fetcher.release.set()
+    wait_for(lambda: window.search_btn.text() == "🔍 搜索" and window.search_cache.get("000001") is not None)
+    assert window.name_input == "乙"
+    assert window.search_cache.get("000001").name == "甲"
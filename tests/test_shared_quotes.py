@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import Future
+
+from main import FundManager, InstanceLock, NavArchiver, Position, Quote, QuoteStore, RefreshCoordinator
+
+def make_instance():
+    fund_manager = FundManager(QuoteStore())
+    coordinator = RefreshCoordinator(fund_manager, None, instance_lock=InstanceLock())
+    coordinator.update_leadership()
+    return coordinator, NavArchiver(fund_manager, coordinator)
+
+def test_confirmed_quote_survives_same_day_estimate(workdir):
+    store = QuoteStore(None)
+    store.update("000001", Quote("甲", 1.2, 1.21, 0.83, "2026-10-19 15:00", nav_date="2026-10-16"), time.time())
+    store.confirm("000001", 1.215, "2026-10-19")
+    assert not store.update("000001", Quote("甲", 1.2, 1.22, 1.67, "2026-10-19 15:00"), time.time() + 1)
+    assert store.get("000001").gsz == 1.215
+    assert store.update("000001", Quote("甲", 1.215, 1.22, 0.41, "2026-10-20 10:00"), time.time() + 2)
+
+def settle(archiver, code, date, nav):
+    archiver.holders = archiver.build_holders()
+    future = Future()
+    future.set_result((date, nav, None))
+    archiver._on_nav(code, future)
+
+# 非主实例从行情缓存得知哪些行情已换成确认净值，并从归档跟上准确度统计，不再显示误差范围
+def test_follower_shares_confirmed_state_and_accuracy(qapp, workdir):
+    leader, leader_archiver = make_instance()
+    leader.fund_manager.watchlist = [Position("000001", "甲", 1.0, 100.0)]
+    leader.fund_manager.save()
+    leader.quote_store.update("000001", Quote("甲", 1.18, 1.19, 0.85, "2026-10-16 15:00"), time.time())
+    settle(leader_archiver, "000001", "2026-10-16", 1.2)
+    follower, _ = make_instance()
+    assert leader.leader and not follower.leader
+    assert follower.accuracy.get("000001").count == 1
+
+    leader.quote_store.update("000001", Quote("甲", 1.2, 1.21, 0.83, "2026-10-19 15:00"), time.time())
+    leader.quote_store.save()
+    follower.request_refresh()
+    assert follower.latest_snapshot["funds"][0]["error_band"] > 0
+
+    settle(leader_archiver, "000001", "2026-10-19", 1.215)
+    leader.quote_store.save()
+    follower.request_refresh()
+    quote = follower.quote_store.get("000001")
+    assert quote.confirmed and (quote.dwjz, quote.gsz) == (1.2, 1.215)
+    assert follower.accuracy.get("000001").count == 2
+    assert follower.build_snapshot(0)["funds"][0]["error_band"] == 0
+
+def test_refetching_unchanged_quote_does_not_dirty_store():
+    store = QuoteStore(None)
+    store.update("000001", Quote("甲", 1.2, 1.21, 0.83, "2026-10-19 14:00"), time.time())
+    store.save()
+    assert store.update("000001", Quote("甲", 1.2, 1.21, 0.83, "2026-10-19 14:00"), time.time() + 1)
+    assert not store.dirty
+    assert store.update("000001", Quote("甲", 1.2, 1.22, 1.67, "2026-10-19 14:01"), time.time() + 2)
+    assert store.dirty
+
+# 主实例在后台线程中写行情缓存，写完后记下文件时间，其他实例可以读到
+def test_leader_saves_quotes_in_background(qapp, workdir):
+    leader, _ = make_instance()
+    store = leader.quote_store
+    store.save_interval = 0
+    store.update("000001", Quote("甲", 1.2, 1.21, 0.83, "2026-10-19 14:00"), time.time())
+    leader.publish_snapshot()
+    assert not store.dirty
+    deadline = time.monotonic() + 5
+    while store.saving and time.monotonic() < deadline:
+        qapp.processEvents()
+        time.sleep(0.01)
+    assert not store.saving and store.mtime is not None
+    assert QuoteStore().get("000001").gsz == 1.21
+    leader.publish_snapshot()
+    assert not store.saving
+    leader.stop()
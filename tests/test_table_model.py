@@ -0,0 +1,81 @@
+from PyQt5.QtCore import QPersistentModelIndex, Qt
+
+from main import FundTableModel
+
+def make_row(code, name, growth, has_quote=True):
+    return {"code": code, "name": name, "cost": 1.0, "shares": 100.0, "gsz": 1 + growth / 100, "growth": growth,
+            "today_profit": growth, "total_profit": growth, "has_quote": has_quote, "ok": True}
+
+def display_codes(model):
+    return [model.entry_at(row)["code"] for row in range(model.rowCount())]
+
+def make_model(qapp):
+    model = FundTableModel()
+    model.update_rows([make_row("000001", "沪深300", 1.0), make_row("000002", "中证500", -2.0),
+                       make_row("000003", "创业板", 3.0), make_row("000004", "红利", 0.0, has_quote=False)])
+    return model
+
+def test_sort_places_funds_without_quotes_last_in_descending_order(qapp):
+    model = make_model(qapp)
+    assert display_codes(model) == ["000001", "000002", "000003", "000004"]
+    model.sort(5, Qt.DescendingOrder)
+    assert display_codes(model) == ["000003", "000001", "000002", "000004"]
+    model.sort(5, Qt.AscendingOrder)
+    assert display_codes(model) == ["000004", "000002", "000001", "000003"]
+
+def test_incremental_update_moves_only_changed_rows(qapp):
+    model = make_model(qapp)
+    model.sort(5, Qt.DescendingOrder)
+    assert model.display_row_of("000002") == 2
+    model.update_rows([make_row("000001", "沪深300", 1.0), make_row("000002", "中证500", 5.0),
+                       make_row("000003", "创业板", 3.0), make_row("000004", "红利", 0.0, has_quote=False)])
+    assert display_codes(model) == ["000002", "000003", "000001", "000004"]
+    assert model.display_row_of("000002") == 0
+    assert model.order == sorted(model.order)
+
+def test_selection_follows_fund_after_resort(qapp):
+    model = make_model(qapp)
+    model.sort(5, Qt.DescendingOrder)
+    selected = model.index(model.display_row_of("000001"), 0)
+    persistent = QPersistentModelIndex(selected)
+    model.update_rows([make_row("000001", "沪深300", 9.0), make_row("000002", "中证500", -2.0),
+                       make_row("000003", "创业板", 3.0), make_row("000004", "红利", 0.0, has_quote=False)])
+    assert persistent.row() == 0
+    assert model.entry_at(persistent.row())["code"] == "000001"
+
+def test_filter_matches_code_and_name(qapp):
+    model = make_model(qapp)
+    model.sort(5, Qt.DescendingOrder)
+    model.set_filter("中证")
+    assert display_codes(model) == ["000002"]
+    model.set_filter("00000")
+    assert display_codes(model) == ["000003", "000001", "000002", "000004"]
+    assert model.display_row_of("000004") == 3
+    model.set_filter("")
+    assert model.rowCount() == 4
+
+# 首次拿到行情后名称由代码变为基金名称，过滤条件重新判断
+def test_filter_follows_name_arriving_with_first_quote(qapp):
+    model = FundTableModel()
+    model.update_rows([make_row("000001", "000001", 0.0, has_quote=False), make_row("000002", "中证500", 1.0)])
+    model.set_filter("沪深")
+    assert display_codes(model) == []
+    model.update_rows([make_row("000001", "沪深300", 1.0), make_row("000002", "中证500", 1.0)])
+    assert display_codes(model) == ["000001"]
+    model.update_rows([make_row("000001", "上证50", 1.0), make_row("000002", "中证500", 1.0)])
+    assert display_codes(model) == []
+
+def test_data_changed_covers_only_changed_rows(qapp):
+    model = make_model(qapp)
+    ranges = []
+    model.dataChanged.connect(lambda top, bottom: ranges.append((top.row(), bottom.row())))
+    model.update_rows([make_row("000001", "沪深300", 1.0), make_row("000002", "中证500", -1.0),
+                       make_row("000003", "创业板", 3.0), make_row("000004", "红利", 0.5)])
+    assert ranges == [(1, 1), (3, 3)]
+    ranges.clear()
+    model.update_rows([make_row("000001", "沪深300", 1.0), make_row("000002", "中证500", -1.0),
+                       make_row("000003", "创业板", 3.0), make_row("000004", "红利", 0.5)])
+    assert ranges == []
+    model.update_rows([make_row("000001", "沪深300", 2.0), make_row("000002", "中证500", -2.0),
+                       make_row("000003", "创业板", 3.0), make_row("000004", "红利", 0.5)])
+    assert ranges == [(0, 1)]
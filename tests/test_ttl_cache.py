@@ -0,0 +1,35 @@
+import main
+from main import TTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(main.time, "monotonic", clock)
+    cache = TTLCache(maxsize=4, ttl=30)
+    cache.put("000001", "甲")
+    clock.now += 29
+    assert cache.get("000001") == "甲"
+    clock.now += 2
+    assert cache.get("000001") is None
+    # 过期后重新放入的结果按新的时间计算
+    cache.put("000001", "乙")
+    assert cache.get("000001") == "乙"
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    monkeypatch.setattr(main.time, "monotonic", FakeClock())
+    cache = TTLCache(maxsize=2, ttl=30)
+    cache.put("000001", "甲")
+    cache.put("000002", "乙")
+    assert cache.get("000001") == "甲"
+    cache.put("000003", "丙")
+    assert cache.get("000002") is None
+    assert cache.get("000001") == "甲"
+    assert cache.get("000003") == "丙"
+    cache.clear()
+    assert cache.get("000001") is None
@@ -0,0 +1,71 @@
+# ==================== 解析基准测试 ====================
+# 对比改用 decode_fundgz 之前的正则解析和现在的字节切片解析，检查结果一致并给出每条响应的耗时：
+#   python tools/bench_parser.py [N] [--payloads FILE]
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import Quote, decode_fundgz
+
+# 抓取自 fundgz 的典型响应：正常估值、负涨幅、带换行的尾部、不存在的基金
+BENCH_PAYLOADS = (
+    'jsonpgz({"fundcode":"001186","name":"富国文体健康股票A","jzrq":"2026-10-16","dwjz":"2.1530",'
+    '"gsz":"2.1812","gszzl":"1.31","gztime":"2026-10-19 15:00"});'.encode("utf-8"),
+    'jsonpgz({"fundcode":"110022","name":"易方达消费行业股票","jzrq":"2026-10-16","dwjz":"3.9870",'
+    '"gsz":"3.9415","gszzl":"-1.14","gztime":"2026-10-19 14:58"});\r\n'.encode("utf-8"),
+    'jsonpgz({"fundcode":"161725","name":"招商中证白酒指数(LOF)A","jzrq":"2026-10-16","dwjz":"0.8624",'
+    '"gsz":"0.8601","gszzl":"-0.27","gztime":"2026-10-19 15:00"});'.encode("utf-8"),
+    b'jsonpgz();',
+)
+BENCH_ITERATIONS = 200000
+
+# 改用 decode_fundgz 之前的解析方式，只用于对照
+def decode_fundgz_regex(payload):
+    text = payload.decode("utf-8").strip()
+    if not text.startswith('jsonpgz('):
+        return None
+    match = re.search(r'jsonpgz\((.*)\)', text)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(1))
+        return Quote(data["name"], float(data["dwjz"]), float(data["gsz"]), float(data["gszzl"]), data["gztime"],
+                     nav_date=data.get("jzrq", ""))
+    except (ValueError, TypeError, KeyError):
+        return None
+
+def run_parser_benchmark(iterations=BENCH_ITERATIONS, payload_file=None):
+    payloads = BENCH_PAYLOADS
+    if payload_file:
+        with open(payload_file, 'rb') as f:
+            payloads = tuple(line for line in f.read().splitlines() if line.strip())
+    mismatches = [p for p in payloads if decode_fundgz(p) != decode_fundgz_regex(p)]
+    for payload in mismatches:
+        print(f"[bench] 结果不一致: {payload[:80]!r}")
+    rounds = max(1, iterations // len(payloads))
+    timings = {}
+    for label, decoder in (("regex", decode_fundgz_regex), ("bytes", decode_fundgz)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for payload in payloads:
+                decoder(payload)
+        timings[label] = (time.perf_counter() - started) / (rounds * len(payloads))
+        print(f"[bench] {label:<5}  {timings[label] * 1e6:7.2f} µs/响应")
+    print(f"[bench] {len(payloads)} 个样本 x {rounds} 轮，加速 {timings['regex'] / timings['bytes']:.2f}x，"
+          f"结果{'一致' if not mismatches else '不一致'}")
+    return 1 if mismatches else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="prosper基金助手行情解析基准测试")
+    parser.add_argument("iterations", type=int, nargs="?", default=BENCH_ITERATIONS, help="解析次数")
+    parser.add_argument("--payloads", metavar="FILE", help="响应样本文件，每行一个")
+    args = parser.parse_args()
+    sys.exit(run_parser_benchmark(args.iterations, args.payloads))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# ==================== 本地模拟行情服务 ====================
+# 同时提供 fundgz 的 JSONP 接口、批量估值接口、历史净值接口和基金资料接口，供联调和测试使用：
+#   python tools/mock_server.py [PORT]
+#   PROSPER_FUNDGZ_HOST=127.0.0.1:8765 PROSPER_BATCH_URL=http://127.0.0.1:8765/FundMNewApi/FundMNFInfo python main.py
+# 代码以 9 结尾的基金在批量接口中没有估值，用于检验逐只回退；以 0000 结尾的基金不存在。
+# 每只基金有固定的前一交易日净值和当日确认净值，估值在确认净值附近随机波动；当日净值在
+# MOCK_PUBLISH_TIME 之后（或启动时加 --published）才公布，之前各接口给出的都是前一交易日净值；
+# 公布之后 JSONP 接口和真实接口一样把 dwjz/jzrq 换成当日净值，估值不变
+import argparse
+import json
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+MOCK_SERVER_PORT = 8765
+MOCK_PUBLISH_TIME = (18, 0)
+
+def previous_trading_day(day):
+    day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+class MockQuoteHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    # 前一交易日净值、当日确认净值和一次随机的估值
+    @staticmethod
+    def make_quote(code):
+        prev_nav = round(1.0 + int(code) % 97 / 100, 4)
+        nav = round(prev_nav * (1 + (int(code) * 7 % 61 - 30.5) / 1000), 4)
+        gsz = round(nav * (1 + random.uniform(-0.005, 0.005)), 4)
+        return prev_nav, nav, gsz, round((gsz / prev_nav - 1) * 100, 2)
+
+    def published(self, now):
+        if self.server.published is not None:
+            return self.server.published
+        return (now.hour, now.minute) >= MOCK_PUBLISH_TIME
+
+    # 已经公布的最近两条净值 [(日期, 净值), ...]，新的在前
+    def nav_history(self, code, now):
+        prev_nav, nav, _, _ = self.make_quote(code)
+        prev_day = previous_trading_day(now)
+        rows = [(prev_day.strftime("%Y-%m-%d"), prev_nav),
+                (previous_trading_day(prev_day).strftime("%Y-%m-%d"), round(prev_nav * 0.99, 4))]
+        if self.published(now):
+            rows.insert(0, (now.strftime("%Y-%m-%d"), nav))
+        return rows[:2]
+
+    def latest_nav(self, code, now):
+        return self.nav_history(code, now)[0]
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        today = datetime.now()
+        now = today.strftime("%Y-%m-%d %H:%M")
+        if url.path.startswith("/js/") and url.path.endswith(".js"):
+            code = url.path[4:-3]
+            if not code.isdigit() or code.endswith("0000"):
+                return self.reply(b"jsonpgz();", "application/javascript")
+            _, _, gsz, growth = self.make_quote(code)
+            jzrq, dwjz = self.latest_nav(code, today)
+            data = {"fundcode": code, "name": f"模拟基金{code}", "jzrq": jzrq, "dwjz": f"{dwjz:.4f}",
+                    "gsz": f"{gsz:.4f}", "gszzl": f"{growth:.2f}", "gztime": now}
+            return self.reply(f"jsonpgz({json.dumps(data, ensure_ascii=False)});".encode("utf-8"), "application/javascript")
+        if url.path == "/FundMNewApi/FundMNFInfo":
+            codes = (parse_qs(url.query).get("Fcodes") or [""])[0].split(",")
+            datas = []
+            for code in codes:
+                if not code.isdigit() or code.endswith("0000"):
+                    continue
+                _, _, gsz, growth = self.make_quote(code)
+                pdate, nav = self.latest_nav(code, today)
+                estimated = not code.endswith("9")
+                datas.append({"FCODE": code, "SHORTNAME": f"模拟基金{code}", "PDATE": pdate, "NAV": f"{nav:.4f}",
+                              "GSZ": f"{gsz:.4f}" if estimated else "--", "GSZZL": f"{growth:.2f}" if estimated else "--",
+                              "GZTIME": now if estimated else "--"})
+            body = {"Datas": datas, "ErrCode": 0, "ErrMsg": None, "TotalCount": len(datas)}
+            return self.reply(json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json")
+        if url.path == "/FundMApi/FundBaseTypeInformation.ashx":
+            code = (parse_qs(url.query).get("FCODE") or [""])[0]
+            if not code.isdigit() or code.endswith("0000"):
+                body = {"Datas": None, "ErrCode": 0, "ErrMsg": None}
+            else:
+                body = {"Datas": {"FCODE": code, "SHORTNAME": f"模拟基金{code}", "FTYPE": "混合型-偏股",
+                                  "BENCH": "沪深300指数收益率*80%+中债综合指数收益率*20%", "JJGS": "模拟基金公司",
+                                  "JJJL": "张三", "MGREXP": "1.20%", "TRUSTEXP": "0.20%", "SALESEXP": "--",
+                                  "ESTABDATE": "2015-06-01"}, "ErrCode": 0, "ErrMsg": None}
+            return self.reply(json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json")
+        if url.path == "/f10/lsjz":
+            code = (parse_qs(url.query).get("fundCode") or [""])[0]
+            rows = []
+            if code.isdigit() and not code.endswith("0000"):
+                rows = [{"FSRQ": date, "DWJZ": f"{nav:.4f}"} for date, nav in self.nav_history(code, today)]
+            body = {"Data": {"LSJZList": rows}, "ErrCode": 0, "ErrMsg": None, "TotalCount": len(rows)}
+            return self.reply(json.dumps(body, ensure_ascii=False).encode("utf-8"), "application/json")
+        self.send_response(404)
+        self.end_headers()
+
+    def reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+# published 为 None 时按 MOCK_PUBLISH_TIME 决定当日净值是否已公布，运行中也可以直接修改 server.published
+def create_mock_server(port=MOCK_SERVER_PORT, published=None):
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockQuoteHandler)
+    server.daemon_threads = True
+    server.published = published
+    return server
+
+# 在后台线程中启动，端口为 0 时由系统分配；返回的 server 用 shutdown() 停止
+def start_mock_server(port=0, published=None):
+    server = create_mock_server(port, published)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def mock_urls(server):
+    host = f"127.0.0.1:{server.server_address[1]}"
+    return {
+        "fundgz_host": host,
+        "batch_url": f"http://{host}/FundMNewApi/FundMNFInfo",
+        "nav_url": f"http://{host}/f10/lsjz",
+        "metadata_url": f"http://{host}/FundMApi/FundBaseTypeInformation.ashx"
+    }
+
+def run_mock_server(port=MOCK_SERVER_PORT, published=None):
+    server = create_mock_server(port, published)
+    urls = mock_urls(server)
+    print(f"[mock] 模拟行情服务已启动: http://{urls['fundgz_host']}")
+    print(f"[mock] PROSPER_FUNDGZ_HOST={urls['fundgz_host']} PROSPER_BATCH_URL={urls['batch_url']} "
+          f"PROSPER_NAV_URL={urls['nav_url']} PROSPER_METADATA_URL={urls['metadata_url']}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="prosper基金助手本地模拟行情服务")
+    parser.add_argument("port", type=int, nargs="?", default=MOCK_SERVER_PORT, help=f"端口（默认 {MOCK_SERVER_PORT}）")
+    parser.add_argument("--published", action="store_true", help="当日净值立即公布，不等到收盘后")
+    args = parser.parse_args()
+    sys.exit(run_mock_server(args.port, True if args.published else None))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# ==================== 长时间运行测试 ====================
+# 使用模拟数据无界面运行刷新循环，记录 RSS 和 Qt 对象数量，预热后的增长超出预算即失败：
+#   python tools/soak.py [CYCLES] [--funds N]
+import argparse
+import gc
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtCore import QCoreApplication, QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+
+from main import DataFetcher, FullWindow, FundManager, Position, Quote, QuoteStore, RefreshCoordinator, SimpleWindow
+
+SOAK_CYCLES = 50000
+SOAK_FUNDS = 40
+SOAK_WARMUP = 1000
+SOAK_SAMPLE_EVERY = 1000
+SOAK_RSS_BUDGET_MB = 32
+SOAK_OBJECT_BUDGET = 0
+
+class FakeDataFetcher(DataFetcher):
+    def __init__(self, seed=0, failure_rate=0.02):
+        super().__init__()
+        self.random = random.Random(seed)
+        self.failure_rate = failure_rate
+        self.timeout = 0
+        self.batching = False
+
+    def get_fund_estimate(self, code):
+        if self.random.random() < self.failure_rate:
+            return None
+        dwjz = 1.0 + (int(code) % 97) / 100
+        growth = round(self.random.uniform(-4, 4), 2)
+        return Quote(f"测试基金{code}", dwjz, round(dwjz * (1 + growth / 100), 4), growth,
+                     datetime.now().strftime("%Y-%m-%d %H:%M"))
+
+def get_rss_bytes():
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return 0
+    return psutil.Process().memory_info().rss
+
+def count_qt_objects(*widgets):
+    return len(QApplication.allWidgets()) + sum(len(w.findChildren(QObject)) for w in widgets)
+
+def run_soak(cycles=SOAK_CYCLES, fund_count=SOAK_FUNDS, rss_budget_mb=SOAK_RSS_BUDGET_MB,
+             object_budget=SOAK_OBJECT_BUDGET):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    # 各管理器按相对路径读写数据文件，在临时目录中运行，不碰用户真实的自选、历史和提醒
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="prosper-soak-") as workdir:
+        os.chdir(workdir)
+        try:
+            return _run_soak(cycles, fund_count, rss_budget_mb, object_budget)
+        finally:
+            os.chdir(cwd)
+
+def _run_soak(cycles, fund_count, rss_budget_mb, object_budget):
+    app = QApplication(sys.argv[:1])
+    fetcher = FakeDataFetcher()
+    # 模拟行情只保存在内存中，不写入行情缓存文件
+    fund_manager = FundManager(QuoteStore(None))
+    fund_manager.watchlist = [Position(f"{100000 + i}", f"测试基金{i}", 1.2, 100.0 + i) for i in range(fund_count)]
+    coordinator = RefreshCoordinator(fund_manager, fetcher)
+    simple = SimpleWindow(fund_manager, coordinator)
+    full = FullWindow(fund_manager, coordinator)
+    simple.show()
+    full.show()
+    warmup = min(SOAK_WARMUP, cycles)
+    samples = []
+
+    def step(snapshot):
+        n = snapshot["generation"]
+        if n == warmup or n % SOAK_SAMPLE_EVERY == 0 or n >= cycles:
+            # 先让延迟删除的对象真正释放，再采样
+            QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+            gc.collect()
+            sample = (n, get_rss_bytes(), count_qt_objects(simple, full))
+            samples.append(sample)
+            print(f"[soak] 周期 {n:>6}  RSS {sample[1] / 1048576:8.1f} MiB  Qt对象 {sample[2]}")
+        if n >= cycles:
+            app.quit()
+        else:
+            QTimer.singleShot(0, coordinator.request_refresh)
+
+    coordinator.snapshot_ready.connect(step)
+    coordinator.request_refresh()
+    app.exec_()
+    coordinator.stop()
+    fetcher.shutdown()
+    baseline = next(sample for sample in samples if sample[0] == warmup)
+    final = samples[-1]
+    rss_growth = (final[1] - baseline[1]) / 1048576
+    object_growth = final[2] - baseline[2]
+    print(f"[soak] 预热后 RSS 增长 {rss_growth:.1f} MiB (预算 {rss_budget_mb} MiB)，"
+          f"Qt对象增长 {object_growth} (预算 {object_budget})")
+    if rss_growth > rss_budget_mb or object_growth > object_budget:
+        print("[soak] 失败：内存增长超出预算")
+        return 1
+    print("[soak] 通过")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="prosper基金助手长时间运行测试")
+    parser.add_argument("cycles", type=int, nargs="?", default=SOAK_CYCLES, help=f"刷新次数（默认 {SOAK_CYCLES}）")
+    parser.add_argument("--funds", type=int, default=SOAK_FUNDS, metavar="N", help="使用的基金数量")
+    args = parser.parse_args()
+    sys.exit(run_soak(args.cycles, args.funds))
+
+if __name__ == "__main__":
+    main()